@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class ProfileBackend(ModelBackend):
+    """
+    ModelBackend that loads the session user together with their profile.
+
+    base.html reads ``request.user.profile`` on every page, so joining it
+    here saves a lazy one-to-one query per response.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+
+        try:
+            user = UserModel._default_manager.select_related("profile").get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+
+REFRESHED_KEY = "_refreshed_at"
+
+
+class SessionRefreshMiddleware:
+    """
+    Slide the session expiry without writing the session on every request.
+
+    Replaces SESSION_SAVE_EVERY_REQUEST: a session is re-saved (and its
+    expiry pushed back) at most once per SESSION_REFRESH_INTERVAL, and
+    requests without a session cookie never touch the session at all.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return response
+
+        session = request.session
+        now = int(time.time())
+        refreshed = session.get(REFRESHED_KEY, 0)
+
+        # A stale cookie loads as an empty session with no key; leave it be
+        if session.session_key and now - refreshed >= settings.SESSION_REFRESH_INTERVAL:
+            session[REFRESHED_KEY] = now
+
+        return response
@@ -11,6 +11,7 @@ class Profile(models.Model):
         blank=True,
         null=True,
     )
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.user.username
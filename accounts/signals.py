@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from products import images
 from .models import Profile  # your profile model
 
 
@@ -11,5 +12,25 @@ def create_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
+def save_profile(sender, instance, created, update_fields, **kwargs):
+    # A new user's profile was just created; a login only sets last_login
+    if created or update_fields == {"last_login"}:
+        return
     instance.profile.save()
+
+
+@receiver(pre_save, sender=Profile)
+def remember_previous_photo(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Profile.objects.filter(pk=instance.pk).only("profile_photo").first()
+        )
+
+
+@receiver(post_save, sender=Profile)
+def refresh_photo_variants(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None)
+
+    if images.needs_variants(instance, previous, "profile_photo", "photo_variants"):
+        images.schedule_variants(instance, "profile_photo", "photo_variants")
@@ -0,0 +1,114 @@
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products.tests import PLAIN_STATIC, QueryBudgetMixin
+from .backends import ProfileBackend
+from .models import Profile
+from .utils import get_profile
+
+PASSWORD = "correct-horse-42"
+
+
+# ---------------------------------------------------------
+# QUERY BUDGETS
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class AccountQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("member", "member@example.com", PASSWORD)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        self.client.force_login(self.user)
+        # The first request after login re-saves the session
+        self.client.get(reverse("cart_summary"))
+        cache.clear()
+
+    def test_register(self):
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse("register"))
+        self.assertEqual(response.status_code, 200)
+
+        # Validate, create user and profile, authenticate, log in
+        data = {"username": "newcomer", "password1": PASSWORD, "password2": PASSWORD}
+        with self.assertMaxQueries(13):
+            response = self.client.post(reverse("register"), data)
+        self.assertRedirects(response, reverse("edit_profile"))
+
+    def test_login(self):
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse("login"))
+        self.assertEqual(response.status_code, 200)
+
+        # Authenticate, new session, last_login, profile, cart merge check
+        data = {"username": "member", "password": PASSWORD}
+        with self.assertMaxQueries(10):
+            response = self.client.post(reverse("login"), data)
+        self.assertRedirects(response, reverse("products"))
+
+    def test_logout(self):
+        self.login()
+        # Flushing the session replaces it with a new one for the message
+        with self.assertMaxQueries(8):
+            response = self.client.get(reverse("logout"))
+        self.assertRedirects(response, reverse("products"))
+
+    def test_profile(self):
+        self.login()
+        # Session, user with profile, cart badge
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse("profile"))
+        self.assertEqual(response.status_code, 200)
+
+        data = {"phone": "9999999999", "address": "1 Test Street"}
+        with self.assertMaxQueries(7):
+            response = self.client.post(reverse("profile"), data)
+        self.assertRedirects(response, reverse("profile"))
+
+    def test_edit_profile(self):
+        self.login()
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse("edit_profile"))
+        self.assertEqual(response.status_code, 200)
+
+        data = {"phone": "9999999999", "address": "1 Test Street"}
+        with self.assertMaxQueries(7):
+            response = self.client.post(reverse("edit_profile"), data)
+        self.assertRedirects(response, reverse("profile"))
+
+
+# ---------------------------------------------------------
+# QUERY PLANS
+# ---------------------------------------------------------
+
+
+class AccountPlanTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=f"user{i}", email=f"user{i}@example.com") for i in range(50)
+        )
+        cls.user = User.objects.create_user("member", "member@example.com", PASSWORD)
+
+    def test_login_lookup(self):
+        self.assertIndexedPlans(
+            "auth_user", lambda: authenticate(username="member", password=PASSWORD)
+        )
+
+    def test_session_user(self):
+        self.assertIndexedPlans(
+            "accounts_profile", lambda: ProfileBackend().get_user(self.user.pk)
+        )
+
+    def test_profile_lookup(self):
+        user = User.objects.get(pk=self.user.pk)
+        Profile.objects.filter(user=user).delete()
+        self.assertIndexedPlans("accounts_profile", lambda: get_profile(user))
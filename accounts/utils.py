@@ -0,0 +1,11 @@
+from .models import Profile
+
+
+def get_profile(user):
+    """Return the profile already loaded on ``user``, creating it if missing."""
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        profile, created = Profile.objects.get_or_create(user=user)
+        user.profile = profile
+        return profile
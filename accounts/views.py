@@ -5,6 +5,7 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from .forms import ProfileUpdateForm
 from .models import Profile
+from .utils import get_profile
 
 
 # -----------------------------
@@ -39,7 +40,7 @@ def register_user(request):
 # -----------------------------
 @login_required
 def edit_profile(request):
-    profile, created = Profile.objects.get_or_create(user=request.user)
+    profile = get_profile(request.user)
 
     if request.method == "POST":
         profile.phone = request.POST.get("phone")
@@ -61,7 +62,7 @@ def edit_profile(request):
 # -----------------------------
 @login_required
 def profile(request):
-    profile, created = Profile.objects.get_or_create(user=request.user)
+    profile = get_profile(request.user)
 
     if request.method == "POST":
         form = ProfileUpdateForm(
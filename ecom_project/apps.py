@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class EcomProjectConfig(AppConfig):
+    name = "ecom_project"
+    verbose_name = "Project"
+
+    def ready(self):
+        # Site-wide SQLite connection tuning and system checks
+        import ecom_project.checks as _checks  # noqa: F401
+        import ecom_project.db as _db  # noqa: F401
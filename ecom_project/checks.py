@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Cache backends shared by every worker without a database round trip
+SHARED_CACHES = ("RedisCache", "PyMemcacheCache", "PyLibMCCache")
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Every catalog page reads its version stamps from the default cache, so
+    production needs one that all workers share and that answers from
+    memory: a per-process cache serves other workers stale pages, and a
+    database or file cache puts a lookup on every hit.
+    """
+    # Not settings.DEBUG: the test runner turns that off before checking
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.ENVIRONMENT != "production" or backend.endswith(SHARED_CACHES):
+        return []
+
+    return [
+        Error(
+            f"The default cache is {backend.rsplit('.', 1)[-1]}, not Redis "
+            "or Memcached.",
+            hint=(
+                "Set REDIS_URL (or MEMCACHED_LOCATION) so catalog version "
+                "stamps and the suggestion change log are shared by every "
+                "worker without hitting the database."
+            ),
+            id="ecom_project.E001",
+        )
+    ]
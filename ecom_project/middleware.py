@@ -0,0 +1,88 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import profiling
+from .routers import request_scope
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class PrimaryPinMiddleware:
+    """
+    Read-your-writes on top of the replica router.
+
+    Unsafe requests read from the primary. A request that wrote sets a
+    short-lived pin cookie, so the same browser keeps reading from the
+    primary until the replicas have caught up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in SAFE_METHODS
+            or settings.DATABASE_PIN_COOKIE in request.COOKIES
+        )
+
+        with request_scope(pinned=pinned) as state:
+            response = self.get_response(request)
+
+        if state["wrote"]:
+            response.set_cookie(
+                settings.DATABASE_PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (PROFILING_ENABLED) per-request profiling.
+
+    Every response gets a ``Server-Timing`` header splitting the request
+    into SQL, template and external HTTP time, which browser dev tools
+    show next to the network timings. Sampled or header-triggered
+    requests also run under cProfile; the profile is written to
+    PROFILING_DIR when the request was asked for or took longer than
+    PROFILING_SLOW_MS.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        profiling.install_hooks()
+
+    def __call__(self, request):
+        profile, forced = profiling.wants_profile(request)
+        profiler = profiling.start_profiler() if profile else None
+        started = time.perf_counter()
+
+        try:
+            with profiling.collect() as timings:
+                response = self.get_response(request)
+        finally:
+            if profiler:
+                profiler.disable()
+
+        elapsed = time.perf_counter() - started
+        response["Server-Timing"] = timings.server_timing(elapsed)
+
+        if profiler and (forced or elapsed * 1000 >= settings.PROFILING_SLOW_MS):
+            path = profiling.dump(profiler, request, elapsed)
+            logger.info(
+                f"Profiled {request.method} {request.path} "
+                f"in {elapsed * 1000:.0f}ms: {path}"
+            )
+
+        return response
@@ -0,0 +1,147 @@
+import cProfile
+import os
+import random
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+METRICS = {
+    "db": "{n} SQL queries",
+    "tpl": "{n} template renders",
+    "http": "{n} external HTTP calls",
+}
+
+# Timings of the current request, set by ProfilingMiddleware
+_timings = ContextVar("profiling_timings", default=None)
+
+
+class Timings:
+    """Time spent and number of calls per metric for one request."""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(METRICS, 0.0)
+        self.counts = dict.fromkeys(METRICS, 0)
+        self._depth = dict.fromkeys(METRICS, 0)
+
+    @contextmanager
+    def measure(self, metric):
+        # Nested calls (urllib3 retries, a render inside a render) count once
+        self._depth[metric] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth[metric] -= 1
+            if not self._depth[metric]:
+                self.seconds[metric] += time.perf_counter() - started
+                self.counts[metric] += 1
+
+    def server_timing(self, total):
+        """``Server-Timing`` header value, durations in milliseconds."""
+        parts = [
+            f"{metric};dur={self.seconds[metric] * 1000:.1f};"
+            f'desc="{desc.format(n=self.counts[metric])}"'
+            for metric, desc in METRICS.items()
+        ]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def _timed(metric, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        timings = _timings.get()
+        if timings is None:
+            return func(*args, **kwargs)
+        with timings.measure(metric):
+            return func(*args, **kwargs)
+
+    wrapper.profiled = True
+    return wrapper
+
+
+def install_hooks():
+    """
+    Time template renders and outgoing HTTP.
+
+    Razorpay (requests) and Cloudinary uploads both go through urllib3's
+    connection pools, so one hook covers every external call. The hooks
+    are no-ops outside a profiled request.
+    """
+    from django.template.backends.django import Template
+    from urllib3.connectionpool import HTTPConnectionPool
+
+    for cls, name, metric in [
+        (Template, "render", "tpl"),
+        (HTTPConnectionPool, "urlopen", "http"),
+    ]:
+        original = getattr(cls, name)
+        if not getattr(original, "profiled", False):
+            setattr(cls, name, _timed(metric, original))
+
+
+@contextmanager
+def collect():
+    """Gather the timings of every query, render and HTTP call in the block."""
+    timings = Timings()
+
+    def time_query(execute, sql, params, many, context):
+        with timings.measure("db"):
+            return execute(sql, params, many, context)
+
+    token = _timings.set(timings)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(time_query))
+            yield timings
+    finally:
+        _timings.reset(token)
+
+
+def wants_profile(request):
+    """
+    Whether to run ``request`` under cProfile, and whether it was asked for.
+
+    The PROFILING_HEADER must carry PROFILING_TOKEN; without a token it is
+    honoured in DEBUG only. Other requests are sampled at
+    PROFILING_SAMPLE_RATE.
+    """
+    value = request.headers.get(settings.PROFILING_HEADER)
+    if value is not None:
+        if settings.PROFILING_TOKEN:
+            return constant_time_compare(value, settings.PROFILING_TOKEN), True
+        return settings.DEBUG, True
+    return random.random() < settings.PROFILING_SAMPLE_RATE, False
+
+
+def start_profiler():
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this thread
+        return None
+    return profiler
+
+
+def dump(profiler, request, elapsed):
+    """Write the profile to PROFILING_DIR; returns its path."""
+    directory = settings.PROFILING_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+
+    match = request.resolver_match
+    slug = match.url_name if match and match.url_name else request.path
+    slug = re.sub(r"\W+", "_", slug).strip("_")[:60] or "root"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = directory / (
+        f"{stamp}-{os.getpid()}-{request.method}-{slug}-{elapsed * 1000:.0f}ms.prof"
+    )
+    profiler.dump_stats(path)
+    return path
@@ -0,0 +1,106 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Models whose reads may be served by a replica: the catalog, which only
+# staff edit. Carts, orders, stock holds, users and sessions stay on the
+# primary, where checkout and payment writes land.
+REPLICA_MODELS = {"products.product", "products.facetcount"}
+
+# app_label of the stand-in model DatabaseCache routes its queries with
+CACHE_APP_LABEL = "django_cache"
+
+# Routing state of the current request: {"pinned", "wrote", "replica"}.
+# A dict, so writes seen in a copied context still reach the middleware.
+_state = ContextVar("db_routing", default=None)
+
+
+def _pick_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def request_scope(pinned=False):
+    """
+    Route the reads of one request.
+
+    The request sticks to a single replica so its queries see the same
+    snapshot. Once anything is written, or when ``pinned``, every read
+    goes to the primary. Yields the state; ``state["wrote"]`` tells the
+    caller whether to pin the client's next requests.
+    """
+    state = {
+        "pinned": pinned,
+        "wrote": False,
+        "replica": _pick_replica() if settings.DATABASE_REPLICAS else None,
+    }
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary():
+    """Send every read in the block (or decorated view) to the primary."""
+    state = _state.get()
+    if state is None:
+        with request_scope(pinned=True):
+            yield
+        return
+
+    was_pinned = state["pinned"]
+    state["pinned"] = True
+    try:
+        yield
+    finally:
+        state["pinned"] = was_pinned
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to "default"; catalog reads go to DATABASE_REPLICAS unless
+    the request is pinned, has written, or a transaction is open on the
+    primary (a replica could not see its uncommitted rows).
+    """
+
+    def db_for_read(self, model, **hints):
+        label = f"{model._meta.app_label}.{model._meta.model_name}"
+        if label not in REPLICA_MODELS:
+            return DEFAULT_DB_ALIAS
+        if not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        state = _state.get()
+        if state is None:
+            # Jobs and management commands: any replica will do
+            return _pick_replica()
+        if state["pinned"] or state["wrote"]:
+            return DEFAULT_DB_ALIAS
+        return state["replica"]
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        # Cache entries (DatabaseCache) are not data a replica could lag on
+        if state is not None and model._meta.app_label != CACHE_APP_LABEL:
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's data, so rows from either may be mixed
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
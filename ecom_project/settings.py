@@ -34,9 +34,11 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     # Your apps
+    "ecom_project.apps.EcomProjectConfig",
     "products",
     "orders",
     "accounts.apps.AccountsConfig",
+    "jobs",
     # Cloudinary
     "cloudinary",
     "cloudinary_storage",
@@ -45,17 +47,19 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "ecom_project.middleware.ProfilingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "ecom_project.middleware.PrimaryPinMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "accounts.middleware.SessionRefreshMiddleware",
+    "products.middleware.CartCookieMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
-
 ROOT_URLCONF = "ecom_project.urls"
 
 TEMPLATES = [
@@ -69,6 +73,8 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "products.context_processors.cart_item_count",
+                "products.context_processors.assets",
+                "products.context_processors.catalog",
             ],
         },
     },
@@ -87,17 +93,96 @@ if ENVIRONMENT == "production":
         "default": dj_database_url.config(
             default=os.getenv("DATABASE_URL"),
             conn_max_age=600,
+            conn_health_checks=True,
             ssl_require=True,
         )
     }
+
+    # Read replicas, e.g. DATABASE_REPLICA_URLS=postgres://r1/db,postgres://r2/db
+    replica_urls = [
+        url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url
+    ]
+    for i, url in enumerate(replica_urls, start=1):
+        DATABASES[f"replica{i}"] = {
+            **dj_database_url.parse(
+                url, conn_max_age=600, conn_health_checks=True, ssl_require=True
+            ),
+            "TEST": {"MIRROR": "default"},
+        }
 else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                # Take the write lock at BEGIN: a deferred transaction that
+                # reads then writes fails at once with "database is locked"
+                # instead of waiting out the busy timeout. Every atomic()
+                # block on "default" here writes; autocommit reads never
+                # BEGIN, so they still run alongside the writer under WAL.
+                "transaction_mode": "IMMEDIATE",
+            },
         }
     }
 
+    # A second alias on the same file, so catalog reads take the replica
+    # code path locally and in tests. It only reads, so its transactions
+    # stay DEFERRED and never queue for the write lock.
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "OPTIONS": {},
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Catalog reads are spread over the replicas; everything else, and every
+# read in a request that wrote or carries the pin cookie, uses "default".
+DATABASE_ROUTERS = ["ecom_project.routers.PrimaryReplicaRouter"]
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_PIN_COOKIE = "db_pin"
+DATABASE_PIN_SECONDS = int(os.getenv("DATABASE_PIN_SECONDS", 15))
+
+# PostgreSQL: Django's psycopg 3 pool (per process) instead of persistent
+# connections, plus a server-side statement timeout. DB_POOL=0 falls back
+# to persistent connections with health checks.
+DB_POOL = os.getenv("DB_POOL", "1") == "1"
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 4))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30_000))
+
+for db in DATABASES.values():
+    if db["ENGINE"] != "django.db.backends.postgresql":
+        continue
+
+    db_options = db.setdefault("OPTIONS", {})
+    if DB_STATEMENT_TIMEOUT_MS:
+        db_options["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    if DB_POOL:
+        from psycopg_pool import ConnectionPool
+
+        db["CONN_MAX_AGE"] = 0
+        db["CONN_HEALTH_CHECKS"] = False
+        db_options["pool"] = {
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": DB_POOL_TIMEOUT,
+            # Recycle idle and old connections; test each one on checkout
+            "max_idle": 5 * 60,
+            "max_lifetime": 30 * 60,
+            "check": ConnectionPool.check_connection,
+        }
+
+# SQLite: applied to every new connection by ecom_project.db
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 20_000)),
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64_000,
+    "temp_store": "MEMORY",
+}
+
 DEBUG = ENVIRONMENT != "production"
 
 # ---------------------------------------------------------
@@ -113,6 +198,12 @@ AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.NumericPasswordValidator"},
 ]
 
+# Sessions created before ProfileBackend still name ModelBackend
+AUTHENTICATION_BACKENDS = [
+    "accounts.backends.ProfileBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 # ---------------------------------------------------------
 # INTERNATIONALIZATION
 # ---------------------------------------------------------
@@ -143,11 +234,23 @@ STORAGES = {
     "default": {
         "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
     },
+    # Content-hashed names plus gzip/brotli siblings; WhiteNoise serves
+    # hashed files with a one-year immutable Cache-Control
     "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
+# Fall back to unhashed names when collectstatic has not run (dev, tests)
+WHITENOISE_MANIFEST_STRICT = False
+
+# Purged Tailwind + daisyUI build (manage.py build_assets). Until it has
+# been built, templates load the CDN development build instead.
+TAILWINDCSS_VERSION = os.getenv("TAILWINDCSS_VERSION", "v4.1.11")
+DAISYUI_VERSION = os.getenv("DAISYUI_VERSION", "v5.0.43")
+TAILWIND_INPUT = BASE_DIR / "products" / "static_src" / "app.css"
+TAILWIND_OUTPUT = BASE_DIR / "products" / "static" / "products" / "css" / "app.css"
+
 # Django still needs MEDIA_URL, but Cloudinary stores files, not local disk
 MEDIA_URL = "/"
 
@@ -172,6 +275,66 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+
+# Point at `manage.py razorpay_stub` for offline load tests
+RAZORPAY_BASE_URL = os.getenv("RAZORPAY_BASE_URL")
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv("RAZORPAY_CONNECT_TIMEOUT", 3.05))
+RAZORPAY_READ_TIMEOUT = float(os.getenv("RAZORPAY_READ_TIMEOUT", 10))
+RAZORPAY_MAX_RETRIES = int(os.getenv("RAZORPAY_MAX_RETRIES", 2))
+
+# Seconds checkout holds stock while a payment is pending
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 15 * 60))
+
+# ---------------------------------------------------------
+# CACHE — SHARED BY EVERY WORKER PROCESS
+# ---------------------------------------------------------
+# Catalog invalidation bumps version keys in this cache, and every catalog
+# page reads them, so it must be shared by every worker and answer without
+# touching the database: Redis or Memcached. The ecom_project.E001 check
+# fails a production start without one. A file cache (CACHE_DIR) shares
+# one host's workers for local multi-process runs such as loadtest --serve;
+# the per-process LocMemCache is for single-process development servers.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+elif os.getenv("MEMCACHED_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": os.getenv("MEMCACHED_LOCATION").split(","),
+        }
+    }
+elif os.getenv("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "ecom-catalog",
+        }
+    }
+
+# ---------------------------------------------------------
+# CATALOG
+# ---------------------------------------------------------
+
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", 24))
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 10 * 60))
+# Seconds a worker serves search suggestions before checking for changes
+SUGGEST_CHECK_INTERVAL = int(os.getenv("SUGGEST_CHECK_INTERVAL", 5))
+# Browser/CDN lifetime of catalog pages served to anonymous visitors
+ANONYMOUS_PAGE_MAX_AGE = int(os.getenv("ANONYMOUS_PAGE_MAX_AGE", 60))
 
 # ---------------------------------------------------------
 # DEFAULT FIELD TYPE
@@ -183,9 +346,25 @@ MESSAGE_STORAGE = "django.contrib.messages.storage.session.SessionStorage"
 
 
 SESSION_COOKIE_AGE = 30 * 60  # 30 minutes (increased from 15 for payment flow)
-SESSION_SAVE_EVERY_REQUEST = True  # refresh timer on each request
+# Sliding expiry, written at most every few minutes by SessionRefreshMiddleware
+# instead of SESSION_SAVE_EVERY_REQUEST, which saved on every page view
+SESSION_REFRESH_INTERVAL = 5 * 60
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
+# ---------------------------------------------------------
+# PROFILING
+# ---------------------------------------------------------
+# Off unless PROFILING=1. Adds a Server-Timing header (SQL, templates,
+# external HTTP) to every response; sampled requests, or ones sending
+# PROFILING_HEADER with PROFILING_TOKEN, are also run under cProfile.
+
+PROFILING_ENABLED = os.getenv("PROFILING", "0") == "1"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_SLOW_MS = int(os.getenv("PROFILING_SLOW_MS", "500"))
+PROFILING_HEADER = "X-Profile"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_DIR = Path(os.getenv("PROFILING_DIR", BASE_DIR / "profiles"))
+
 # ---------------------------------------------------------
 # LOGGING
 # ---------------------------------------------------------
@@ -211,6 +390,11 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "ecom_project.middleware": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
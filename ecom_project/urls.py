@@ -8,6 +8,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("products.urls")),
     path("accounts/", include("accounts.urls")),
+    path("orders/", include("orders.urls")),
 ]
 
 if settings.DEBUG:
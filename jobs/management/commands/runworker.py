@@ -0,0 +1,101 @@
+import logging
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs import queue
+
+logger = logging.getLogger(__name__)
+
+# Pause after an error talking to the database, doubled per repeat
+ERROR_BACKOFF_BASE = 1
+ERROR_BACKOFF_MAX = 60
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        self.processed = 0
+        self.counter_lock = threading.Lock()
+
+        signal.signal(signal.SIGTERM, lambda *a: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda *a: self.stopping.set())
+
+        base_id = f"{socket.gethostname()}:{os.getpid()}"
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(f"{base_id}:{i}", options["poll_interval"], options["once"]),
+                daemon=True,
+            )
+            for i in range(options["concurrency"])
+        ]
+
+        self.stdout.write(f"Worker {base_id} started with {len(threads)} threads")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+
+        self.stdout.write(f"Worker {base_id} stopped after {self.processed} jobs")
+
+    def work(self, worker_id, poll_interval, once):
+        errors = 0
+        try:
+            while not self.stopping.is_set():
+                # Drops connections the database closed or that broke
+                close_old_connections()
+                try:
+                    processed = self.work_once(worker_id)
+                except Exception:
+                    # A locked SQLite file or a dropped PostgreSQL
+                    # connection must not end this thread for good
+                    errors += 1
+                    delay = min(
+                        ERROR_BACKOFF_BASE * 2 ** (errors - 1), ERROR_BACKOFF_MAX
+                    )
+                    logger.exception(
+                        f"[{worker_id}] queue error, retrying in {delay:.0f}s"
+                    )
+                    connection.close()
+                    self.stopping.wait(delay)
+                    continue
+
+                errors = 0
+                if not processed:
+                    if once:
+                        return
+                    self.stopping.wait(poll_interval)
+        finally:
+            connection.close()
+
+    def work_once(self, worker_id):
+        """Claim and run the due jobs; returns how many were claimed."""
+        jobs = queue.claim(worker_id)
+        for job in jobs:
+            status = queue.run(job)
+            with self.counter_lock:
+                self.processed += 1
+            self.stdout.write(f"[{worker_id}] job {job.pk} {job.task}: {status}")
+        return len(jobs)
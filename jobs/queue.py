@@ -0,0 +1,114 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# A running job whose worker has not finished it after this long is
+# assumed dead and becomes claimable again.
+VISIBILITY_TIMEOUT = timedelta(minutes=10)
+BACKOFF_BASE = 5
+BACKOFF_MAX = 60 * 60
+
+
+def enqueue(task, *args, max_attempts=5, delay=None, **kwargs):
+    """
+    Queue ``task`` (a dotted path to a callable) for a ``runworker`` process.
+
+    Arguments must be JSON serialisable. The row is written in the caller's
+    transaction, so a rolled back request never leaves a job behind.
+    """
+    run_at = timezone.now() + delay if delay else timezone.now()
+    return Job.objects.create(
+        task=task,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=max_attempts,
+        run_at=run_at,
+    )
+
+
+def enqueue_once(task, delay=None):
+    """
+    Queue an argument-less ``task`` unless one is already waiting to run.
+
+    For drain-style tasks that process everything pending when they run,
+    where a second queued copy would find nothing left to do.
+    """
+    if Job.objects.filter(task=task, status=Job.QUEUED).exists():
+        return None
+    return enqueue(task, delay=delay)
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim(worker_id, limit=1):
+    """
+    Lock and mark up to ``limit`` due jobs as running for ``worker_id``.
+
+    On PostgreSQL rows are claimed with ``FOR UPDATE SKIP LOCKED`` so
+    concurrent workers never wait on each other; on SQLite the write
+    transaction itself serialises claims.
+    """
+    now = timezone.now()
+    due = Q(status=Job.QUEUED, run_at__lte=now) | Q(
+        status=Job.RUNNING, locked_at__lt=now - VISIBILITY_TIMEOUT
+    )
+
+    with transaction.atomic():
+        queryset = Job.objects.filter(due).order_by("run_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+
+        ids = list(queryset.values_list("id", flat=True)[:limit])
+        if not ids:
+            return []
+
+        Job.objects.filter(pk__in=ids).update(
+            status=Job.RUNNING,
+            locked_at=now,
+            locked_by=worker_id,
+            attempts=F("attempts") + 1,
+        )
+
+    return list(Job.objects.filter(pk__in=ids).order_by("run_at", "id"))
+
+
+def run(job):
+    try:
+        import_string(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        job.last_error = error
+
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error(f"Job {job.pk} ({job.task}) failed permanently:\n{error}")
+        else:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning(
+                f"Job {job.pk} ({job.task}) failed, retrying at {job.run_at}"
+            )
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.last_error = ""
+
+    job.locked_at = None
+    job.save(
+        update_fields=["status", "run_at", "finished_at", "last_error", "locked_at"]
+    )
+    return job.status
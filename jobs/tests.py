@@ -0,0 +1,141 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import queue
+from .management.commands import runworker
+from .models import Job
+
+CALLS = []
+
+
+def record(*args, **kwargs):
+    CALLS.append((args, kwargs))
+
+
+def explode():
+    raise RuntimeError("boom")
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_claim_takes_due_jobs_in_order(self):
+        first = queue.enqueue("jobs.tests.record", 1)
+        second = queue.enqueue("jobs.tests.record", 2)
+        queue.enqueue("jobs.tests.record", 3, delay=timedelta(hours=1))
+
+        claimed = queue.claim("w1", limit=5)
+        self.assertEqual([job.pk for job in claimed], [first.pk, second.pk])
+        for job in claimed:
+            self.assertEqual(job.status, Job.RUNNING)
+            self.assertEqual(job.locked_by, "w1")
+            self.assertEqual(job.attempts, 1)
+
+        # Claimed jobs are not handed out twice
+        self.assertEqual(queue.claim("w2", limit=5), [])
+
+    def test_jobs_of_dead_workers_are_reclaimed(self):
+        job = queue.enqueue("jobs.tests.record")
+        queue.claim("dead")
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - queue.VISIBILITY_TIMEOUT - timedelta(seconds=1)
+        )
+
+        (reclaimed,) = queue.claim("alive")
+        self.assertEqual(reclaimed.locked_by, "alive")
+        self.assertEqual(reclaimed.attempts, 2)
+
+    def test_run(self):
+        queue.enqueue("jobs.tests.record", 1, key="value")
+        (job,) = queue.claim("w1")
+
+        self.assertEqual(queue.run(job), Job.DONE)
+        self.assertEqual(CALLS, [((1,), {"key": "value"})])
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(job.locked_at)
+
+    def test_failures_retry_with_backoff(self):
+        queue.enqueue("jobs.tests.explode", max_attempts=3)
+        (job,) = queue.claim("w1")
+
+        before = timezone.now()
+        with self.assertLogs("jobs.queue", "WARNING"):
+            self.assertEqual(queue.run(job), Job.QUEUED)
+        job.refresh_from_db()
+        self.assertIn("RuntimeError: boom", job.last_error)
+        delay = (job.run_at - before).total_seconds()
+        self.assertGreaterEqual(delay, queue.BACKOFF_BASE * 0.8 - 1)
+        self.assertLessEqual(delay, queue.BACKOFF_BASE * 1.2 + 1)
+
+        # Not due until the backoff has passed
+        self.assertEqual(queue.claim("w1"), [])
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        with patch("jobs.queue.random.uniform", return_value=1):
+            delays = [queue.backoff(n).total_seconds() for n in (1, 2, 3, 20)]
+        self.assertEqual(delays, [5, 10, 20, queue.BACKOFF_MAX])
+
+    def test_exhausted_jobs_are_dead_lettered(self):
+        job = queue.enqueue("jobs.tests.explode", max_attempts=2)
+
+        for expected, level in [(Job.QUEUED, "WARNING"), (Job.FAILED, "ERROR")]:
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            (claimed,) = queue.claim("w1")
+            with self.assertLogs("jobs.queue", level):
+                self.assertEqual(queue.run(claimed), expected)
+
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(queue.claim("w1"), [])
+
+    def test_enqueue_once(self):
+        self.assertIsNotNone(queue.enqueue_once("jobs.tests.record"))
+        self.assertIsNone(queue.enqueue_once("jobs.tests.record"))
+
+
+class WorkerTests(TransactionTestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def run_worker(self):
+        out = StringIO()
+        call_command(
+            "runworker", "--once", "--concurrency=1", "--poll-interval=0", stdout=out
+        )
+        return out.getvalue()
+
+    def test_runs_due_jobs(self):
+        job = queue.enqueue("jobs.tests.record", 7)
+
+        output = self.run_worker()
+        self.assertIn("stopped after 1 jobs", output)
+        self.assertEqual(CALLS, [((7,), {})])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    @patch.object(runworker, "ERROR_BACKOFF_BASE", 0)
+    def test_survives_database_errors(self):
+        claim = queue.claim
+        errors = [OperationalError("database is locked")]
+
+        def flaky_claim(worker_id, limit=1):
+            if errors:
+                raise errors.pop()
+            return claim(worker_id, limit)
+
+        queue.enqueue("jobs.tests.record", 1)
+        with patch.object(queue, "claim", flaky_claim):
+            with self.assertLogs(runworker.logger, "ERROR"):
+                output = self.run_worker()
+
+        self.assertIn("stopped after 1 jobs", output)
+        self.assertEqual(CALLS, [((1,), {})])
@@ -1,4 +1,70 @@
 from django.contrib import admin
-from .models import Order
+from django.http import StreamingHttpResponse
 
-admin.site.register(Order)
+from . import rollups
+from .exports import csv_lines, export_queryset, iter_orders, jsonl_lines
+from .models import (
+    Order,
+    OrderItem,
+    SalesRollup,
+    StockReservation,
+    WebhookEvent,
+)
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ["product"]
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "total_price", "payment_status", "created_at"]
+    list_filter = ["payment_status"]
+    inlines = [OrderItemInline]
+    actions = ["export_csv", "export_jsonl"]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A refund or correction takes a counted order out of the rollups
+        if change and "payment_status" in form.changed_data:
+            rollups.schedule()
+
+    def stream_export(self, queryset, lines, content_type, filename):
+        # Rows are streamed straight from a database cursor, never held
+        orders = iter_orders(export_queryset(queryset))
+        response = StreamingHttpResponse(lines(orders), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.action(description="Export selected orders as CSV")
+    def export_csv(self, request, queryset):
+        return self.stream_export(queryset, csv_lines, "text/csv", "orders.csv")
+
+    @admin.action(description="Export selected orders as JSON lines")
+    def export_jsonl(self, request, queryset):
+        return self.stream_export(
+            queryset, jsonl_lines, "application/x-ndjson", "orders.jsonl"
+        )
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ["event_id", "event_type", "received_at", "processed_at"]
+    list_filter = ["event_type"]
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ["reference", "product", "quantity", "status", "expires_at"]
+    list_filter = ["status"]
+    raw_id_fields = ["product"]
+
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_display = ["bucket", "period", "dimension", "value", "revenue", "orders"]
+    list_filter = ["period", "dimension"]
+    date_hierarchy = "bucket"
+    ordering = ["-bucket"]
@@ -0,0 +1,165 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from products.pagination import keyset_after
+from .models import Order, OrderItem
+
+FORMATS = ("csv", "jsonl", "parquet")
+CHUNK_SIZE = 2000
+
+# Keyset order of an export by creation date
+EXPORT_KEYS = ("created_at", "id")
+# Keyset order of an incremental export; checkpoints store the last key.
+# A Pending order that is settled later moves past the checkpoint and is
+# exported again with its new status (consumers keep the latest per id).
+CHECKPOINT_KEYS = ("updated_at", "id")
+
+ORDER_FIELDS = [
+    "id",
+    "created_at",
+    "updated_at",
+    "user_id",
+    "name",
+    "email",
+    "phone",
+    "address",
+    "total_price",
+    "payment_status",
+    "razorpay_order_id",
+    "razorpay_payment_id",
+]
+ITEM_FIELDS = ["product_id", "product_name", "quantity", "unit_price"]
+
+# One CSV/parquet row per order line, order columns prefixed
+COLUMNS = [f"order_{f}" if f != "id" else "order_id" for f in ORDER_FIELDS]
+COLUMNS += ITEM_FIELDS
+INTEGER_COLUMNS = {"order_id", "order_user_id", "product_id", "quantity"}
+
+
+class ExportError(Exception):
+    pass
+
+
+def export_queryset(
+    queryset=None, since=None, until=None, after=None, incremental=False
+):
+    """
+    Orders to export, with their lines prefetched.
+
+    Oldest first by ``created_at``; an ``incremental`` export goes by
+    ``updated_at`` instead. ``after`` is a checkpoint ``[updated_at, id]``:
+    only orders changed past it are included, so repeated exports pick up
+    every new or changed order since the last one.
+    """
+    queryset = Order.objects.all() if queryset is None else queryset
+    keys = CHECKPOINT_KEYS if incremental or after else EXPORT_KEYS
+
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__lt=until)
+    if after:
+        queryset = queryset.filter(keyset_after(keys, after))
+
+    items = Prefetch(
+        "items",
+        queryset=OrderItem.objects.select_related("product").only(
+            "order_id", "quantity", "unit_price", "product__id", "product__name"
+        ),
+    )
+    return queryset.only(*ORDER_FIELDS).prefetch_related(items).order_by(*keys)
+
+
+def iter_orders(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Stream ``queryset`` a chunk at a time.
+
+    ``iterator()`` uses a server-side cursor on PostgreSQL and runs the
+    items prefetch once per chunk, so memory stays bounded by
+    ``chunk_size`` however many orders are exported.
+    """
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def order_record(order):
+    record = {field: getattr(order, field) for field in ORDER_FIELDS}
+    record["created_at"] = order.created_at.isoformat()
+    record["updated_at"] = order.updated_at.isoformat()
+    record["total_price"] = str(order.total_price)
+    record["items"] = [
+        {
+            "product_id": item.product_id,
+            "product_name": item.product.name,
+            "quantity": item.quantity,
+            "unit_price": str(item.unit_price),
+        }
+        for item in order.items.all()
+    ]
+    return record
+
+
+def flat_rows(record):
+    """Order record -> one row per line (a single blank line if none)."""
+    head = [record[field] for field in ORDER_FIELDS]
+    items = record["items"] or [dict.fromkeys(ITEM_FIELDS)]
+    for item in items:
+        yield head + [item[field] for field in ITEM_FIELDS]
+
+
+def csv_lines(orders, header=True):
+    """Yield CSV text for ``orders``; used for files and streamed responses."""
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+
+    if header:
+        yield writer.writerow(COLUMNS)
+    for order in orders:
+        yield "".join(writer.writerow(row) for row in flat_rows(order_record(order)))
+
+
+def jsonl_lines(orders):
+    for order in orders:
+        yield json.dumps(order_record(order)) + "\n"
+
+
+class _LineBuffer:
+    """File-like object that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def write_parquet(orders, path, chunk_size=CHUNK_SIZE):
+    """
+    Write ``orders`` to a Parquet file, one row group per chunk.
+
+    Needs the optional ``pyarrow`` package.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet output needs pyarrow: pip install pyarrow")
+
+    schema = pa.schema(
+        [
+            (name, pa.int64() if name in INTEGER_COLUMNS else pa.string())
+            for name in COLUMNS
+        ]
+    )
+
+    def flush(rows):
+        columns = dict(zip(COLUMNS, map(list, zip(*rows))))
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    with pq.ParquetWriter(path, schema) as writer:
+        rows = []
+        for count, order in enumerate(orders, start=1):
+            rows.extend(flat_rows(order_record(order)))
+            if count % chunk_size == 0:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
@@ -0,0 +1,135 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.models import Sum
+
+from orders import stock
+from orders.models import StockReservation
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Run many parallel checkouts against one product and check that "
+        "stock is never oversold"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checkouts", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--stock", type=int, default=100)
+        parser.add_argument("--quantity", type=int, default=1)
+        parser.add_argument(
+            "--fail-rate",
+            type=float,
+            default=0.1,
+            help="Fraction of reserved checkouts whose payment fails",
+        )
+        parser.add_argument(
+            "--product",
+            type=int,
+            help="Use an existing product instead of a temporary one",
+        )
+        parser.add_argument("--keep", action="store_true")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["product"]:
+            try:
+                product = Product.objects.get(pk=options["product"])
+            except Product.DoesNotExist:
+                raise CommandError(f"Product {options['product']} does not exist")
+            Product.objects.filter(pk=product.pk).update(stock=options["stock"])
+        else:
+            product = Product.objects.create(
+                name="Stock benchmark",
+                description="Temporary product for bench_stock",
+                price=1,
+                stock=options["stock"],
+                category="bench",
+            )
+
+        quantity = options["quantity"]
+        fail_rate = options["fail_rate"]
+        rng = random.Random(options["seed"])
+        outcomes = [rng.random() < fail_rate for _ in range(options["checkouts"])]
+        lock = threading.Lock()
+        counts = {"sold": 0, "released": 0, "rejected": 0, "errors": 0}
+        timings = []
+
+        def checkout(payment_fails):
+            close_old_connections()
+            reference = f"bench_{uuid.uuid4().hex[:14]}"
+            started = time.perf_counter()
+            try:
+                stock.reserve({product.pk: quantity}, reference)
+                if payment_fails:
+                    stock.release(reference)
+                    result = "released"
+                else:
+                    short = stock.commit(reference, {product.pk: quantity})
+                    result = "errors" if short else "sold"
+            except stock.OutOfStockError:
+                result = "rejected"
+            except Exception as e:
+                self.stderr.write(f"{reference}: {e}")
+                result = "errors"
+            finally:
+                connection.close()
+
+            with lock:
+                counts[result] += 1
+                timings.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(checkout, outcomes))
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db(fields=["stock"])
+        reserved = dict(
+            StockReservation.objects.filter(product=product)
+            .values_list("status")
+            .annotate(total=Sum("quantity"))
+        )
+        committed = reserved.get(StockReservation.COMMITTED, 0)
+        held = reserved.get(StockReservation.HELD, 0)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if timings else 0
+        self.stdout.write(
+            f"{len(outcomes)} checkouts in {elapsed:.2f}s "
+            f"({len(outcomes) / elapsed:.0f}/s, concurrency "
+            f"{options['concurrency']}): {counts['sold']} sold, "
+            f"{counts['released']} released, {counts['rejected']} rejected, "
+            f"{counts['errors']} errors"
+        )
+        self.stdout.write(
+            f"Latency p50 {statistics.median(timings) * 1000:.1f}ms, "
+            f"p95 {p95 * 1000:.1f}ms"
+        )
+
+        # Every unit is either still in stock, sold, or held by a checkout
+        # that errored out (and will be released when its hold expires).
+        ok = (
+            product.stock >= 0
+            and product.stock + committed + held == options["stock"]
+            and committed == counts["sold"] * quantity
+        )
+        summary = (
+            f"stock {options['stock']} -> {product.stock}, "
+            f"{committed} committed, {held} still held"
+        )
+
+        if not options["keep"] and not options["product"]:
+            product.delete()
+
+        if not ok:
+            raise CommandError(f"Stock mismatch: {summary}")
+        self.stdout.write(self.style.SUCCESS(f"No oversell: {summary}"))
@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from orders.exports import (
+    CHUNK_SIZE,
+    FORMATS,
+    ExportError,
+    csv_lines,
+    export_queryset,
+    iter_orders,
+    jsonl_lines,
+    write_parquet,
+)
+
+
+def parse_moment(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Not a date or datetime: {value}")
+        moment = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream orders and their lines to CSV, JSONL or Parquet in constant "
+        "memory. With --checkpoint, each run exports only orders placed or "
+        "changed (e.g. Pending -> Success) since the previous run; a changed "
+        "order appears again, keep the last row per order id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument(
+            "--output", default="-", help="File to write, '-' for stdout"
+        )
+        parser.add_argument("--since", help="Only orders created on/after this")
+        parser.add_argument("--until", help="Only orders created before this")
+        parser.add_argument(
+            "--checkpoint",
+            help="JSON file holding the last exported change; read and advanced",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        fmt = options["format"]
+        if fmt == "parquet" and output == "-":
+            raise CommandError("Parquet output needs --output")
+
+        checkpoint = self.load_checkpoint(options["checkpoint"])
+        queryset = export_queryset(
+            since=options["since"] and parse_moment(options["since"]),
+            until=options["until"] and parse_moment(options["until"]),
+            after=checkpoint.get("after"),
+            incremental=bool(options["checkpoint"]),
+        )
+
+        state = {"count": 0, "last": None}
+
+        def tracked(orders):
+            for order in orders:
+                state["count"] += 1
+                state["last"] = order
+                yield order
+
+        orders = tracked(iter_orders(queryset, options["chunk_size"]))
+        started = time.perf_counter()
+
+        # Write next to the target and rename at the end, so a failed run
+        # leaves neither a partial file nor an advanced checkpoint.
+        target = output if output != "-" else None
+        partial = f"{target}.part" if target else None
+
+        try:
+            if fmt == "parquet":
+                write_parquet(orders, partial, options["chunk_size"])
+            else:
+                lines = csv_lines(orders) if fmt == "csv" else jsonl_lines(orders)
+                if target:
+                    with open(partial, "w", newline="") as fh:
+                        fh.writelines(lines)
+                else:
+                    sys.stdout.writelines(lines)
+        except ExportError as e:
+            raise CommandError(str(e))
+        except BaseException:
+            if partial and os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        if partial:
+            os.replace(partial, target)
+
+        if options["checkpoint"] and state["last"] is not None:
+            last = state["last"]
+            self.save_checkpoint(
+                options["checkpoint"],
+                {
+                    "after": [last.updated_at.isoformat(), last.id],
+                    "exported": checkpoint.get("exported", 0) + state["count"],
+                },
+            )
+
+        self.stderr.write(
+            f"Exported {state['count']} orders as {fmt} "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def load_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path) as fh:
+            return json.load(fh)
+
+    def save_checkpoint(self, path, data):
+        partial = f"{path}.part"
+        with open(partial, "w") as fh:
+            json.dump(data, fh)
+        os.replace(partial, path)
@@ -0,0 +1,171 @@
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Razorpay-compatible endpoints used by checkout.
+
+    POST /v1/orders           create an order (as razorpay.Client expects)
+    GET  /v1/orders/<id>      fetch an order
+    POST /stub/pay/<id>       what checkout.js would post back: a payment id
+                              and a valid signature for the order
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def simulate(self):
+        server = self.server
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < server.error_rate:
+            self.send_json(
+                500,
+                {"error": {"code": "SERVER_ERROR", "description": "Stub failure"}},
+            )
+            return False
+        return True
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        payload = self.read_json()
+
+        if not self.simulate():
+            return
+
+        if parts == ["v1", "orders"]:
+            order = {
+                "id": f"order_{uuid.uuid4().hex[:14]}",
+                "entity": "order",
+                "amount": payload.get("amount"),
+                "currency": payload.get("currency", "INR"),
+                "status": "created",
+                "created_at": int(time.time()),
+            }
+            with self.server.lock:
+                self.server.orders[order["id"]] = order
+            self.send_json(200, order)
+        elif len(parts) == 3 and parts[:2] == ["stub", "pay"]:
+            order_id = parts[2]
+            payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+            signature = hmac.new(
+                self.server.key_secret.encode(),
+                f"{order_id}|{payment_id}".encode(),
+                hashlib.sha256,
+            ).hexdigest()
+            self.send_json(
+                200,
+                {
+                    "razorpay_order_id": order_id,
+                    "razorpay_payment_id": payment_id,
+                    "razorpay_signature": signature,
+                },
+            )
+        else:
+            self.send_json(404, {"error": {"code": "BAD_REQUEST_ERROR"}})
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+
+        if not self.simulate():
+            return
+
+        if len(parts) == 3 and parts[:2] == ["v1", "orders"]:
+            with self.server.lock:
+                order = self.server.orders.get(parts[2])
+            if order:
+                self.send_json(200, order)
+                return
+
+        self.send_json(
+            404,
+            {"error": {"code": "BAD_REQUEST_ERROR", "description": "Not found"}},
+        )
+
+
+def make_server(
+    host="127.0.0.1",
+    port=9100,
+    latency_ms=0,
+    jitter_ms=0,
+    error_rate=0.0,
+    key_secret=None,
+    verbose=False,
+):
+    """Build the stub server; run it with ``serve_forever()``."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.jitter = jitter_ms / 1000
+    server.error_rate = error_rate
+    server.key_secret = key_secret or settings.RAZORPAY_KEY_SECRET or ""
+    server.verbose = verbose
+    server.orders = {}
+    server.lock = threading.Lock()
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local Razorpay-compatible stub. Start checkout with "
+        "RAZORPAY_BASE_URL=http://<host>:<port> to load-test without the network."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9100)
+        parser.add_argument("--latency-ms", type=float, default=0)
+        parser.add_argument("--jitter-ms", type=float, default=0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--key-secret", default=None)
+        parser.add_argument("--verbose", action="store_true")
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options["host"],
+            options["port"],
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            key_secret=options["key_secret"],
+            verbose=options["verbose"],
+        )
+
+        self.stdout.write(
+            f"Razorpay stub listening on http://{options['host']}:{options['port']}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,142 @@
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client
+from django.urls import reverse
+
+from orders.models import Order
+from orders.webhooks import process_pending_events, sign
+
+
+def synthetic_event(rp_order_id, event_type):
+    payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+    return {
+        "id": f"evt_{uuid.uuid4().hex[:14]}",
+        "entity": "event",
+        "event": event_type,
+        "payload": {
+            "payment": {
+                "entity": {
+                    "id": payment_id,
+                    "order_id": rp_order_id,
+                    "status": (
+                        "captured" if event_type != "payment.failed" else "failed"
+                    ),
+                }
+            }
+        },
+        "created_at": int(time.time()),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay signed Razorpay webhook events against the webhook endpoint, "
+        "either from a JSONL file or generated for existing orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="JSONL file of recorded event payloads")
+        parser.add_argument("--count", type=int, default=1000)
+        parser.add_argument(
+            "--duplicate-rate",
+            type=float,
+            default=0.2,
+            help="Fraction of deliveries that resend an earlier event",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--url",
+            help="POST to a running server instead of the in-process test client",
+        )
+        parser.add_argument(
+            "--process",
+            action="store_true",
+            help="Apply the queued events after replaying them",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        secret = settings.RAZORPAY_WEBHOOK_SECRET
+        if not secret:
+            raise CommandError("RAZORPAY_WEBHOOK_SECRET must be set")
+
+        rng = random.Random(options["seed"])
+        events = self.load_events(options, rng)
+
+        deliveries = []
+        for event in events:
+            deliveries.append(event)
+            if deliveries and rng.random() < options["duplicate_rate"]:
+                deliveries.append(rng.choice(deliveries))
+
+        url = options["url"]
+        path = reverse("razorpay_webhook")
+
+        def deliver(event):
+            body = json.dumps(event).encode()
+            headers = {
+                "X-Razorpay-Signature": sign(body, secret),
+                "X-Razorpay-Event-Id": event["id"],
+            }
+            if url:
+                response = requests.post(url, data=body, headers=headers, timeout=10)
+                return response.status_code, response.json().get("duplicate")
+
+            close_old_connections()
+            response = Client().post(
+                path,
+                body,
+                content_type="application/json",
+                HTTP_HOST=settings.ALLOWED_HOSTS[0],
+                headers=headers,
+            )
+            return response.status_code, response.json().get("duplicate")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = list(pool.map(deliver, deliveries))
+        elapsed = time.perf_counter() - started
+
+        accepted = sum(1 for status, dup in results if status == 200 and not dup)
+        duplicates = sum(1 for status, dup in results if status == 200 and dup)
+        errors = sum(1 for status, dup in results if status != 200)
+
+        self.stdout.write(
+            f"{len(results)} deliveries in {elapsed:.2f}s "
+            f"({len(results) / elapsed * 60:.0f}/min): "
+            f"{accepted} new, {duplicates} duplicates, {errors} errors"
+        )
+
+        if options["process"]:
+            started = time.perf_counter()
+            processed = process_pending_events()
+            self.stdout.write(
+                f"Applied {processed} events in {time.perf_counter() - started:.2f}s"
+            )
+
+    def load_events(self, options, rng):
+        if options["file"]:
+            with open(options["file"]) as fh:
+                return [json.loads(line) for line in fh if line.strip()]
+
+        order_ids = list(
+            Order.objects.exclude(razorpay_order_id__isnull=True)
+            .exclude(razorpay_order_id="")
+            .values_list("razorpay_order_id", flat=True)[: options["count"]]
+        )
+        if not order_ids:
+            raise CommandError("No orders with a razorpay_order_id to replay against")
+
+        event_types = ["payment.captured", "order.paid", "payment.failed"]
+        return [
+            synthetic_event(rng.choice(order_ids), rng.choice(event_types))
+            for _ in range(options["count"])
+        ]
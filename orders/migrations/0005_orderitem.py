@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Turn the implicit order/product M2M table into the OrderItem model.
+
+    The existing orders_order_products rows are kept: the state change
+    adopts the table, then quantity/unit_price columns are added and the
+    table is renamed to the model's default name.
+    """
+
+    dependencies = [
+        ("orders", "0004_webhookevent"),
+        ("products", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="OrderItem",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "order",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="items",
+                                to="orders.order",
+                            ),
+                        ),
+                        (
+                            "product",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="products.product",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "orders_order_products",
+                        "unique_together": {("order", "product")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="order",
+                    name="products",
+                    field=models.ManyToManyField(
+                        through="orders.OrderItem", to="products.product"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="quantity",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AlterModelTable(
+            name="orderitem",
+            table=None,
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0007_order_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=10
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("total", "All sales"),
+                            ("product", "Product"),
+                            ("category", "Category"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("value", models.CharField(blank=True, max_length=100)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("orders", models.IntegerField(default=0)),
+                ("units", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="rolled_up_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(
+                    ("payment_status", "Success"), ("rolled_up_at", None)
+                ),
+                fields=["id"],
+                name="order_pending_rollup_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="salesrollup",
+            constraint=models.UniqueConstraint(
+                fields=("period", "dimension", "bucket", "value"),
+                name="unique_sales_rollup",
+            ),
+        ),
+    ]
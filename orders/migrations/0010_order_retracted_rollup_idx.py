@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0009_order_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(
+                    ("rolled_up_at__isnull", False),
+                    models.Q(("payment_status", "Success"), _negated=True),
+                ),
+                fields=["id"],
+                name="order_retracted_rollup_idx",
+            ),
+        ),
+    ]
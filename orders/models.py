@@ -1,21 +1,164 @@
+from django.conf import settings
 from django.db import models
 from products.models import Product
 
 
 class Order(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="orders",
+    )
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=100)
     email = models.EmailField(null=True, blank=True)
     address = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Moves on every save (payment status changes); incremental exports
+    # checkpoint on it so a settled Pending order is exported again
+    updated_at = models.DateTimeField(auto_now=True)
 
-    products = models.ManyToManyField(Product)
+    products = models.ManyToManyField(Product, through="OrderItem")
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
 
     razorpay_payment_id = models.CharField(max_length=200, null=True, blank=True)
-    razorpay_order_id = models.CharField(max_length=200, null=True, blank=True)
+    razorpay_order_id = models.CharField(
+        max_length=200, null=True, blank=True, db_index=True
+    )
     razorpay_signature = models.CharField(max_length=200, null=True, blank=True)
     payment_status = models.CharField(max_length=20, default="Pending")
+    # Set once a successful order has been added to SalesRollup, cleared
+    # again when it leaves Success and is taken out
+    rolled_up_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Order history: newest first within one customer
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_created_idx"
+            ),
+            # Exports: by creation date, and incrementally by last change
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="order_updated_idx"),
+            # Only paid orders still waiting for the rollup job
+            models.Index(
+                fields=["id"],
+                condition=models.Q(payment_status="Success", rolled_up_at=None),
+                name="order_pending_rollup_idx",
+            ),
+            # Counted orders that have left Success, to take out again
+            models.Index(
+                fields=["id"],
+                condition=models.Q(rolled_up_at__isnull=False)
+                & ~models.Q(payment_status="Success"),
+                name="order_retracted_rollup_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order: {self.name} | {self.total_price} | {self.payment_status}"
+
+
+class OrderItem(models.Model):
+    """One order line with the quantity and unit price at purchase time."""
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [("order", "product")]
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} @ {self.unit_price}"
+
+
+class StockReservation(models.Model):
+    """Stock held for a pending Razorpay order until payment or expiry."""
+
+    HELD = "held"
+    COMMITTED = "committed"
+    RELEASED = "released"
+    STATUS_CHOICES = [
+        (HELD, "Held"),
+        (COMMITTED, "Committed"),
+        (RELEASED, "Released"),
+    ]
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    reference = models.CharField(max_length=200, db_index=True)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "expires_at"], name="reservation_status_exp_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.reference}: {self.quantity} x {self.product_id} ({self.status})"
+
+
+class SalesRollup(models.Model):
+    """Revenue, orders and units per hour or day for one product or category."""
+
+    HOUR = "hour"
+    DAY = "day"
+    PERIOD_CHOICES = [(HOUR, "Hour"), (DAY, "Day")]
+
+    TOTAL = "total"
+    PRODUCT = "product"
+    CATEGORY = "category"
+    DIMENSION_CHOICES = [
+        (TOTAL, "All sales"),
+        (PRODUCT, "Product"),
+        (CATEGORY, "Category"),
+    ]
+
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    value = models.CharField(max_length=100, blank=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index dashboards scan: one dimension over a date range
+            models.UniqueConstraint(
+                fields=["period", "dimension", "bucket", "value"],
+                name="unique_sales_rollup",
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.period} {self.bucket:%Y-%m-%d %H:00} {self.dimension}={self.value}"
+        )
+
+
+class WebhookEvent(models.Model):
+    """Razorpay webhook delivery, deduplicated by Razorpay's event id."""
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.event_type} | {self.event_id}"
@@ -0,0 +1,206 @@
+import logging
+import random
+import threading
+import time
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+class CircuitOpenError(PaymentGatewayError):
+    pass
+
+
+class TimeoutSession(requests.Session):
+    """Keep-alive session with a connection pool and a default timeout."""
+
+    def __init__(self, timeout, pool_size):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+class CircuitBreaker:
+    """
+    Fail fast after ``threshold`` consecutive gateway failures.
+
+    Once open, calls are rejected until ``reset_after`` seconds have
+    passed; then one trial call is let through and its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, threshold=5, reset_after=30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial):
+                raise CircuitOpenError("Payment gateway circuit is open")
+            if state == "half-open":
+                self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                logger.error(
+                    f"Payment gateway circuit opened after {self.failures} failures"
+                )
+
+
+# Errors that mean the gateway (not our request) is unhealthy
+GATEWAY_FAILURES = (
+    requests.exceptions.RequestException,
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+)
+
+
+def never_sent(error):
+    """
+    True if ``error`` happened while connecting, before any byte was sent.
+
+    Only then is a non-idempotent POST safe to repeat. A ConnectionError
+    also covers connections reset after the request went out (urllib3
+    ProtocolError, RemoteDisconnected), which may have created an order.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    # requests wraps urllib3's MaxRetryError around the underlying error
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, NewConnectionError)
+
+
+class PaymentGateway:
+    """
+    Process-wide Razorpay client.
+
+    One pooled keep-alive session is shared by all requests in the worker,
+    every call is bounded by connect/read timeouts, failed connects are
+    retried with jittered exponential backoff, and a circuit breaker
+    stops a failing gateway from tying up workers.
+    """
+
+    def __init__(
+        self,
+        key_id,
+        key_secret,
+        base_url=None,
+        connect_timeout=3.05,
+        read_timeout=10,
+        max_retries=2,
+        backoff=0.2,
+        pool_size=10,
+        breaker=None,
+    ):
+        self.key_id = key_id
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = TimeoutSession((connect_timeout, read_timeout), pool_size)
+
+        options = {"base_url": base_url} if base_url else {}
+        self.client = razorpay.Client(
+            session=self.session,
+            auth=(key_id, key_secret),
+            **options,
+        )
+
+    def _call(self, func, *args):
+        self.breaker.before_call()
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = func(*args)
+            except GATEWAY_FAILURES as e:
+                if never_sent(e) and attempt < self.max_retries:
+                    delay = self.backoff * (2**attempt) * random.uniform(0.5, 1.5)
+                    logger.warning(
+                        f"Payment gateway retry {attempt + 1} in {delay:.2f}s: {e}"
+                    )
+                    time.sleep(delay)
+                    continue
+
+                self.breaker.record_failure()
+                raise PaymentGatewayError(str(e)) from e
+            except razorpay.errors.BadRequestError as e:
+                self.breaker.record_success()
+                raise PaymentGatewayError(str(e)) from e
+            except Exception as e:
+                # Anything unexpected still ends a half-open trial, or the
+                # breaker would wait for it forever and reject every call
+                self.breaker.record_failure()
+                raise PaymentGatewayError(str(e)) from e
+
+            self.breaker.record_success()
+            return result
+
+    def create_order(self, amount, currency="INR"):
+        return self._call(
+            self.client.order.create,
+            {"amount": amount, "currency": currency, "payment_capture": 1},
+        )
+
+    def verify_payment_signature(self, params):
+        # Local HMAC check; never touches the network
+        return self.client.utility.verify_payment_signature(params)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = PaymentGateway(
+                    settings.RAZORPAY_KEY_ID,
+                    settings.RAZORPAY_KEY_SECRET,
+                    base_url=settings.RAZORPAY_BASE_URL,
+                    connect_timeout=settings.RAZORPAY_CONNECT_TIMEOUT,
+                    read_timeout=settings.RAZORPAY_READ_TIMEOUT,
+                    max_retries=settings.RAZORPAY_MAX_RETRIES,
+                )
+    return _gateway
@@ -0,0 +1,241 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from jobs.queue import enqueue_once
+from .models import Order, OrderItem, SalesRollup
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TASK = "orders.rollups.record_pending_sales"
+BATCH_SIZE = 1000
+PERIODS = (SalesRollup.HOUR, SalesRollup.DAY)
+
+
+def schedule():
+    """Queue the rollup job; call after orders reach Success."""
+    enqueue_once(ROLLUP_TASK)
+
+
+def bucket_start(moment, period):
+    moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if period == SalesRollup.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def sales_deltas(order_ids):
+    """
+    Sum ``order_ids`` into ``{(period, bucket, dimension, value): [revenue,
+    orders, units]}`` with two queries, whatever the number of orders.
+
+    Product and category revenue is the sum of the lines; the total row
+    uses the order total (tax included), as charged. Orders from before
+    OrderItem existed have unpriced lines, so their total is split over
+    the lines by quantity instead.
+    """
+    deltas = defaultdict(lambda: [Decimal(0), 0, 0])
+    orders = {}
+
+    for order_id, created_at, total in Order.objects.filter(
+        pk__in=order_ids
+    ).values_list("id", "created_at", "total_price"):
+        orders[order_id] = (created_at, total, [])
+        for period in PERIODS:
+            row = deltas[
+                (period, bucket_start(created_at, period), SalesRollup.TOTAL, "")
+            ]
+            row[0] += total
+            row[1] += 1
+
+    lines = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        "order_id", "product_id", "product__category", "quantity", "unit_price"
+    )
+    for order_id, *line in lines:
+        orders[order_id][2].append(line)
+
+    for order_id, (created_at, total, lines) in orders.items():
+        counted = set()
+        for product_id, category, quantity, revenue in line_revenue(total, lines):
+            for period in PERIODS:
+                bucket = bucket_start(created_at, period)
+                deltas[(period, bucket, SalesRollup.TOTAL, "")][2] += quantity
+
+                for dimension, value in (
+                    (SalesRollup.PRODUCT, str(product_id)),
+                    (SalesRollup.CATEGORY, category),
+                ):
+                    key = (period, bucket, dimension, value)
+                    row = deltas[key]
+                    row[0] += revenue
+                    row[2] += quantity
+                    # An order with two lines in one category is still one order
+                    if key not in counted:
+                        counted.add(key)
+                        row[1] += 1
+
+    return deltas
+
+
+def line_revenue(total, lines):
+    """
+    Yield ``(product_id, category, quantity, revenue)`` for an order's lines.
+
+    Legacy lines (every ``unit_price`` 0) share ``total`` by quantity; the
+    last one takes the rounding remainder so the lines add up to it.
+    """
+    if any(unit_price for *_, unit_price in lines):
+        for product_id, category, quantity, unit_price in lines:
+            yield product_id, category, quantity, unit_price * quantity
+        return
+
+    units = sum(quantity for *_, quantity, _ in lines)
+    left = total
+    for n, (product_id, category, quantity, _) in enumerate(lines, 1):
+        share = (
+            left
+            if n == len(lines)
+            else (total * quantity / units).quantize(Decimal("0.01"))
+        )
+        left -= share
+        yield product_id, category, quantity, share
+
+
+def apply_deltas(deltas):
+    """
+    Add ``deltas`` to their rollup rows in a constant number of queries.
+
+    Missing rows are inserted first (ignoring ones a concurrent batch just
+    created), then every row is locked, incremented in Python and written
+    back with one bulk update.
+    """
+    SalesRollup.objects.bulk_create(
+        [
+            SalesRollup(period=period, bucket=bucket, dimension=dimension, value=value)
+            for period, bucket, dimension, value in deltas
+        ],
+        ignore_conflicts=True,
+    )
+
+    # Every column of unique_sales_rollup, so the lookup is an index search
+    rows = SalesRollup.objects.select_for_update().filter(
+        period__in={key[0] for key in deltas},
+        dimension__in={key[2] for key in deltas},
+        bucket__in={key[1] for key in deltas},
+        value__in={key[3] for key in deltas},
+    )
+    changed = []
+    for row in rows.order_by("id"):
+        key = (row.period, row.bucket, row.dimension, row.value)
+        if key in deltas:
+            revenue, orders, units = deltas[key]
+            row.revenue += revenue
+            row.orders += orders
+            row.units += units
+            changed.append(row)
+
+    SalesRollup.objects.bulk_update(
+        changed, ["revenue", "orders", "units"], batch_size=BATCH_SIZE
+    )
+    # Rows emptied by retracted orders go, as a backfill would not have them
+    SalesRollup.objects.filter(
+        pk__in=[row.pk for row in changed if not row.orders]
+    ).delete()
+
+
+def negated(deltas):
+    return {key: [-amount for amount in row] for key, row in deltas.items()}
+
+
+def record_sales_batch(batch_size=BATCH_SIZE):
+    """
+    Add one batch of paid, not yet counted orders to the rollups, and take
+    out counted orders that are no longer paid (refunded, or corrected in
+    the admin).
+
+    Orders are claimed and counted in the same transaction, so each one
+    is added or retracted exactly once even with several workers. Returns
+    the number of orders handled.
+    """
+    with transaction.atomic():
+        claimable = Order.objects.select_for_update(skip_locked=True).order_by("id")
+        order_ids = list(
+            claimable.filter(
+                payment_status="Success", rolled_up_at__isnull=True
+            ).values_list("id", flat=True)[:batch_size]
+        )
+        retracted_ids = list(
+            claimable.filter(rolled_up_at__isnull=False)
+            .exclude(payment_status="Success")
+            .values_list("id", flat=True)[: batch_size - len(order_ids)]
+        )
+        if not order_ids and not retracted_ids:
+            return 0
+
+        deltas = {}
+        if order_ids:
+            Order.objects.filter(pk__in=order_ids).update(rolled_up_at=timezone.now())
+            deltas = sales_deltas(order_ids)
+            apply_deltas(deltas)
+        if retracted_ids:
+            Order.objects.filter(pk__in=retracted_ids).update(rolled_up_at=None)
+            apply_deltas(negated(sales_deltas(retracted_ids)))
+
+    logger.info(
+        f"Rolled up {len(order_ids)} orders into {len(deltas)} rows, "
+        f"retracted {len(retracted_ids)}"
+    )
+    return len(order_ids) + len(retracted_ids)
+
+
+def record_pending_sales():
+    total = 0
+    while True:
+        done = record_sales_batch()
+        if not done:
+            return total
+        total += done
+
+
+def reset(since=None, until=None):
+    """
+    Drop the rollups for ``[since, until)`` (whole days) and mark their
+    orders as not counted, ready for ``record_pending_sales``.
+    """
+    rollups = SalesRollup.objects.all()
+    # Counted orders that have since left Success are uncounted as well
+    orders = Order.objects.filter(
+        Q(payment_status="Success") | Q(rolled_up_at__isnull=False)
+    )
+
+    if since:
+        since = bucket_start(since, SalesRollup.DAY)
+        rollups = rollups.filter(bucket__gte=since)
+        orders = orders.filter(created_at__gte=since)
+    if until:
+        until = bucket_start(until, SalesRollup.DAY)
+        rollups = rollups.filter(bucket__lt=until)
+        orders = orders.filter(created_at__lt=until)
+
+    with transaction.atomic():
+        rollups.delete()
+        return orders.update(rolled_up_at=None)
+
+
+def sales_series(period, dimension, since, until, value=None):
+    """
+    Rollup rows for a dashboard, oldest first.
+
+    Reads one row per bucket and key, so cost grows with the date range,
+    not with the number of orders in it.
+    """
+    rows = SalesRollup.objects.filter(
+        period=period, dimension=dimension, bucket__gte=since, bucket__lt=until
+    )
+    if value is not None:
+        rows = rows.filter(value=value)
+    return rows.order_by("bucket", "value")
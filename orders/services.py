@@ -0,0 +1,69 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+
+from .models import Order, OrderItem
+
+TAX_RATE = Decimal("0.10")
+
+# Orders only move forward: a late "failed" never undoes a success.
+# Cancelled (stock hold released) ranks with Pending, so it can still be paid
+STATUS_RANK = {"Pending": 0, "Cancelled": 0, "Failed": 1, "Success": 2}
+
+
+def to_money(value):
+    return Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def order_totals(subtotal):
+    """Return ``(tax, total)`` for a cart subtotal."""
+    tax = int(subtotal * float(TAX_RATE))
+    return tax, subtotal + tax
+
+
+def create_order(lines, **fields):
+    """
+    Persist an order and its lines in one transaction.
+
+    ``lines`` are hydrated cart products (with ``qty``); their current
+    price is snapshotted onto each OrderItem. Whatever the cart size this
+    is one INSERT for the order and one batched INSERT for the items.
+    """
+    with transaction.atomic():
+        order = Order.objects.create(**fields)
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    product_id=product.pk,
+                    quantity=product.qty,
+                    unit_price=to_money(product.price),
+                )
+                for product in lines
+            ]
+        )
+
+    return order
+
+
+def record_payment(order_id, status, **fields):
+    """
+    Move an order to payment ``status`` unless it is already further on.
+
+    The browser (``place_order``) and the webhook worker can both settle
+    the same order, so the row is locked. Empty ``fields`` (payment id,
+    signature) are filled in either way. Returns ``(order, changed)``.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id)
+
+        changed = STATUS_RANK[status] > STATUS_RANK.get(order.payment_status, 0)
+        if changed:
+            order.payment_status = status
+        for name, value in fields.items():
+            if value and not getattr(order, name):
+                setattr(order, name, value)
+
+        order.save(update_fields=["payment_status", "updated_at", *fields])
+
+    return order, changed
@@ -0,0 +1,205 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from jobs.queue import enqueue_once
+from products.models import Product
+from .models import Order, OrderItem, StockReservation
+
+logger = logging.getLogger(__name__)
+
+SWEEP_TASK = "orders.stock.release_expired"
+SWEEP_BATCH_SIZE = 500
+
+
+class OutOfStockError(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Product {product_id} does not have enough stock")
+        self.product_id = product_id
+
+
+def take(product_id, quantity):
+    """
+    Decrement stock only if ``quantity`` is still available.
+
+    A single conditional UPDATE: the check and the write happen under the
+    same row lock, so concurrent buyers can never push stock below zero.
+    """
+    return bool(
+        Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+            stock=F("stock") - quantity
+        )
+    )
+
+
+def restock(quantities):
+    """Give ``{product_id: quantity}`` back to stock in one UPDATE."""
+    if not quantities:
+        return
+
+    Product.objects.filter(pk__in=quantities).update(
+        stock=F("stock")
+        + Case(
+            *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def schedule_sweep(delay):
+    enqueue_once(SWEEP_TASK, delay=max(delay, timedelta(0)))
+
+
+def reserve(quantities, reference, ttl=None):
+    """
+    Hold ``{product_id: quantity}`` for a pending payment, all or nothing.
+
+    Raises OutOfStockError (and holds nothing) if any line cannot be
+    covered. The reservation rows are written before the decrements, so a
+    hot product's row lock is only held from its UPDATE to COMMIT.
+    """
+    ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+
+    with transaction.atomic():
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(
+                    product_id=product_id,
+                    reference=reference,
+                    quantity=qty,
+                    expires_at=expires_at,
+                )
+                for product_id, qty in quantities.items()
+            ]
+        )
+
+        # Same lock order everywhere, so multi-line carts cannot deadlock
+        for product_id in sorted(quantities):
+            if not take(product_id, quantities[product_id]):
+                raise OutOfStockError(product_id)
+
+    schedule_sweep(timedelta(seconds=ttl))
+    return expires_at
+
+
+def relabel(reference, new_reference):
+    """Move the holds of ``reference`` to ``new_reference``."""
+    return StockReservation.objects.filter(reference=reference).update(
+        reference=new_reference
+    )
+
+
+def order_quantities(orders):
+    """``{razorpay_order_id: {product_id: quantity}}`` from the order lines."""
+    quantities = {}
+    for reference, product_id, qty in OrderItem.objects.filter(
+        order__in=orders
+    ).values_list("order__razorpay_order_id", "product_id", "quantity"):
+        lines = quantities.setdefault(reference, Counter())
+        lines[product_id] += qty
+    return quantities
+
+
+def commit(reference, quantities):
+    """
+    Turn the holds for ``reference`` into a sale once payment succeeds.
+
+    Safe to call twice. Lines whose hold already expired are taken from
+    stock directly; returns the product ids that could not be covered.
+    """
+    with transaction.atomic():
+        holds = StockReservation.objects.filter(reference=reference)
+        holds.filter(status=StockReservation.HELD).update(
+            status=StockReservation.COMMITTED
+        )
+
+        covered = set(
+            holds.filter(status=StockReservation.COMMITTED).values_list(
+                "product_id", flat=True
+            )
+        )
+        short = [
+            product_id
+            for product_id in sorted(set(quantities) - covered)
+            if not take(product_id, quantities[product_id])
+        ]
+
+    if short:
+        logger.error(f"Paid order {reference} is short of stock for {short}")
+    return short
+
+
+def release_holds(queryset, limit=None):
+    """
+    Release the held rows of ``queryset`` and restock them together.
+
+    The Pending orders behind them are cancelled: without stock they
+    cannot be paid for from the checkout page any more. A late payment
+    webhook still moves them on to Success.
+    """
+    with transaction.atomic():
+        held = list(
+            queryset.select_for_update(skip_locked=True)
+            .filter(status=StockReservation.HELD)
+            .order_by("id")
+            .values_list("id", "reference", "product_id", "quantity")[:limit]
+        )
+        if not held:
+            return 0
+
+        StockReservation.objects.filter(pk__in=[row[0] for row in held]).update(
+            status=StockReservation.RELEASED
+        )
+
+        quantities = Counter()
+        for _, _, product_id, qty in held:
+            quantities[product_id] += qty
+        restock(quantities)
+
+        Order.objects.filter(
+            razorpay_order_id__in={row[1] for row in held}, payment_status="Pending"
+        ).update(payment_status="Cancelled", updated_at=timezone.now())
+
+    return len(held)
+
+
+def release(reference):
+    """Return the stock held for a failed or abandoned payment."""
+    return release_holds(StockReservation.objects.filter(reference=reference))
+
+
+def release_expired(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Release every hold past its expiry, one batch per transaction.
+
+    Runs as a job: it reschedules itself for the next pending expiry, so
+    at most one sweep is ever queued.
+    """
+    expired = StockReservation.objects.filter(expires_at__lte=timezone.now())
+
+    total = 0
+    while True:
+        released = release_holds(expired, batch_size)
+        if not released:
+            break
+        total += released
+
+    next_expiry = (
+        StockReservation.objects.filter(status=StockReservation.HELD)
+        .order_by("expires_at")
+        .values_list("expires_at", flat=True)
+        .first()
+    )
+    if next_expiry:
+        schedule_sweep(next_expiry - timezone.now())
+
+    if total:
+        logger.info(f"Released {total} expired stock reservations")
+    return total
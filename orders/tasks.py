@@ -0,0 +1,21 @@
+from products.utils import send_order_email
+from .models import Order
+
+
+def send_order_confirmation(order_id):
+    order = Order.objects.get(pk=order_id)
+
+    if not order.email:
+        return
+
+    # Raise on failure so the job queue retries with backoff
+    send_order_email(
+        to_email=order.email,
+        subject="Order Confirmation",
+        message=(
+            f"Thank you {order.name}! Your order ID is {order.id}\n"
+            f"Payment Amount: {order.total_price}\n"
+            f"Payment Status: {order.payment_status}"
+        ),
+        fail_silently=False,
+    )
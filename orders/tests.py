@@ -0,0 +1,1017 @@
+import csv
+import json
+import socket
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.client import RemoteDisconnected
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import skipUnless
+from unittest.mock import patch
+
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from jobs.models import Job
+from products.models import Product
+from products.tests import PLAIN_STATIC, QueryBudgetMixin, seed_catalog
+from . import exports, payments, rollups, stock, webhooks
+from .management.commands.razorpay_stub import make_server
+from .management.commands.replay_webhooks import synthetic_event
+from .models import Order, OrderItem, SalesRollup, StockReservation, WebhookEvent
+from .services import create_order, record_payment
+from .views import history_page
+
+
+def seed_orders(user, products, count=40, lines=3):
+    """``count`` paid orders of ``lines`` products each for ``user``."""
+    orders = []
+    for i in range(count):
+        items = [products[(i + n) % len(products)] for n in range(lines)]
+        for n, product in enumerate(items):
+            product.qty = 1 + n % 2
+
+        orders.append(
+            create_order(
+                items,
+                user=user,
+                name=user.username,
+                phone="9999999999",
+                email=user.email,
+                address="1 Test Street",
+                total_price=sum(p.price * p.qty for p in items),
+                razorpay_order_id=f"order_{i}",
+                payment_status="Success",
+            )
+        )
+    return orders
+
+
+# ---------------------------------------------------------
+# STOCK
+# ---------------------------------------------------------
+
+
+class StockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(3)
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def holds(self, reference, status=StockReservation.HELD):
+        return StockReservation.objects.filter(reference=reference, status=status)
+
+    def test_reserve_is_all_or_nothing(self):
+        first, second, _ = self.products
+        Product.objects.filter(pk=second.pk).update(stock=1)
+
+        with self.assertRaises(stock.OutOfStockError) as ctx:
+            stock.reserve({first.pk: 2, second.pk: 2}, "order_a")
+        self.assertEqual(ctx.exception.product_id, second.pk)
+        self.assertEqual(self.stock(first), 50)
+        self.assertFalse(StockReservation.objects.exists())
+
+        stock.reserve({first.pk: 2, second.pk: 1}, "order_b")
+        self.assertEqual((self.stock(first), self.stock(second)), (48, 0))
+        self.assertEqual(self.holds("order_b").count(), 2)
+        self.assertTrue(Job.objects.filter(task=stock.SWEEP_TASK).exists())
+
+    def test_commit_is_idempotent(self):
+        product = self.products[0]
+        stock.reserve({product.pk: 2}, "order_a")
+
+        for _ in range(2):
+            self.assertEqual(stock.commit("order_a", {product.pk: 2}), [])
+        self.assertEqual(self.stock(product), 48)
+        self.assertEqual(self.holds("order_a", StockReservation.COMMITTED).count(), 1)
+
+    def test_commit_after_expiry_takes_stock_directly(self):
+        first, second, _ = self.products
+        stock.reserve({first.pk: 2}, "order_a", ttl=0)
+        stock.release_expired()
+        self.assertEqual(self.stock(first), 50)
+
+        Product.objects.filter(pk=second.pk).update(stock=0)
+        with self.assertLogs("orders.stock", "ERROR"):
+            short = stock.commit("order_a", {first.pk: 2, second.pk: 1})
+        self.assertEqual(short, [second.pk])
+        self.assertEqual(self.stock(first), 48)
+
+    def test_release(self):
+        product = self.products[0]
+        stock.reserve({product.pk: 3}, "order_a")
+
+        self.assertEqual(stock.release("order_a"), 1)
+        self.assertEqual(stock.release("order_a"), 0)
+        self.assertEqual(self.stock(product), 50)
+
+        # Committed holds are sold, not released
+        stock.reserve({product.pk: 3}, "order_b")
+        stock.commit("order_b", {product.pk: 3})
+        self.assertEqual(stock.release("order_b"), 0)
+        self.assertEqual(self.stock(product), 47)
+
+    def test_sweep_releases_only_expired_holds(self):
+        first, second, _ = self.products
+        stock.reserve({first.pk: 1}, "order_live")
+        stock.reserve({first.pk: 2, second.pk: 2}, "order_gone", ttl=0)
+
+        self.assertEqual(stock.release_expired(batch_size=1), 2)
+        self.assertEqual((self.stock(first), self.stock(second)), (49, 50))
+        self.assertTrue(self.holds("order_live").exists())
+
+        # The next sweep is queued for the live hold
+        job = Job.objects.get(task=stock.SWEEP_TASK, status=Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+
+    def test_relabel(self):
+        product = self.products[0]
+        stock.reserve({product.pk: 1}, "hold_local")
+
+        self.assertEqual(stock.relabel("hold_local", "order_a"), 1)
+        self.assertTrue(self.holds("order_a").exists())
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class CheckoutStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(2)
+        cls.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        cls.other = User.objects.create_user("other", "other@example.com", "pw")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse("add_to_cart", args=[self.products[0].pk]))
+        self.gateway = FakeGateway()
+
+    def post(self, data, gateway=None):
+        with patch("products.views.get_gateway", return_value=gateway or self.gateway):
+            return self.client.post(reverse("checkout"), data)
+
+    def place_order(self, rp_order_id):
+        return self.post(
+            {
+                "place_order": "1",
+                "razorpay_order_id": rp_order_id,
+                "razorpay_payment_id": "pay_browser",
+                "razorpay_signature": "sig",
+            },
+            gateway=FakeGateway(valid=False),
+        )
+
+    def held(self):
+        return dict(
+            StockReservation.objects.filter(status=StockReservation.HELD).values_list(
+                "reference", "quantity"
+            )
+        )
+
+    def statuses(self):
+        return dict(Order.objects.values_list("razorpay_order_id", "payment_status"))
+
+    def test_sold_out_carts_never_reach_the_gateway(self):
+        Product.objects.filter(pk=self.products[0].pk).update(stock=0)
+
+        response = self.post({"create_payment": "1"})
+        self.assertContains(response, "does not have enough stock")
+        self.assertEqual(self.gateway.created, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_gateway_errors_release_the_hold(self):
+        with patch.object(self.gateway, "create_order", side_effect=OSError):
+            self.post({"create_payment": "1"})
+
+        self.assertEqual(self.held(), {})
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 50)
+
+    def test_repeated_clicks_replace_the_hold(self):
+        self.post({"create_payment": "1"})
+        self.post({"create_payment": "1"})
+
+        self.assertEqual(self.held(), {"order_fake2": 1})
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 49)
+        self.assertEqual(
+            self.statuses(), {"order_fake1": "Cancelled", "order_fake2": "Pending"}
+        )
+
+    def test_failed_payment_releases_only_the_customers_own_hold(self):
+        self.post({"create_payment": "1"})
+        stock.reserve({self.products[1].pk: 1}, "order_someone_else")
+
+        self.client.force_login(self.other)
+        self.place_order("order_fake1")
+        self.place_order("order_someone_else")
+        self.assertEqual(self.held(), {"order_fake1": 1, "order_someone_else": 1})
+
+        self.client.force_login(self.user)
+        self.place_order("order_fake1")
+        self.assertEqual(self.held(), {"order_someone_else": 1})
+
+    def test_webhook_success_commits_the_hold(self):
+        self.post({"create_payment": "1"})
+
+        event = synthetic_event("order_fake1", "payment.captured")
+        webhooks.record_event(event["id"], event)
+        webhooks.process_pending_events()
+
+        self.assertEqual(self.held(), {})
+        self.assertTrue(
+            StockReservation.objects.filter(
+                reference="order_fake1", status=StockReservation.COMMITTED
+            ).exists()
+        )
+
+        # Nothing left for the sweep to give back
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(stock.release_expired(), 0)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 49)
+
+    def test_expired_hold_cancels_the_pending_order(self):
+        self.post({"create_payment": "1"})
+        StockReservation.objects.update(expires_at=timezone.now())
+        stock.release_expired()
+        self.assertEqual(self.statuses(), {"order_fake1": "Cancelled"})
+
+        # A payment that still comes through settles it and takes the stock
+        event = synthetic_event("order_fake1", "payment.captured")
+        webhooks.record_event(event["id"], event)
+        webhooks.process_pending_events()
+        self.assertEqual(self.statuses(), {"order_fake1": "Success"})
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 49)
+
+
+# ---------------------------------------------------------
+# PAYMENT GATEWAY
+# ---------------------------------------------------------
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        clock = patch("orders.payments.time.monotonic", return_value=100.0)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        self.breaker = payments.CircuitBreaker(threshold=2, reset_after=30)
+
+    def open_circuit(self):
+        with self.assertLogs("orders.payments", "ERROR"):
+            self.breaker.record_failure()
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_failures(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.before_call()
+
+        with self.assertLogs("orders.payments", "ERROR"):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(payments.CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_half_open_lets_one_trial_through(self):
+        self.open_circuit()
+        self.clock.return_value += 30
+        self.assertEqual(self.breaker.state, "half-open")
+
+        self.breaker.before_call()
+        with self.assertRaises(payments.CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_failed_trial_reopens(self):
+        self.open_circuit()
+        self.clock.return_value += 30
+        self.breaker.before_call()
+
+        with self.assertLogs("orders.payments", "ERROR"):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+
+class PaymentGatewayTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = make_server(port=0, key_secret="stub_secret")
+        threading.Thread(
+            target=self.stub.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        self.url = f"http://127.0.0.1:{self.stub.server_address[1]}"
+
+    def gateway(self, url=None, **kwargs):
+        return payments.PaymentGateway(
+            "rzp_test", "stub_secret", base_url=url or self.url, **kwargs
+        )
+
+    def closed_port_url(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def test_create_order(self):
+        gateway = self.gateway()
+
+        order = gateway.create_order(49900)
+        self.assertEqual(order["amount"], 49900)
+        self.assertIn(order["id"], self.stub.orders)
+        self.assertEqual(gateway.breaker.state, "closed")
+
+    def test_failed_connects_are_retried_with_backoff(self):
+        gateway = self.gateway(self.closed_port_url(), max_retries=2, backoff=0.2)
+
+        with (
+            patch("orders.payments.random.uniform", return_value=1),
+            patch("orders.payments.time.sleep") as sleep,
+            self.assertLogs("orders.payments", "WARNING") as logs,
+            self.assertRaises(payments.PaymentGatewayError),
+        ):
+            gateway.create_order(100)
+
+        self.assertEqual([c.args for c in sleep.call_args_list], [(0.2,), (0.4,)])
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(gateway.breaker.failures, 1)
+
+    def test_read_timeouts_are_not_retried(self):
+        gateway = self.gateway(connect_timeout=1, read_timeout=0.2)
+        self.assertEqual(gateway.session.timeout, (1, 0.2))
+        self.stub.latency = 1
+        # The stub still answers after the client gave up; a broken pipe
+        self.stub.handle_error = lambda request, client_address: None
+
+        started = time.monotonic()
+        # A retry would log a warning first
+        with (
+            self.assertNoLogs("orders.payments", "WARNING"),
+            self.assertRaises(payments.PaymentGatewayError),
+        ):
+            gateway.create_order(100)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(gateway.breaker.failures, 1)
+
+    def test_server_errors_are_not_retried(self):
+        gateway = self.gateway()
+        self.stub.error_rate = 1
+
+        with (
+            self.assertNoLogs("orders.payments", "WARNING"),
+            self.assertRaises(payments.PaymentGatewayError),
+        ):
+            gateway.create_order(100)
+        self.assertEqual(gateway.breaker.failures, 1)
+
+    def test_only_unsent_requests_are_retryable(self):
+        refused = NewConnectionError(None, "Connection refused")
+        reset = ProtocolError("Connection aborted.", RemoteDisconnected("closed"))
+
+        for error, expected in [
+            (requests.exceptions.ConnectTimeout(), True),
+            (
+                requests.exceptions.ConnectionError(MaxRetryError(None, "/", refused)),
+                True,
+            ),
+            (requests.exceptions.ConnectionError(reset), False),
+            (requests.exceptions.ReadTimeout(), False),
+        ]:
+            with self.subTest(error=error):
+                self.assertIs(payments.never_sent(error), expected)
+
+    def test_unexpected_errors_end_the_half_open_trial(self):
+        gateway = self.gateway(breaker=payments.CircuitBreaker(reset_after=0))
+        gateway.breaker.opened_at = 0
+
+        with self.assertLogs("orders.payments", "ERROR"):
+            with self.assertRaises(payments.PaymentGatewayError):
+                gateway._call(lambda: 1 / 0)
+
+        # The next trial is let through instead of waiting forever
+        self.assertTrue(gateway.create_order(100)["id"])
+        self.assertEqual(gateway.breaker.state, "closed")
+
+
+# ---------------------------------------------------------
+# WEBHOOKS
+# ---------------------------------------------------------
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+class FakeGateway:
+    """Stands in for Razorpay: numbered orders, configurable verification."""
+
+    def __init__(self, valid=True):
+        self.valid = valid
+        self.created = 0
+
+    def create_order(self, amount, currency="INR"):
+        self.created += 1
+        return {"id": f"order_fake{self.created}", "amount": amount}
+
+    def verify_payment_signature(self, params):
+        if not self.valid:
+            raise ValueError("Signature mismatch")
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET, STORAGES=PLAIN_STATIC)
+class WebhookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(4)
+        cls.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+
+    def pending_order(self, rp_order_id="order_pending"):
+        (order,) = seed_orders(self.user, self.products, count=1)
+        Order.objects.filter(pk=order.pk).update(
+            razorpay_order_id=rp_order_id, payment_status="Pending"
+        )
+        return order
+
+    def deliver(self, event, secret=WEBHOOK_SECRET):
+        body = json.dumps(event).encode()
+        return self.client.post(
+            reverse("razorpay_webhook"),
+            body,
+            content_type="application/json",
+            headers={
+                "X-Razorpay-Signature": webhooks.sign(body, secret),
+                "X-Razorpay-Event-Id": event["id"],
+            },
+        )
+
+    def status(self, order):
+        order.refresh_from_db()
+        return order.payment_status
+
+    def test_bad_signatures_are_rejected(self):
+        event = synthetic_event("order_pending", "payment.captured")
+        self.assertEqual(self.deliver(event, secret="wrong").status_code, 400)
+
+        response = self.client.post(
+            reverse("razorpay_webhook"),
+            json.dumps(event),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_repeated_events_are_stored_once(self):
+        event = synthetic_event("order_pending", "payment.captured")
+
+        self.assertFalse(self.deliver(event).json()["duplicate"])
+        self.assertTrue(self.deliver(event).json()["duplicate"])
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_captured_payment_settles_the_pending_order(self):
+        order = self.pending_order()
+        event = synthetic_event("order_pending", "payment.captured")
+        webhooks.record_event(event["id"], event)
+
+        self.assertEqual(webhooks.process_pending_events(), 1)
+        self.assertEqual(self.status(order), "Success")
+        self.assertEqual(
+            order.razorpay_payment_id, event["payload"]["payment"]["entity"]["id"]
+        )
+        self.assertTrue(
+            Job.objects.filter(
+                task="orders.tasks.send_order_confirmation", args=[order.pk]
+            ).exists()
+        )
+        self.assertFalse(
+            WebhookEvent.objects.filter(processed_at__isnull=True).exists()
+        )
+
+    def test_statuses_only_move_forward(self):
+        order = self.pending_order()
+
+        for event_type, expected in [
+            ("payment.failed", "Failed"),
+            ("order.paid", "Success"),
+            ("payment.failed", "Success"),
+        ]:
+            event = synthetic_event("order_pending", event_type)
+            webhooks.record_event(event["id"], event)
+            webhooks.process_pending_events()
+            self.assertEqual(self.status(order), expected)
+
+    def test_malformed_events_are_skipped_not_retried(self):
+        order = self.pending_order()
+        for n, body in enumerate(
+            [{"payment": None}, {"payment": "x"}, {"payment": {"entity": []}}]
+        ):
+            webhooks.record_event(
+                f"evt_bad{n}", {"event": "payment.captured", "payload": body}
+            )
+        webhooks.record_event(
+            "evt_bad_id",
+            {
+                "event": "payment.captured",
+                "payload": {"payment": {"entity": {"order_id": 7}}},
+            },
+        )
+        event = synthetic_event("order_pending", "payment.captured")
+        webhooks.record_event(event["id"], event)
+
+        with self.assertLogs("orders.webhooks", "ERROR") as logs:
+            self.assertEqual(webhooks.process_pending_events(), 5)
+        # A null node is just absent; wrong types are malformed
+        self.assertEqual(len(logs.output), 3)
+        self.assertEqual(self.status(order), "Success")
+        self.assertFalse(
+            WebhookEvent.objects.filter(processed_at__isnull=True).exists()
+        )
+
+    def test_non_object_bodies_are_rejected(self):
+        body = json.dumps(["payment.captured"]).encode()
+        response = self.client.post(
+            reverse("razorpay_webhook"),
+            body,
+            content_type="application/json",
+            headers={"X-Razorpay-Signature": webhooks.sign(body, WEBHOOK_SECRET)},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_orders_are_flagged(self):
+        event = synthetic_event("order_unknown", "payment.captured")
+        webhooks.record_event(event["id"], event)
+
+        with self.assertLogs("orders.webhooks", "WARNING") as logs:
+            webhooks.process_pending_events()
+        self.assertIn("order_unknown", logs.output[0])
+
+    def test_webhook_settles_a_checkout_the_browser_abandoned(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse("add_to_cart", args=[self.products[0].pk]))
+        gateway = FakeGateway()
+
+        with patch("products.views.get_gateway", return_value=gateway):
+            self.client.post(reverse("checkout"), {"create_payment": "1"})
+
+        # The tab is closed; only the webhook reports the payment
+        order = Order.objects.get(razorpay_order_id="order_fake1")
+        self.assertEqual(order.payment_status, "Pending")
+        self.assertEqual(order.items.get().product_id, self.products[0].pk)
+
+        event = synthetic_event("order_fake1", "payment.captured")
+        webhooks.record_event(event["id"], event)
+        webhooks.process_pending_events()
+        self.assertEqual(self.status(order), "Success")
+
+        # A late browser callback settles the same row, not a second order
+        with patch("products.views.get_gateway", return_value=FakeGateway()):
+            response = self.client.post(
+                reverse("checkout"),
+                {
+                    "place_order": "1",
+                    "razorpay_order_id": "order_fake1",
+                    "razorpay_payment_id": "pay_browser",
+                    "razorpay_signature": "sig",
+                },
+            )
+        self.assertRedirects(
+            response, reverse("success"), fetch_redirect_response=False
+        )
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(
+            Job.objects.filter(task="orders.tasks.send_order_confirmation").count(), 1
+        )
+
+
+class WebhookReplayTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def test_replayed_file(self):
+        user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        paid, failed = seed_orders(user, seed_catalog(4), count=2)
+        Order.objects.filter(pk__in=[paid.pk, failed.pk]).update(
+            payment_status="Pending"
+        )
+        Order.objects.filter(pk=paid.pk).update(razorpay_order_id="order_a")
+        Order.objects.filter(pk=failed.pk).update(razorpay_order_id="order_b")
+
+        captured = synthetic_event("order_a", "payment.captured")
+        events = [captured, synthetic_event("order_b", "payment.failed"), captured]
+
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / "events.jsonl"
+            path.write_text("".join(json.dumps(e) + "\n" for e in events))
+
+            out = StringIO()
+            with self.settings(RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET):
+                call_command(
+                    "replay_webhooks",
+                    file=str(path),
+                    concurrency=1,
+                    duplicate_rate=0,
+                    process=True,
+                    stdout=out,
+                )
+
+        self.assertIn("2 new, 1 duplicates, 0 errors", out.getvalue())
+        self.assertIn("Applied 2 events", out.getvalue())
+        paid.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(paid.payment_status, "Success")
+        self.assertEqual(failed.payment_status, "Failed")
+
+
+# ---------------------------------------------------------
+# EXPORTS
+# ---------------------------------------------------------
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(4)
+        cls.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        cls.orders = seed_orders(cls.user, cls.products, count=3, lines=2)
+
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def export(self, fmt="jsonl", *args):
+        output = self.dir / f"orders.{fmt}"
+        call_command(
+            "export_orders",
+            f"--format={fmt}",
+            f"--output={output}",
+            *args,
+            stderr=StringIO(),
+        )
+        return output
+
+    def records(self, *args):
+        return [
+            json.loads(line)
+            for line in self.export("jsonl", *args).read_text().splitlines()
+        ]
+
+    def lines(self, orders=None):
+        """``(order_id, product_id, quantity, unit_price)`` for each line."""
+        items = OrderItem.objects.all()
+        if orders is not None:
+            items = items.filter(order__in=orders)
+        return sorted(
+            (order_id, product_id, qty, str(price))
+            for order_id, product_id, qty, price in items.values_list(
+                "order_id", "product_id", "quantity", "unit_price"
+            )
+        )
+
+    def test_csv_round_trip(self):
+        rows = list(csv.DictReader(StringIO(self.export("csv").read_text())))
+
+        self.assertEqual(list(rows[0]), exports.COLUMNS)
+        self.assertEqual(
+            sorted(
+                (
+                    int(r["order_id"]),
+                    int(r["product_id"]),
+                    int(r["quantity"]),
+                    r["unit_price"],
+                )
+                for r in rows
+            ),
+            self.lines(),
+        )
+        self.assertEqual(rows[0]["order_email"], self.user.email)
+
+    def test_jsonl_round_trip(self):
+        records = self.records()
+
+        self.assertEqual([r["id"] for r in records], [o.pk for o in self.orders])
+        self.assertEqual(
+            sorted(
+                (r["id"], i["product_id"], i["quantity"], i["unit_price"])
+                for r in records
+                for i in r["items"]
+            ),
+            self.lines(),
+        )
+        self.assertEqual(Decimal(records[0]["total_price"]), self.orders[0].total_price)
+
+    @skipUnless(find_spec("pyarrow"), "Parquet output needs pyarrow")
+    def test_parquet_round_trip(self):
+        import pyarrow.parquet as pq
+
+        rows = pq.read_table(self.export("parquet")).to_pylist()
+
+        self.assertEqual(
+            sorted(
+                (r["order_id"], r["product_id"], r["quantity"], r["unit_price"])
+                for r in rows
+            ),
+            self.lines(),
+        )
+
+    def test_admin_actions(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        selected = self.orders[:2]
+
+        for action, parse in [
+            ("export_csv", lambda text: list(csv.DictReader(StringIO(text)))),
+            ("export_jsonl", lambda text: list(map(json.loads, text.splitlines()))),
+        ]:
+            response = self.client.post(
+                reverse("admin:orders_order_changelist"),
+                {"action": action, "_selected_action": [o.pk for o in selected]},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("attachment", response["Content-Disposition"])
+            rows = parse(b"".join(response.streaming_content).decode())
+            ids = {int(r.get("order_id") or r.get("id")) for r in rows}
+            self.assertEqual(ids, {o.pk for o in selected})
+
+    def test_checkpoint_resume_picks_up_new_and_settled_orders(self):
+        checkpoint = f"--checkpoint={self.dir / 'checkpoint.json'}"
+        pending = self.orders[0]
+        Order.objects.filter(pk=pending.pk).update(payment_status="Pending")
+
+        first = self.records(checkpoint)
+        self.assertEqual([r["id"] for r in first], [o.pk for o in self.orders])
+        self.assertEqual(first[0]["payment_status"], "Pending")
+        self.assertEqual(self.records(checkpoint), [])
+
+        record_payment(pending.pk, "Success")
+        (new,) = seed_orders(self.user, self.products, count=1)
+
+        resumed = self.records(checkpoint)
+        self.assertEqual(
+            [(r["id"], r["payment_status"]) for r in resumed],
+            [(pending.pk, "Success"), (new.pk, "Success")],
+        )
+
+
+# ---------------------------------------------------------
+# SALES ROLLUPS
+# ---------------------------------------------------------
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(6)
+        cls.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        cls.orders = seed_orders(cls.user, cls.products, count=8)
+
+    def rows(self):
+        return {
+            (r.period, r.bucket, r.dimension, r.value): (r.revenue, r.orders, r.units)
+            for r in SalesRollup.objects.all()
+        }
+
+    def assertMatchesBackfill(self):
+        incremental = self.rows()
+        call_command("backfill_sales_rollups", stdout=StringIO())
+        self.assertEqual(incremental, self.rows())
+
+    def day(self, dimension, value=""):
+        bucket = rollups.bucket_start(self.orders[0].created_at, SalesRollup.DAY)
+        return SalesRollup.objects.get(
+            period=SalesRollup.DAY, bucket=bucket, dimension=dimension, value=value
+        )
+
+    def test_incremental_batches_match_a_backfill(self):
+        while rollups.record_sales_batch(batch_size=3):
+            pass
+        total = self.day(SalesRollup.TOTAL)
+        self.assertEqual(total.orders, 8)
+        self.assertEqual(total.revenue, sum(o.total_price for o in self.orders))
+        self.assertMatchesBackfill()
+
+    def test_refund_and_status_flip_are_taken_out(self):
+        rollups.record_pending_sales()
+        refunded, failed = self.orders[:2]
+        Order.objects.filter(pk=refunded.pk).update(payment_status="Refunded")
+        Order.objects.filter(pk=failed.pk).update(payment_status="Failed")
+
+        self.assertEqual(rollups.record_pending_sales(), 2)
+        self.assertEqual(rollups.record_pending_sales(), 0)
+        total = self.day(SalesRollup.TOTAL)
+        self.assertEqual(total.orders, 6)
+        self.assertEqual(total.revenue, sum(o.total_price for o in self.orders[2:]))
+        self.assertMatchesBackfill()
+
+        # Paid again after a correction: counted once more
+        Order.objects.filter(pk=failed.pk).update(payment_status="Success")
+        self.assertEqual(rollups.record_pending_sales(), 1)
+        self.assertEqual(self.day(SalesRollup.TOTAL).orders, 7)
+        self.assertMatchesBackfill()
+
+    def test_emptied_rows_are_removed(self):
+        order = self.orders[0]
+        earlier = order.created_at - timedelta(days=3)
+        Order.objects.filter(pk=order.pk).update(created_at=earlier)
+        rollups.record_pending_sales()
+        rows = SalesRollup.objects.filter(
+            bucket__lt=rollups.bucket_start(order.created_at, SalesRollup.DAY)
+        )
+        self.assertTrue(rows.exists())
+
+        Order.objects.filter(pk=order.pk).update(payment_status="Refunded")
+        rollups.record_pending_sales()
+        self.assertFalse(rows.exists())
+        self.assertMatchesBackfill()
+
+    def test_legacy_orders_use_the_order_total(self):
+        # Lines migrated from the old M2M table: quantity 1, no unit price
+        order = Order.objects.create(
+            name="old",
+            phone="1",
+            email="old@example.com",
+            address="x",
+            total_price=Decimal("100.00"),
+            payment_status="Success",
+        )
+        lamp, mug, vase = self.products[:3]
+        for product in (lamp, mug, vase):
+            OrderItem.objects.create(order=order, product=product)
+
+        deltas = rollups.sales_deltas([order.pk])
+        bucket = rollups.bucket_start(order.created_at, SalesRollup.DAY)
+        revenue = [
+            deltas[(SalesRollup.DAY, bucket, SalesRollup.PRODUCT, str(p.pk))][0]
+            for p in (lamp, mug, vase)
+        ]
+        self.assertEqual(
+            revenue, [Decimal("33.33"), Decimal("33.33"), Decimal("33.34")]
+        )
+        categories = sum(
+            row[0]
+            for (period, _, dimension, _), row in deltas.items()
+            if period == SalesRollup.DAY and dimension == SalesRollup.CATEGORY
+        )
+        self.assertEqual(categories, Decimal("100.00"))
+
+    def test_admin_status_change_schedules_the_job(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        order = self.orders[0]
+        url = reverse("admin:orders_order_change", args=[order.pk])
+        data = {
+            "name": order.name,
+            "phone": order.phone,
+            "email": order.email,
+            "address": order.address,
+            "total_price": order.total_price,
+            "payment_status": "Refunded",
+            "items-TOTAL_FORMS": 0,
+            "items-INITIAL_FORMS": 0,
+        }
+        with patch.object(rollups, "schedule") as schedule:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        schedule.assert_called_once_with()
+
+
+# ---------------------------------------------------------
+# QUERY BUDGETS
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class OrderHistoryQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        seed_orders(cls.user, seed_catalog(12))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # The first request after login re-saves the session
+        self.client.get(reverse("cart_summary"))
+        cache.clear()
+
+    def test_order_history(self):
+        # Session, user with profile, cart badge, orders, items
+        with self.assertMaxQueries(5):
+            response = self.client.get(reverse("order_history"))
+        self.assertEqual(len(response.context["orders"]), 24)
+
+        cache.clear()
+        with self.assertMaxQueries(5):
+            response = self.client.get(response.context["next_url"])
+        self.assertEqual(len(response.context["orders"]), 16)
+
+    def test_order_history_api(self):
+        # Session, user, orders, items
+        with self.assertMaxQueries(4):
+            response = self.client.get(reverse("order_history_api") + "?page_size=100")
+        orders = response.json()["orders"]
+        self.assertEqual(len(orders), 40)
+        self.assertEqual(len(orders[0]["items"]), 3)
+
+
+# ---------------------------------------------------------
+# QUERY PLANS
+# ---------------------------------------------------------
+
+
+class OrderPlanTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(12)
+        cls.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        cls.orders = seed_orders(cls.user, cls.products)
+
+    def test_history(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        cursor = history_page(request).next_cursor
+
+        for query in ["", f"?cursor={cursor}"]:
+            request = RequestFactory().get("/" + query)
+            request.user = self.user
+            self.assertIndexedPlans("orders_order", lambda: list(history_page(request)))
+            self.assertIndexedPlans(
+                "orders_orderitem", lambda: list(history_page(request))
+            )
+
+    def test_rollups(self):
+        self.assertIndexedPlans("orders_order", rollups.record_sales_batch)
+
+        rollups.reset()
+        self.assertIndexedPlans("orders_orderitem", rollups.record_sales_batch)
+
+        rollups.reset()
+        self.assertIndexedPlans("orders_salesrollup", rollups.record_sales_batch)
+
+        Order.objects.filter(pk=self.orders[0].pk).update(payment_status="Refunded")
+        self.assertIndexedPlans("orders_order", rollups.record_sales_batch)
+
+        now = timezone.now()
+        self.assertIndexedPlans(
+            "orders_salesrollup",
+            lambda: list(
+                rollups.sales_series(
+                    SalesRollup.DAY,
+                    SalesRollup.CATEGORY,
+                    now - timedelta(days=30),
+                    now + timedelta(days=1),
+                )
+            ),
+        )
+
+    def test_exports(self):
+        since = timezone.now() - timedelta(days=1)
+        self.assertIndexedPlans(
+            "orders_order", lambda: list(exports.export_queryset(since=since))
+        )
+        self.assertIndexedPlans(
+            "orders_order",
+            lambda: list(exports.export_queryset(after=[since.isoformat(), 0])),
+        )
+
+    def test_stock_holds(self):
+        stock.reserve({self.products[0].pk: 1}, "order_hold")
+        self.assertIndexedPlans(
+            "orders_stockreservation", lambda: stock.release("order_hold")
+        )
+
+        stock.reserve({self.products[0].pk: 1}, "order_expired", ttl=0)
+        self.assertIndexedPlans("orders_stockreservation", stock.release_expired)
+        self.assertFalse(
+            StockReservation.objects.filter(status=StockReservation.HELD).exists()
+        )
+
+    def test_webhook_batch(self):
+        WebhookEvent.objects.create(
+            event_id="evt_1",
+            event_type="payment.failed",
+            payload={"payload": {"payment": {"entity": {"order_id": "order_3"}}}},
+        )
+
+        self.assertIndexedPlans("orders_webhookevent", webhooks.process_batch)
+        WebhookEvent.objects.update(processed_at=None)
+        self.assertIndexedPlans("orders_order", webhooks.process_batch)
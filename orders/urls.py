@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+
+urlpatterns = [
+    path("history/", views.order_history, name="order_history"),
+    path("api/history/", views.order_history_api, name="order_history_api"),
+    path("webhooks/razorpay/", views.razorpay_webhook, name="razorpay_webhook"),
+]
@@ -0,0 +1,110 @@
+import json
+import logging
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db.models import Prefetch
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from products.pagination import next_page_url, paginate
+from .models import Order, OrderItem
+from .webhooks import record_event, verify_signature
+
+logger = logging.getLogger(__name__)
+
+# Newest first; matches order_user_created_idx
+HISTORY_KEYS = ("-created_at", "-id")
+
+
+def history_page(request):
+    """
+    One page of the customer's orders with their lines.
+
+    Always two queries: an index range scan for the orders and one
+    prefetch for all of their items (with product names joined in).
+    """
+    items = Prefetch(
+        "items",
+        queryset=OrderItem.objects.select_related("product").only(
+            "order_id", "quantity", "unit_price", "product__id", "product__name"
+        ),
+    )
+    queryset = Order.objects.filter(user=request.user).prefetch_related(items)
+
+    return paginate(
+        queryset,
+        cursor=request.GET.get("cursor"),
+        page_size=request.GET.get("page_size"),
+        keys=HISTORY_KEYS,
+    )
+
+
+def serialize_order(order):
+    return {
+        "id": order.id,
+        "created_at": order.created_at.isoformat(),
+        "total_price": str(order.total_price),
+        "payment_status": order.payment_status,
+        "items": [
+            {
+                "product_id": item.product_id,
+                "name": item.product.name,
+                "quantity": item.quantity,
+                "unit_price": str(item.unit_price),
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+@login_required(login_url="login")
+def order_history(request):
+    page = history_page(request)
+
+    return render(
+        request,
+        "orders/history.html",
+        {"orders": page, "next_url": next_page_url(request, page)},
+    )
+
+
+@login_required(login_url="login")
+def order_history_api(request):
+    page = history_page(request)
+
+    return JsonResponse(
+        {
+            "orders": [serialize_order(order) for order in page],
+            "next_cursor": page.next_cursor,
+            "next_url": next_page_url(request, page),
+        }
+    )
+
+
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    signature = request.headers.get("X-Razorpay-Signature")
+
+    if not verify_signature(request.body, signature, settings.RAZORPAY_WEBHOOK_SECRET):
+        logger.warning("Rejected Razorpay webhook with a bad signature")
+        return HttpResponse("Invalid signature", status=400)
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponse("Invalid JSON", status=400)
+    if not isinstance(payload, dict):
+        return HttpResponse("Invalid JSON", status=400)
+
+    event_id = request.headers.get("X-Razorpay-Event-Id") or payload.get("id")
+    if not event_id:
+        return HttpResponse("Missing event id", status=400)
+
+    # Status changes are applied in batches by the job worker
+    created = record_event(event_id, payload)
+
+    return JsonResponse({"received": True, "duplicate": not created})
@@ -0,0 +1,166 @@
+import hashlib
+import hmac
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue, enqueue_once
+from . import rollups, stock
+from .models import Order, WebhookEvent
+from .services import STATUS_RANK
+
+logger = logging.getLogger(__name__)
+
+PROCESS_TASK = "orders.webhooks.process_pending_events"
+BATCH_SIZE = 500
+
+# Event type -> payment status it moves an order to
+EVENT_STATUS = {
+    "payment.captured": "Success",
+    "order.paid": "Success",
+    "payment.failed": "Failed",
+}
+
+
+def sign(body, secret):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature, secret):
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(body, secret), signature)
+
+
+def record_event(event_id, payload):
+    """
+    Store one delivery; returns False if the event id was already seen.
+
+    The unique index on ``event_id`` does the deduplication, so retried
+    deliveries cost a single conflicting insert.
+    """
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                event_id=event_id,
+                event_type=payload.get("event", ""),
+                payload=payload,
+            )
+    except IntegrityError:
+        return False
+
+    enqueue_once(PROCESS_TASK)
+
+    return True
+
+
+def _object(value):
+    """A JSON object node; missing or null nodes read as empty."""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(f"expected an object, got {type(value).__name__}")
+    return value
+
+
+def event_target(payload):
+    """
+    Return ``(razorpay_order_id, razorpay_payment_id)`` for an event.
+
+    Raises ValueError when the payload does not have Razorpay's shape.
+    """
+    body = _object(_object(payload).get("payload"))
+    payment = _object(_object(body.get("payment")).get("entity"))
+    order = _object(_object(body.get("order")).get("entity"))
+
+    rp_order_id = payment.get("order_id") or order.get("id")
+    rp_payment_id = payment.get("id")
+    for value in (rp_order_id, rp_payment_id):
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"expected a string id, got {value!r}")
+    return rp_order_id, rp_payment_id
+
+
+def process_batch(batch_size=BATCH_SIZE):
+    """
+    Apply one batch of unprocessed events in a single transaction.
+
+    Events are folded per Razorpay order first, so a burst of deliveries
+    for the same order becomes one row update. Returns the number of
+    events consumed.
+    """
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        updates = {}
+        for event in events:
+            status = EVENT_STATUS.get(event.event_type)
+            try:
+                rp_order_id, rp_payment_id = event_target(event.payload)
+            except ValueError as e:
+                # Marked processed with the batch: retrying cannot fix it,
+                # and raising would roll back and block every later event
+                logger.error(f"Skipping malformed webhook event {event.event_id}: {e}")
+                continue
+            if not status or not rp_order_id:
+                continue
+
+            current = updates.get(rp_order_id)
+            if current is None or STATUS_RANK[status] > STATUS_RANK[current[0]]:
+                updates[rp_order_id] = (status, rp_payment_id)
+
+        # Checkout creates a Pending order with the Razorpay order, so even
+        # a payment whose browser never came back has a row to settle
+        changed = []
+        matched = set()
+        now = timezone.now()
+        orders = Order.objects.select_for_update().filter(razorpay_order_id__in=updates)
+        for order in orders:
+            matched.add(order.razorpay_order_id)
+            status, rp_payment_id = updates[order.razorpay_order_id]
+            if STATUS_RANK[status] > STATUS_RANK.get(order.payment_status, 0):
+                order.payment_status = status
+                order.razorpay_payment_id = order.razorpay_payment_id or rp_payment_id
+                order.updated_at = now
+                changed.append(order)
+
+        unmatched = sorted(set(updates) - matched)
+        if unmatched:
+            logger.warning(f"Webhook events for unknown Razorpay orders: {unmatched}")
+
+        Order.objects.bulk_update(
+            changed, ["payment_status", "razorpay_payment_id", "updated_at"]
+        )
+        paid = [order for order in changed if order.payment_status == "Success"]
+        # The browser may never come back, so the hold is committed here too;
+        # commit() is idempotent when the checkout callback also does it
+        for reference, quantities in stock.order_quantities(paid).items():
+            stock.commit(reference, quantities)
+        for order in paid:
+            enqueue("orders.tasks.send_order_confirmation", order.pk)
+        if paid:
+            rollups.schedule()
+        WebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(
+            processed_at=now
+        )
+
+    logger.info(
+        f"Processed {len(events)} webhook events, updated {len(changed)} orders"
+    )
+    return len(events)
+
+
+def process_pending_events():
+    total = 0
+    while True:
+        done = process_batch()
+        if not done:
+            return total
+        total += done
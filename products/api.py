@@ -0,0 +1,85 @@
+import hashlib
+import json
+
+from . import cache as catalog_cache
+from .images import FORMATS, built
+
+# Fields a client may ask for with ?fields=; stock is left out on purpose,
+# checkout changes it without bumping the catalog versions ETags rely on.
+API_FIELDS = (
+    "id",
+    "name",
+    "description",
+    "price",
+    "category",
+    "url",
+    "image",
+    "image_variants",
+)
+
+
+class FieldError(ValueError):
+    pass
+
+
+def parse_fields(value):
+    """Return the requested fields in order, or all of them if none given."""
+    if not value:
+        return API_FIELDS
+
+    fields = list(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown:
+        raise FieldError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or API_FIELDS
+
+
+def image_variants(product):
+    storage = product.image.storage
+    return {
+        name: {
+            "width": entry["width"],
+            **{ext: storage.url(entry[ext]) for _, ext, _ in FORMATS if ext in entry},
+        }
+        for name, entry in built(product.image_variants).items()
+    }
+
+
+def serialize_product(product, fields):
+    data = {}
+    for field in fields:
+        if field == "url":
+            data[field] = product.get_absolute_url()
+        elif field == "image":
+            data[field] = product.image.url if product.image else None
+        elif field == "image_variants":
+            data[field] = image_variants(product) if product.image else {}
+        else:
+            data[field] = getattr(product, field)
+    return data
+
+
+def stream_page(page, fields, next_url):
+    """Yield a page of products as one JSON document, a product at a time."""
+    yield '{"results":['
+    for i, product in enumerate(page):
+        yield ("," if i else "") + json.dumps(serialize_product(product, fields))
+    yield "],"
+
+    tail = {"next_cursor": page.next_cursor, "next_url": next_url}
+    if page.total_count is not None:
+        tail["count"] = page.total_count
+    yield json.dumps(tail)[1:]
+
+
+def make_etag(request, scopes):
+    """
+    Strong ETag for a GET from the current versions of ``scopes``.
+
+    Only the cache is consulted, so a client holding the current tag gets
+    its 304 without touching the database.
+    """
+    versions = catalog_cache.get_versions(scopes)
+    params = sorted(request.GET.lists())
+    raw = f"{request.path}|{params}|{versions}"
+    return hashlib.sha1(raw.encode()).hexdigest()
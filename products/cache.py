@@ -0,0 +1,120 @@
+import hashlib
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ecom_project import routers
+from .models import Product
+
+CATALOG = "catalog"
+# Facet sidebar counts, shown on every listing page
+FACETS = "facets"
+MISSING = object()
+
+
+def product_scope(product_id):
+    return f"product:{product_id}"
+
+
+def category_scope(category):
+    return "category:" + hashlib.md5(category.encode()).hexdigest()[:12]
+
+
+def _version_key(scope):
+    return f"catalog:version:{scope}"
+
+
+def get_versions(scopes):
+    """Fetch the version stamps for ``scopes`` with a single cache round trip."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+
+    # Seed missing (or evicted) stamps from the clock so they never reuse a
+    # value an older cache entry was stored under.
+    missing = {key: time.time_ns() // 1000 for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+
+    return [found[key] for key in keys]
+
+
+def get_version(scope=CATALOG):
+    return get_versions([scope])[0]
+
+
+def bump(*scopes):
+    # A stamp is the time of the last change, which also makes it usable as
+    # Last-Modified; it still always moves forward if the clock does not.
+    keys = [_version_key(scope) for scope in scopes]
+    current = cache.get_many(keys)
+    now = time.time_ns() // 1000
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None
+    )
+
+
+def bump_product(product, old_category=None):
+    scopes = [CATALOG, product_scope(product.pk), category_scope(product.category)]
+    if old_category is not None and old_category != product.category:
+        scopes.append(category_scope(old_category))
+    bump(*scopes)
+
+
+def fresh_reads(versions):
+    """
+    Read from the primary if a scope changed within DATABASE_PIN_SECONDS.
+
+    A replica may still serve the old rows then, and whatever is built
+    would be cached (here or downstream) under the new version.
+    """
+    age = time.time_ns() // 1000 - max(versions)
+    if age < settings.DATABASE_PIN_SECONDS * 1_000_000:
+        return routers.primary()
+    return nullcontext()
+
+
+def make_key(name, parts, versions):
+    digest = hashlib.md5(":".join(str(p) for p in parts).encode()).hexdigest()
+    return f"catalog:{name}:{digest}:" + ".".join(str(v) for v in versions)
+
+
+def cached(name, parts, builder, scopes=(CATALOG,), timeout=None):
+    """
+    Return ``builder()`` cached under the current versions of ``scopes``.
+
+    Entries are never deleted; bumping a scope's version makes every key
+    built from it unreachable and the old entries simply age out.
+    """
+    versions = get_versions(scopes)
+    key = make_key(name, parts, versions)
+    value = cache.get(key, MISSING)
+
+    if value is MISSING:
+        with fresh_reads(versions):
+            value = builder()
+        if timeout is None:
+            timeout = settings.CATALOG_CACHE_TIMEOUT
+        cache.set(key, value, timeout)
+
+    return value
+
+
+def get_product(product_id):
+    return cached(
+        "product",
+        [product_id],
+        lambda: Product.objects.filter(pk=product_id).first(),
+        scopes=[product_scope(product_id)],
+    )
+
+
+def attach_versions(products):
+    """Set ``cache_version`` on each product for keying its rendered card."""
+    products = list(products)
+    versions = get_versions([product_scope(p.pk) for p in products])
+    for product, version in zip(products, versions):
+        product.cache_version = version
+    return products
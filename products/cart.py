@@ -0,0 +1,298 @@
+import logging
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue_once
+from . import cache as catalog_cache
+from .models import Product, SavedCart
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = "cart_id"
+COOKIE_MAX_AGE = 30 * 24 * 60 * 60
+SWEEP_TASK = "products.cart.delete_expired_visitor_carts"
+SWEEP_INTERVAL = timedelta(days=1)
+SWEEP_BATCH_SIZE = 1000
+LINE_FIELDS = ("id", "name", "price", "image", "image_variants", "category")
+OPERATIONS = ("add", "set", "remove", "clear")
+# Per line; checkout still reserves against the real stock
+MAX_QTY = 99
+# Where carts lived before SavedCart; merged on the owner's next read
+LEGACY_SESSION_KEY = "cart"
+
+
+class CartError(ValueError):
+    pass
+
+
+class Cart:
+    """
+    Server-side cart of ``{product_id: qty}`` stored in ``SavedCart``.
+
+    Logged-in users own one row; visitors are identified by the
+    ``cart_id`` cookie, set by ``CartCookieMiddleware`` on their first
+    write. Reads are one unique-key lookup of the row (never a per-process
+    cache another worker could have made stale), and every mutation,
+    single or batched, is one locked read-modify-write of it.
+
+    ``hydrate`` loads every product in the cart with a single ``in_bulk``
+    query, drops ids that no longer exist and fills ``products`` (each with
+    ``qty`` and ``total`` set) and ``subtotal`` in one pass.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._data = None
+        self.products = []
+        self.subtotal = 0
+
+    # -----------------------------
+    # OWNER
+    # -----------------------------
+    def _owner(self):
+        user = self.request.user
+        if user.is_authenticated:
+            return {"user": user}
+
+        token = getattr(self.request, "_cart_token", None)
+        if token is None:
+            token = self.request.COOKIES.get(COOKIE_NAME)
+        if token:
+            return {"token": token, "user": None}
+
+        return None
+
+    # -----------------------------
+    # READ
+    # -----------------------------
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def _loaded(self, lookup):
+        # Every Cart of a request (view, context processor) shares one read
+        if not hasattr(self.request, "_carts"):
+            self.request._carts = {}
+        user = lookup.get("user")
+        key = ("user", user.pk) if user else ("visitor", lookup["token"])
+        return self.request._carts, key
+
+    def _load(self):
+        legacy = self._pop_session_cart()
+        if legacy:
+            try:
+                return self.apply(
+                    {"op": "add", "product_id": pk, "qty": qty}
+                    for pk, qty in legacy.items()
+                )
+            except CartError as e:
+                logger.warning(f"Dropping unreadable session cart {legacy}: {e}")
+
+        lookup = self._owner()
+        if lookup is None:
+            return {}
+
+        loaded, key = self._loaded(lookup)
+        if key not in loaded:
+            loaded[key] = (
+                SavedCart.objects.filter(**lookup)
+                .values_list("items", flat=True)
+                .first()
+            ) or {}
+        return loaded[key]
+
+    def _pop_session_cart(self):
+        # Only with a session cookie: touching an empty session would make
+        # anonymous pages Vary on Cookie
+        request = self.request
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return None
+        legacy = request.session.pop(LEGACY_SESSION_KEY, None)
+        return legacy if isinstance(legacy, dict) else None
+
+    def __len__(self):
+        return sum(self.data.values())
+
+    def __contains__(self, product_id):
+        return str(product_id) in self.data
+
+    def quantity(self, product_id):
+        return self.data.get(str(product_id), 0)
+
+    # -----------------------------
+    # WRITE
+    # -----------------------------
+    def apply(self, operations):
+        """
+        Apply ``[{"op": ..., "product_id": ..., "qty": ...}]`` atomically.
+
+        All operations are validated before anything is written, then the
+        row is locked, updated in memory and saved once.
+        """
+        operations = [self._clean(op) for op in operations]
+        if not operations:
+            return self.data
+
+        lookup = self._owner()
+        if lookup is None:
+            self.request._cart_token = secrets.token_urlsafe(24)
+            lookup = self._owner()
+
+        # The first writes of a new owner may race to insert the row; the
+        # loser's get_or_create re-reads it, and a retry covers the rest
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    row, created = SavedCart.objects.select_for_update().get_or_create(
+                        **lookup
+                    )
+
+                    data = dict(row.items)
+                    for op in operations:
+                        self._apply_one(data, op)
+
+                    row.items = data
+                    row.save(update_fields=["items", "updated_at"])
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+
+        if created and row.user_id is None:
+            schedule_sweep()
+
+        loaded, key = self._loaded(lookup)
+        loaded[key] = self._data = data
+        return data
+
+    def _clean(self, op):
+        name = op.get("op")
+        if name not in OPERATIONS:
+            raise CartError(f"Unknown cart operation: {name}")
+
+        if name == "clear":
+            return {"op": name}
+
+        try:
+            product_id = int(op.get("product_id"))
+            qty = int(op.get("qty", 1))
+        except (TypeError, ValueError):
+            raise CartError("Invalid product or quantity")
+
+        if name == "set":
+            qty = min(max(1, qty), MAX_QTY)
+        elif name == "add" and qty < 1:
+            raise CartError("Invalid quantity")
+
+        return {"op": name, "product_id": str(product_id), "qty": qty}
+
+    def _apply_one(self, data, op):
+        if op["op"] == "clear":
+            data.clear()
+        elif op["op"] == "remove":
+            data.pop(op["product_id"], None)
+        elif op["op"] == "set":
+            data[op["product_id"]] = op["qty"]
+        else:
+            data[op["product_id"]] = min(
+                data.get(op["product_id"], 0) + op["qty"], MAX_QTY
+            )
+
+    def add(self, product_id, qty=1):
+        self.apply([{"op": "add", "product_id": product_id, "qty": qty}])
+        return self.quantity(product_id)
+
+    def set(self, product_id, qty):
+        self.apply([{"op": "set", "product_id": product_id, "qty": qty}])
+        return self.quantity(product_id)
+
+    def remove(self, product_id):
+        self.apply([{"op": "remove", "product_id": product_id}])
+
+    def clear(self):
+        if self.data:
+            self.apply([{"op": "clear"}])
+
+    def merge_visitor_cart(self, token):
+        """Fold the visitor cart identified by ``token`` into this cart."""
+        visitor = SavedCart.objects.filter(token=token, user=None).first()
+        if visitor is None:
+            return
+
+        if visitor.items:
+            self.apply(
+                {"op": "add", "product_id": pk, "qty": qty}
+                for pk, qty in visitor.items.items()
+            )
+
+        visitor.delete()
+
+    # -----------------------------
+    # HYDRATION
+    # -----------------------------
+    def hydrate(self):
+        data = self.data
+        found = Product.objects.only(*LINE_FIELDS).in_bulk([int(pk) for pk in data])
+
+        stale = [pk for pk in data if int(pk) not in found]
+        if stale:
+            logger.warning(f"Dropping missing products from cart: {stale}")
+            self.apply({"op": "remove", "product_id": pk} for pk in stale)
+
+        self.products = []
+        self.subtotal = 0
+
+        for pk, qty in self.data.items():
+            product = found[int(pk)]
+            product.qty = qty
+            product.total = product.price * qty
+            self.products.append(product)
+            self.subtotal += product.total
+
+        return self
+
+    def line_total(self, product_id):
+        """Price a single line from the catalog cache, without a query."""
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            return None
+        return product.price * self.quantity(product_id)
+
+
+# -----------------------------
+# VISITOR CART EXPIRY
+# -----------------------------
+def schedule_sweep(delay=SWEEP_INTERVAL):
+    enqueue_once(SWEEP_TASK, delay=delay)
+
+
+def delete_expired_visitor_carts(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Delete visitor carts untouched for longer than their cookie lives.
+
+    Runs as a job, one batch per query, and queues the next daily sweep
+    while visitor carts remain.
+    """
+    expired = SavedCart.objects.filter(
+        user=None, updated_at__lt=timezone.now() - timedelta(seconds=COOKIE_MAX_AGE)
+    )
+
+    total = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        total += SavedCart.objects.filter(pk__in=ids).delete()[0]
+
+    if SavedCart.objects.filter(user=None).exists():
+        schedule_sweep()
+
+    if total:
+        logger.info(f"Deleted {total} expired visitor carts")
+    return total
@@ -1,3 +1,20 @@
+from django.conf import settings
+
+from .cart import Cart
+
+
 def cart_item_count(request):
-    cart = request.session.get("cart", {})
-    return {"cart_items": sum(cart.values())}
+    # Shared anonymous pages leave the badge to the browser (cart_summary)
+    if getattr(request, "anonymous_page", False):
+        return {"cart_items": None}
+    return {"cart_items": len(Cart(request))}
+
+
+def assets(request):
+    # Called by the template (a stat, only on pages that ask), so a build
+    # made after startup is picked up without a restart
+    return {"tailwind_built": settings.TAILWIND_OUTPUT.exists}
+
+
+def catalog(request):
+    return {"catalog_cache_timeout": settings.CATALOG_CACHE_TIMEOUT}
@@ -0,0 +1,105 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import cache as catalog_cache
+
+
+def is_anonymous_request(request):
+    """
+    True when the request has no live session, i.e. nobody is logged in.
+
+    Without a session cookie that is known without loading a session. A
+    stale or expired cookie costs one session lookup; the session
+    middleware then clears it, so later requests skip the lookup again.
+    """
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    # Empty means expired or unknown: nobody logged in, no flash messages
+    return not request.session.keys()
+
+
+def anonymous_cache(scopes):
+    """
+    Serve a catalog page to anonymous visitors as a shared, cacheable page.
+
+    ``scopes(request, *args, **kwargs)`` names the catalog version scopes
+    the page is built from. Their stamps (microsecond timestamps) make the
+    ``ETag``, so revalidation is a cache lookup and a 304. The newest stamp
+    is also sent as ``Last-Modified``, but only once its second is over:
+    another change within that second would otherwise keep the same
+    one-second value and revalidate a stale page.
+    Right after a change the page is built from the primary, so rows from
+    a lagging replica are never shared under the new stamp.
+
+    The anonymous path never loads a session and renders the cart badge
+    empty for the browser to fill in, so every visitor gets the same bytes.
+    Those responses do not vary on Cookie: the csrftoken and cart_id
+    cookies every visitor carries would otherwise split a shared cache
+    into one copy per visitor. Edges bypass their cache when the session
+    cookie is present instead. Logged-in requests fall through to the
+    normal, private response, which does vary on Cookie.
+    """
+
+    def decorator(view):
+        def versions(request, *args, **kwargs):
+            if not hasattr(request, "catalog_versions"):
+                request.catalog_versions = catalog_cache.get_versions(
+                    scopes(request, *args, **kwargs)
+                )
+            return request.catalog_versions
+
+        def etag(request, *args, **kwargs):
+            return ".".join(str(v) for v in versions(request, *args, **kwargs))
+
+        def last_modified(request, *args, **kwargs):
+            stamp = max(versions(request, *args, **kwargs))
+            if stamp // 1_000_000 >= time.time_ns() // 1_000_000_000:
+                return None
+            return datetime.fromtimestamp(stamp // 1_000_000, tz=timezone.utc)
+
+        def fresh_view(request, *args, **kwargs):
+            with catalog_cache.fresh_reads(request.catalog_versions):
+                return view(request, *args, **kwargs)
+
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(
+            fresh_view
+        )
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            patch = {"private": True}
+            vary = True
+
+            if is_anonymous_request(request):
+                request.user = AnonymousUser()
+                request.anonymous_page = True
+                # Session-backed messages would mark the session accessed,
+                # and the session middleware would add Vary: Cookie
+                request._messages = CookieStorage(request)
+                response = conditional_view(request, *args, **kwargs)
+
+                # A response that sets a cookie is never shared
+                if not response.cookies and response.status_code in (200, 304):
+                    patch = {
+                        "public": True,
+                        "max_age": settings.ANONYMOUS_PAGE_MAX_AGE,
+                    }
+                    vary = False
+            else:
+                response = view(request, *args, **kwargs)
+
+            patch_cache_control(response, **patch)
+            if vary:
+                patch_vary_headers(response, ["Cookie"])
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,107 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from . import cache as catalog_cache
+from .models import FacetCount, Product
+
+# (label, lower bound inclusive, upper bound exclusive or None)
+PRICE_BANDS = [
+    ("0-500", 0, 500),
+    ("500-1000", 500, 1000),
+    ("1000-2500", 1000, 2500),
+    ("2500+", 2500, None),
+]
+
+
+def price_band(price):
+    # Unsaved instances may still hold the raw value, e.g. create(price="10")
+    price = Decimal(str(price))
+    for label, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return label
+    return PRICE_BANDS[0][0]
+
+
+def price_filter(label):
+    """Return queryset filter kwargs for a price band label, or None."""
+    for band, low, high in PRICE_BANDS:
+        if band == label:
+            lookup = {"price__gte": low}
+            if high is not None:
+                lookup["price__lt"] = high
+            return lookup
+    return None
+
+
+def facet_values(product):
+    return [
+        (FacetCount.CATEGORY, product.category),
+        (FacetCount.PRICE, price_band(product.price)),
+    ]
+
+
+def apply_delta(facet, value, delta):
+    updated = FacetCount.objects.filter(facet=facet, value=value).update(
+        count=F("count") + delta
+    )
+    if not updated:
+        FacetCount.objects.get_or_create(facet=facet, value=value)
+        FacetCount.objects.filter(facet=facet, value=value).update(
+            count=F("count") + delta
+        )
+
+
+def update_counts(removed=(), added=()):
+    """Move products between facet buckets; unchanged buckets are skipped."""
+    removed, added = list(removed), list(added)
+    changed = False
+    with transaction.atomic():
+        for facet, value in removed:
+            if (facet, value) not in added:
+                apply_delta(facet, value, -1)
+                changed = True
+        for facet, value in added:
+            if (facet, value) not in removed:
+                apply_delta(facet, value, 1)
+                changed = True
+
+    if changed:
+        catalog_cache.bump(catalog_cache.FACETS)
+
+
+def rebuild():
+    """Recount every bucket with one GROUP BY (for bulk imports and repair)."""
+    rows = []
+
+    # Count inside the transaction, so the counts come from the primary
+    with transaction.atomic():
+        for row in Product.objects.values("category").annotate(n=Count("id")):
+            rows.append(
+                FacetCount(
+                    facet=FacetCount.CATEGORY, value=row["category"], count=row["n"]
+                )
+            )
+
+        for label, low, high in PRICE_BANDS:
+            n = Product.objects.filter(**price_filter(label)).count()
+            rows.append(FacetCount(facet=FacetCount.PRICE, value=label, count=n))
+
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows)
+
+    catalog_cache.bump(catalog_cache.CATALOG, catalog_cache.FACETS)
+
+
+def get_facets():
+    def build():
+        facets = {FacetCount.CATEGORY: [], FacetCount.PRICE: []}
+        for row in FacetCount.objects.filter(count__gt=0).order_by("value"):
+            facets[row.facet].append({"value": row.value, "count": row.count})
+
+        order = [label for label, low, high in PRICE_BANDS]
+        facets[FacetCount.PRICE].sort(key=lambda row: order.index(row["value"]))
+        return facets
+
+    return catalog_cache.cached("facets", [], build, scopes=[catalog_cache.FACETS])
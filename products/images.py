@@ -0,0 +1,171 @@
+import logging
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from jobs.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> maximum width in pixels
+VARIANTS = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 1200,
+}
+
+# Sent with ``instance`` once a job has stored new variants for it
+variants_built = Signal()
+
+# (Pillow format, extension, save options)
+FORMATS = [
+    ("WEBP", "webp", {"quality": 80, "method": 4}),
+    ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+]
+
+
+def built(variants):
+    """``variants`` without the marker of a failed build (``{"error": ...}``)."""
+    return {} if "error" in variants else variants
+
+
+def variant_name(name, variant, ext):
+    directory, filename = posixpath.split(name)
+    base = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "variants", f"{base}_{variant}.{ext}")
+
+
+def generate_variants(field_file):
+    """
+    Write resized WebP and JPEG copies of ``field_file`` to its storage.
+
+    Works with any Django storage (local filesystem or Cloudinary) and
+    returns ``{variant: {"width": w, "webp": name, "jpg": name}}`` for the
+    model to keep next to the original.
+    """
+    storage = field_file.storage
+
+    with field_file.open("rb") as fh:
+        image = ImageOps.exif_transpose(Image.open(fh))
+        image.load()
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    variants = {}
+    for variant, width in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        entry = {"width": resized.width}
+
+        for fmt, ext, options in FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, fmt, **options)
+
+            name = variant_name(field_file.name, variant, ext)
+            if storage.exists(name):
+                storage.delete(name)
+            entry[ext] = storage.save(name, ContentFile(buffer.getvalue()))
+
+        variants[variant] = entry
+
+    return variants
+
+
+def schedule_variants(instance, image_field, variants_field):
+    """
+    Queue a job that builds the variants of ``instance``'s image.
+
+    Encoding and uploading six files is too slow for the request that
+    saved the image. The current variants belong to the previous image,
+    so they are cleared now (pages fall back to the original) and their
+    files are deleted by the job.
+    """
+    stale = getattr(instance, variants_field)
+    if stale:
+        setattr(instance, variants_field, {})
+        type(instance).objects.filter(pk=instance.pk).update(**{variants_field: {}})
+
+    enqueue(
+        "products.images.build_variants",
+        instance._meta.label,
+        instance.pk,
+        image_field,
+        variants_field,
+        stale=stale,
+    )
+
+
+def build_variants(label, pk, image_field, variants_field, stale=None):
+    """
+    Job: generate and store the variants of one image, then delete the
+    files of the ``stale`` variants it replaces.
+    """
+    model = apps.get_model(label)
+    storage = model._meta.get_field(image_field).storage
+    instance = model.objects.filter(pk=pk).first()
+
+    variants = {}
+    field_file = getattr(instance, image_field) if instance else None
+    if field_file:
+        try:
+            variants = generate_variants(field_file)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Missing, truncated or not an image Pillow can read. Recorded,
+            # so later saves of the same file do not queue it again
+            logger.error(f"Could not generate variants for {field_file.name}: {e}")
+            variants = {"error": str(e) or type(e).__name__}
+
+    if instance is not None:
+        updated = model.objects.filter(pk=pk, **{image_field: field_file.name}).update(
+            **{variants_field: variants}
+        )
+        if not updated:
+            # Replaced again meanwhile; that save queued its own job
+            return
+        setattr(instance, variants_field, variants)
+
+    delete_variants(storage, built(stale or {}), keep=built(variants))
+    if instance is not None:
+        variants_built.send(sender=model, instance=instance)
+
+
+def delete_variants(storage, variants, keep=None):
+    """Delete the files of ``variants``, except names also used in ``keep``."""
+    kept = {
+        name
+        for entry in (keep or {}).values()
+        for ext, name in entry.items()
+        if ext != "width"
+    }
+    for entry in variants.values():
+        for ext, name in entry.items():
+            if ext == "width" or name in kept:
+                continue
+            try:
+                storage.delete(name)
+            except Exception as e:
+                logger.warning(f"Could not delete image variant {name}: {e}")
+
+
+def needs_variants(instance, previous, image_field, variants_field):
+    field_file = getattr(instance, image_field)
+    previous_name = getattr(previous, image_field).name if previous else None
+
+    # A failed build ({"error": ...}) counts as done until the file changes
+    if not field_file:
+        return bool(getattr(instance, variants_field))
+    return field_file.name != previous_name or not getattr(instance, variants_field)
+
+
+def srcset(field_file, variants, ext):
+    storage = field_file.storage
+    return ", ".join(
+        f"{storage.url(entry[ext])} {entry['width']}w"
+        for entry in variants.values()
+        if ext in entry
+    )
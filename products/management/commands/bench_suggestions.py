@@ -0,0 +1,88 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Product
+from products.suggest import PrefixIndex
+
+WORDS = [
+    "keychain", "mug", "lamp", "vase", "planter", "figure", "stand", "holder",
+    "coaster", "frame", "dragon", "rocket", "owl", "cactus", "gear", "skull",
+    "phone", "cable", "desk", "wall", "mini", "custom", "neon", "wooden",
+]  # fmt: skip
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the in-memory suggestion index with the icontains query. "
+        "Products are generated inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[1_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        self.stdout.write(
+            f"{'products':>10} {'build ms':>10} {'index us':>10} "
+            f"{'icontains us':>13} {'speedup':>8}"
+        )
+
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    self.run_size(size, options["queries"], rng)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run_size(self, size, query_count, rng):
+        names = [
+            " ".join(rng.choice(WORDS) for _ in range(3)) + f" {i}" for i in range(size)
+        ]
+        batch = 5000
+        for start in range(0, size, batch):
+            end = start + batch
+            Product.objects.bulk_create(
+                Product(
+                    name=name,
+                    description="",
+                    price=1,
+                    stock=1,
+                    category="bench",
+                )
+                for name in names[start:end]
+            )
+
+        queries = [rng.choice(WORDS)[: rng.randint(2, 5)] for _ in range(query_count)]
+
+        started = time.perf_counter()
+        rows = Product.objects.values_list("id", "name").iterator(chunk_size=5000)
+        index = PrefixIndex(rows)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        for q in queries:
+            index.lookup(q, 5)
+        index_us = (time.perf_counter() - started) / query_count * 1e6
+
+        started = time.perf_counter()
+        for q in queries:
+            list(Product.objects.filter(name__icontains=q)[:5])
+        db_us = (time.perf_counter() - started) / query_count * 1e6
+
+        self.stdout.write(
+            f"{size:>10} {build_ms:>10.1f} {index_us:>10.1f} "
+            f"{db_us:>13.1f} {db_us / index_us:>7.0f}x"
+        )
@@ -0,0 +1,80 @@
+import subprocess
+import time
+import urllib.request
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+DAISYUI_URL = "https://github.com/saadeghi/daisyui/releases/download/{version}/{name}"
+DAISYUI_FILES = ["daisyui.mjs", "daisyui-theme.mjs"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the purged, minified Tailwind + daisyUI stylesheet with the "
+        "pinned TAILWINDCSS_VERSION and DAISYUI_VERSION, then optionally run "
+        "collectstatic to hash and gzip/brotli-compress every asset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--collectstatic",
+            action="store_true",
+            help="Run collectstatic --noinput after building",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import pytailwindcss
+        except ImportError:
+            raise CommandError("pytailwindcss is not installed")
+
+        started = time.perf_counter()
+        self.fetch_daisyui()
+
+        output = settings.TAILWIND_OUTPUT
+        output.parent.mkdir(parents=True, exist_ok=True)
+
+        # Run from the input's directory so its relative @source/@plugin
+        # paths resolve the same way on every machine.
+        try:
+            pytailwindcss.run(
+                ["-i", str(settings.TAILWIND_INPUT), "-o", str(output), "--minify"],
+                cwd=settings.TAILWIND_INPUT.parent,
+                auto_install=True,
+                version=settings.TAILWINDCSS_VERSION,
+            )
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f"Tailwind build failed:\n{e.stderr.decode()}")
+        except OSError as e:
+            raise CommandError(f"Could not install or run Tailwind: {e}")
+
+        self.stdout.write(
+            f"Built {output.relative_to(settings.BASE_DIR)} "
+            f"({output.stat().st_size / 1024:.1f} KiB) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        if options["collectstatic"]:
+            call_command("collectstatic", interactive=False, verbosity=1)
+
+    def fetch_daisyui(self):
+        vendor = settings.TAILWIND_INPUT.parent / "vendor"
+        vendor.mkdir(exist_ok=True)
+
+        # Downloads are keyed by version, so bumping DAISYUI_VERSION refetches
+        stamp = vendor / "VERSION"
+        version = settings.DAISYUI_VERSION
+        if stamp.exists() and stamp.read_text().strip() == version:
+            return
+
+        for name in DAISYUI_FILES:
+            url = DAISYUI_URL.format(version=version, name=name)
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    (vendor / name).write_bytes(response.read())
+            except OSError as e:
+                raise CommandError(f"Could not download {url}: {e}")
+
+        stamp.write_text(version)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Profile
+from products import images
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate responsive image variants for existing uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate variants that already exist",
+        )
+
+    def handle(self, *args, **options):
+        targets = [
+            (Product.objects.exclude(image=""), "image", "image_variants"),
+            (
+                Profile.objects.exclude(profile_photo=""),
+                "profile_photo",
+                "photo_variants",
+            ),
+        ]
+
+        for queryset, image_field, variants_field in targets:
+            if not options["force"]:
+                queryset = queryset.filter(**{variants_field: {}})
+
+            done = 0
+            for instance in queryset.exclude(
+                **{f"{image_field}__isnull": True}
+            ).iterator():
+                images.build_variants(
+                    instance._meta.label,
+                    instance.pk,
+                    image_field,
+                    variants_field,
+                    stale=getattr(instance, variants_field),
+                )
+                done += 1
+
+            self.stdout.write(f"{queryset.model.__name__}: {done} processed")
@@ -0,0 +1,452 @@
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve, reverse
+
+from orders.management.commands.razorpay_stub import make_server
+from products.models import Product
+from .seed_perf_data import CATEGORIES, WORDS, perf_sessions
+
+ORDER_ID_RE = re.compile(r'"order_id":\s*"(order_\w+)"')
+PERCENTILES = (50, 95, 99)
+
+
+class JourneyError(Exception):
+    pass
+
+
+def url_name(path):
+    try:
+        return resolve(urlsplit(path).path).url_name or path
+    except Resolver404:
+        return "unresolved"
+
+
+def percentile(sorted_values, p):
+    # Nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        with self.lock:
+            self.timings.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        def row(timings, errors):
+            timings = sorted(timings)
+            data = {
+                "requests": len(timings),
+                "rps": round(len(timings) / elapsed, 2),
+                "errors": errors,
+            }
+            for p in PERCENTILES:
+                data[f"p{p}"] = round(percentile(timings, p) * 1000, 2)
+            return data
+
+        results = {
+            name: row(timings, self.errors.get(name, 0))
+            for name, timings in sorted(self.timings.items())
+        }
+        every = [t for timings in self.timings.values() for t in timings]
+        return results, row(every, sum(self.errors.values()))
+
+
+class Shopper:
+    """One virtual user: a cookie jar and the scripted journeys."""
+
+    def __init__(self, base_url, stub_url, stats, rng, product_ids, session_key):
+        self.base_url = base_url.rstrip("/")
+        self.stub_url = stub_url.rstrip("/")
+        self.stats = stats
+        self.rng = rng
+        self.product_ids = product_ids
+        self.member = session_key is not None
+
+        self.http = requests.Session()
+        if session_key:
+            self.http.cookies.set(settings.SESSION_COOKIE_NAME, session_key)
+
+    def request(self, method, path, expect=(200,), **kwargs):
+        name = url_name(path)
+        headers = kwargs.pop("headers", {})
+        if method == "POST":
+            headers["X-CSRFToken"] = self.http.cookies.get(
+                settings.CSRF_COOKIE_NAME, ""
+            )
+
+        started = time.perf_counter()
+        try:
+            response = self.http.request(
+                method,
+                self.base_url + path,
+                headers=headers,
+                allow_redirects=False,
+                timeout=30,
+                **kwargs,
+            )
+        except requests.RequestException as e:
+            self.stats.record(name, time.perf_counter() - started, False)
+            raise JourneyError(f"{method} {path}: {e}")
+
+        ok = response.status_code in expect
+        self.stats.record(name, time.perf_counter() - started, ok)
+        if not ok:
+            raise JourneyError(f"{method} {path}: HTTP {response.status_code}")
+        return response
+
+    def browse(self):
+        self.request("GET", reverse("products"))
+
+        # Infinite scroll within a category, one more page
+        category = self.rng.choice(CATEGORIES)
+        response = self.request(
+            "GET", reverse("products"), params={"category": category, "fragment": 1}
+        )
+        next_url = response.headers.get("X-Next-Url")
+        if next_url:
+            self.request("GET", next_url + "&fragment=1")
+
+        product_id = self.rng.choice(self.product_ids)
+        self.request("GET", reverse("product_detail", args=[product_id]))
+
+    def search(self):
+        word = self.rng.choice(WORDS)
+        self.request("GET", reverse("search_suggestions"), params={"q": word[:3]})
+        self.request("GET", reverse("search"), params={"q": word})
+
+    def add_to_cart(self):
+        # Hands out the CSRF cookie, as the page script does
+        self.request("GET", reverse("cart_summary"))
+        product_id = self.rng.choice(self.product_ids)
+        self.request(
+            "POST",
+            reverse("add_to_cart", args=[product_id]),
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        self.request("GET", reverse("cart"))
+
+    def checkout(self):
+        url = reverse("checkout")
+        self.request("GET", url)
+
+        response = self.request("POST", url, data={"create_payment": "1"})
+        match = ORDER_ID_RE.search(response.text)
+        if not match:
+            raise JourneyError("Checkout page carried no Razorpay order")
+
+        payment = self.pay(match.group(1))
+        self.request("POST", url, data={**payment, "place_order": "1"}, expect=(302,))
+        self.request("GET", reverse("success"))
+
+    def pay(self, order_id):
+        """
+        What checkout.js would get back from Razorpay, from the stub.
+
+        Not timed: it is not a request to the app under test.
+        """
+        try:
+            response = requests.post(f"{self.stub_url}/stub/pay/{order_id}", timeout=30)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            # Only the message: a chained traceback would keep this
+            # journey's frames and pooled connections alive until a GC
+            error = str(e)
+        raise JourneyError(f"Razorpay stub payment: {error}")
+
+    def journey(self, checkout_rate):
+        self.browse()
+        self.search()
+        self.add_to_cart()
+        if self.member and self.rng.random() < checkout_rate:
+            self.checkout()
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive browse -> search -> add-to-cart -> checkout journeys against "
+        "a running server (or a local gunicorn started with --serve, paid "
+        "through the Razorpay stub) and report req/s and p50/p95/p99 per "
+        "URL name. Run seed_perf_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--serve",
+            action="store_true",
+            help="Start gunicorn on --base-url and a Razorpay stub for it",
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--threads", type=int, default=1)
+        parser.add_argument(
+            "--stub-url",
+            default=None,
+            help="Razorpay stub the server uses (default RAZORPAY_BASE_URL)",
+        )
+        parser.add_argument("--stub-port", type=int, default=9100)
+        parser.add_argument("--users", type=int, default=20, help="Virtual users")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds")
+        parser.add_argument(
+            "--member-rate",
+            type=float,
+            default=0.5,
+            help="Share of virtual users logged in with a seeded session",
+        )
+        parser.add_argument(
+            "--checkout-rate",
+            type=float,
+            default=0.3,
+            help="Share of member journeys that end in a paid checkout",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--save-baseline", help="Write the results to this file")
+        parser.add_argument("--baseline", help="Compare against a saved baseline")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=10.0,
+            help="Percent a p95 may rise or req/s fall before it is a regression",
+        )
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list("id", flat=True)[:10000])
+        if not product_ids:
+            raise CommandError("No products; run seed_perf_data first")
+
+        members = round(options["users"] * options["member_rate"])
+        sessions = perf_sessions()[:members] if members else []
+        if len(sessions) < members:
+            raise CommandError(
+                f"{members} members need as many seeded sessions, found "
+                f"{len(sessions)}; run seed_perf_data --sessions {members}"
+            )
+
+        stub_url = options["stub_url"] or settings.RAZORPAY_BASE_URL
+        server = stub = None
+        if options["serve"]:
+            stub, stub_url = self.start_stub(options["stub_port"])
+            server = self.start_gunicorn(options, stub_url)
+        elif members and options["checkout_rate"] and not stub_url:
+            raise CommandError("Checkouts need --stub-url or RAZORPAY_BASE_URL")
+
+        try:
+            stats, elapsed = self.run(options, product_ids, sessions, stub_url)
+        finally:
+            if server:
+                server.terminate()
+                server.wait(timeout=10)
+            if stub:
+                stub.shutdown()
+
+        results, total = stats.summary(elapsed)
+        self.report(results, total, elapsed)
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as fh:
+                json.dump(
+                    {
+                        "options": {
+                            k: options[k]
+                            for k in (
+                                "users",
+                                "duration",
+                                "member_rate",
+                                "checkout_rate",
+                            )
+                        },
+                        "results": results,
+                        "total": total,
+                    },
+                    fh,
+                    indent=2,
+                )
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}")
+
+        if options["baseline"]:
+            self.compare(options["baseline"], results, total, options["tolerance"])
+
+    # -----------------------------
+    # SERVERS
+    # -----------------------------
+    def start_stub(self, port):
+        stub = make_server(port=port, key_secret=self.key_secret())
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        return stub, f"http://127.0.0.1:{port}"
+
+    def key_secret(self):
+        return settings.RAZORPAY_KEY_SECRET or "loadtest_secret"
+
+    def shared_cache_dir(self, options):
+        # Workers must see each other's catalog cache invalidations; a
+        # per-process LocMemCache would serve each worker stale pages
+        backend = settings.CACHES["default"]["BACKEND"]
+        if options["workers"] == 1 or not backend.endswith("LocMemCache"):
+            return None
+        self.cache_tmp = tempfile.TemporaryDirectory(prefix="loadtest-cache-")
+        self.stdout.write(f"Workers share a file cache in {self.cache_tmp.name}")
+        return self.cache_tmp.name
+
+    def start_gunicorn(self, options, stub_url):
+        bind = urlsplit(options["base_url"]).netloc
+        env = {
+            **os.environ,
+            "RAZORPAY_BASE_URL": stub_url,
+            "RAZORPAY_KEY_ID": settings.RAZORPAY_KEY_ID or "rzp_test_loadtest",
+            "RAZORPAY_KEY_SECRET": self.key_secret(),
+        }
+        cache_dir = self.shared_cache_dir(options)
+        if cache_dir:
+            env["CACHE_DIR"] = cache_dir
+
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                "ecom_project.wsgi",
+                "--bind",
+                bind,
+                "--workers",
+                str(options["workers"]),
+                "--threads",
+                str(options["threads"]),
+            ],
+            env=env,
+            cwd=settings.BASE_DIR,
+        )
+
+        ready_url = options["base_url"].rstrip("/") + reverse("cart_summary")
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("gunicorn exited during startup")
+            try:
+                requests.get(ready_url, timeout=1)
+                return server
+            except requests.RequestException:
+                time.sleep(0.2)
+
+        server.terminate()
+        raise CommandError("gunicorn did not start within 30s")
+
+    # -----------------------------
+    # RUN
+    # -----------------------------
+    def run(self, options, product_ids, sessions, stub_url):
+        stats = Stats()
+        seed = options["seed"]
+        deadline = time.monotonic() + options["duration"]
+        failures = []
+
+        def virtual_user(i):
+            rng = random.Random(None if seed is None else seed + i)
+            shopper = Shopper(
+                options["base_url"],
+                stub_url or "",
+                stats,
+                rng,
+                product_ids,
+                sessions[i] if i < len(sessions) else None,
+            )
+            while time.monotonic() < deadline:
+                try:
+                    shopper.journey(options["checkout_rate"])
+                except JourneyError as e:
+                    failures.append(str(e))
+                except Exception as e:
+                    # Reported with the rest; a dead thread would skew req/s
+                    failures.append(f"{type(e).__name__}: {e}")
+            shopper.http.close()
+
+        threads = [
+            threading.Thread(target=virtual_user, args=(i,))
+            for i in range(options["users"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        for failure in failures[:5]:
+            self.stderr.write(failure)
+        if len(failures) > 5:
+            self.stderr.write(f"... {len(failures) - 5} more failed journeys")
+        return stats, elapsed
+
+    # -----------------------------
+    # REPORT
+    # -----------------------------
+    def report(self, results, total, elapsed):
+        header = (
+            f"{'URL name':<22}{'reqs':>8}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+        )
+        self.stdout.write(f"{total['requests']} requests in {elapsed:.1f}s")
+        self.stdout.write(header)
+        for name, row in [*results.items(), ("TOTAL", total)]:
+            self.stdout.write(
+                f"{name:<22}{row['requests']:>8}{row['rps']:>9.1f}"
+                f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}"
+                f"{row['errors']:>8}"
+            )
+
+    def compare(self, path, results, total, tolerance):
+        with open(path) as fh:
+            baseline = json.load(fh)
+
+        def change(new, old):
+            return (new - old) / old * 100 if old else 0.0
+
+        regressions = []
+        self.stdout.write(f"\nAgainst {path}:")
+        self.stdout.write(f"{'URL name':<22}{'p95 ms':>16}{'req/s':>18}")
+
+        rows = [*results.items(), ("TOTAL", total)]
+        for name, row in rows:
+            old = (
+                baseline["total"] if name == "TOTAL" else baseline["results"].get(name)
+            )
+            if old is None:
+                self.stdout.write(f"{name:<22}{'(new)':>16}")
+                continue
+
+            p95 = change(row["p95"], old["p95"])
+            rps = change(row["rps"], old["rps"])
+            self.stdout.write(
+                f"{name:<22}{old['p95']:>7.1f} {p95:>+7.1f}%"
+                f"{old['rps']:>9.1f} {rps:>+7.1f}%"
+            )
+            if p95 > tolerance or rps < -tolerance:
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(
+                f"Slower than the baseline by over {tolerance}%: "
+                + ", ".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("Within tolerance of the baseline"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products import facets
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount category and price band facets. Run after bulk imports or "
+        "queryset.update() calls, which skip the Product signals."
+    )
+
+    def handle(self, *args, **options):
+        facets.rebuild()
+        self.stdout.write(self.style.SUCCESS("Facet counts rebuilt"))
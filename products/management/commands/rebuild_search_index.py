@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products import suggest
+from products.search import get_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the product search index from the products table and make "
+        "every worker rebuild its suggestion index. Run it after bulk loads "
+        "(bulk_create, update(), raw SQL), which skip the signals that keep "
+        "the indexes current."
+    )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild()
+        suggest.invalidate()
+        self.stdout.write(
+            self.style.SUCCESS(f"Search index rebuilt ({type(backend).__name__})")
+        )
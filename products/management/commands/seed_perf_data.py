@@ -0,0 +1,266 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from accounts.models import Profile
+from orders import rollups
+from orders.models import Order, OrderItem
+from orders.services import order_totals, to_money
+from products import cache as catalog_cache
+from products import facets, suggest
+from products.models import Product, SavedCart
+from products.search import get_backend
+
+PERF_PREFIX = "perf_"
+PERF_PASSWORD = "perf-pass-123"
+SESSION_FLAG = "_perf"
+
+CATEGORIES = [
+    "Electronics",
+    "Books",
+    "Clothing",
+    "Home & Kitchen",
+    "Sports",
+    "Toys",
+    "Beauty",
+    "Garden",
+]
+WORDS = [
+    "classic",
+    "wireless",
+    "organic",
+    "compact",
+    "premium",
+    "portable",
+    "smart",
+    "vintage",
+    "ergonomic",
+    "deluxe",
+    "lamp",
+    "kettle",
+    "jacket",
+    "speaker",
+    "novel",
+    "backpack",
+    "bottle",
+    "headphones",
+    "blender",
+    "sneakers",
+]
+
+
+def perf_sessions():
+    """Session keys of the logged-in sessions made by seed_perf_data."""
+    keys = []
+    store = SessionStore()
+    rows = Session.objects.filter(expire_date__gt=timezone.now()).values_list(
+        "session_key", "session_data"
+    )
+    for key, data in rows.iterator(chunk_size=2000):
+        if store.decode(data).get(SESSION_FLAG):
+            keys.append(key)
+    return keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate a synthetic shop for load tests: products, users with "
+        "profiles, logged-in sessions with saved carts, and paid orders. "
+        f"Users are named {PERF_PREFIX}<n> with password {PERF_PASSWORD}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument(
+            "--sessions",
+            type=int,
+            default=200,
+            help="Logged-in sessions (each user's cart is filled) for the driver",
+        )
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument(
+            "--days", type=int, default=90, help="Spread orders over this many days"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["orders"] and not options["users"]:
+            raise CommandError("Orders need at least one user (--users)")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        products = self.seed_products(options["products"])
+        users = self.seed_users(options["users"])
+        self.seed_sessions(users[: options["sessions"]], products)
+        self.seed_orders(options["orders"], users, products, options["days"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded in {time.perf_counter() - started:.1f}s; "
+                f"log in as {PERF_PREFIX}0 / {PERF_PASSWORD}"
+            )
+        )
+
+    def step(self, label, started, count):
+        self.stdout.write(f"{label}: {count} in {time.perf_counter() - started:.1f}s")
+
+    def seed_products(self, count):
+        started = time.perf_counter()
+        rng = self.rng
+
+        # bulk_create skips the Product signals; indexes are rebuilt below
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=" ".join(rng.sample(WORDS, 3)).title(),
+                    description=" ".join(rng.choices(WORDS, k=12)),
+                    price=round(rng.uniform(49, 4999), 2),
+                    stock=1_000_000,
+                    category=rng.choice(CATEGORIES),
+                )
+                for _ in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        facets.rebuild()
+        get_backend().rebuild()
+        suggest.invalidate()
+        catalog_cache.bump(*[catalog_cache.category_scope(c) for c in CATEGORIES])
+
+        self.step("Products", started, count)
+        return list(Product.objects.values_list("id", "price"))
+
+    def seed_users(self, count):
+        started = time.perf_counter()
+        first = User.objects.filter(username__startswith=PERF_PREFIX).count()
+        password = make_password(PERF_PASSWORD)
+
+        users = User.objects.bulk_create(
+            (
+                User(
+                    username=f"{PERF_PREFIX}{i}",
+                    email=f"{PERF_PREFIX}{i}@example.com",
+                    password=password,
+                )
+                for i in range(first, first + count)
+            ),
+            batch_size=self.batch_size,
+        )
+        # bulk_create skips the signal that makes profiles
+        Profile.objects.bulk_create(
+            (
+                Profile(user=user, phone=f"98{i:08d}", address=f"{i} Perf Street")
+                for i, user in enumerate(users)
+            ),
+            batch_size=self.batch_size,
+        )
+
+        self.step("Users", started, count)
+        return users
+
+    def seed_sessions(self, users, products):
+        started = time.perf_counter()
+        store = SessionStore()
+        expire = timezone.now() + timedelta(seconds=settings.SESSION_COOKIE_AGE)
+
+        sessions = []
+        carts = []
+        for user in users:
+            data = {
+                "_auth_user_id": str(user.pk),
+                "_auth_user_backend": settings.AUTHENTICATION_BACKENDS[0],
+                "_auth_user_hash": user.get_session_auth_hash(),
+                SESSION_FLAG: True,
+            }
+            sessions.append(
+                Session(
+                    session_key=get_random_string(32),
+                    session_data=store.encode(data),
+                    expire_date=expire,
+                )
+            )
+            lines = self.rng.sample(
+                products, min(len(products), self.rng.randint(1, 5))
+            )
+            carts.append(
+                SavedCart(
+                    user=user,
+                    items={str(pk): self.rng.randint(1, 3) for pk, _ in lines},
+                )
+            )
+
+        Session.objects.bulk_create(sessions, batch_size=self.batch_size)
+        SavedCart.objects.bulk_create(
+            carts, batch_size=self.batch_size, ignore_conflicts=True
+        )
+        self.step("Sessions with carts", started, len(sessions))
+
+    def seed_orders(self, count, users, products, days):
+        started = time.perf_counter()
+        rng = self.rng
+        now = timezone.now()
+
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            orders = []
+            lines = []
+
+            for _ in range(size):
+                user = rng.choice(users)
+                picked = rng.sample(products, min(len(products), rng.randint(1, 4)))
+                quantities = [rng.randint(1, 3) for _ in picked]
+                subtotal = sum(
+                    price * qty for (_, price), qty in zip(picked, quantities)
+                )
+                tax, total = order_totals(subtotal)
+
+                orders.append(
+                    Order(
+                        user=user,
+                        name=user.username,
+                        phone="9800000000",
+                        email=user.email,
+                        address="1 Perf Street",
+                        total_price=to_money(total),
+                        razorpay_order_id=f"order_perf{get_random_string(10)}",
+                        payment_status=rng.choices(
+                            ["Success", "Failed", "Pending"], [90, 7, 3]
+                        )[0],
+                    )
+                )
+                lines.append(list(zip(picked, quantities)))
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(
+                    OrderItem(
+                        order=order,
+                        product_id=pk,
+                        quantity=qty,
+                        unit_price=to_money(price),
+                    )
+                    for order, order_lines in zip(orders, lines)
+                    for (pk, price), qty in order_lines
+                )
+                # created_at is auto_now_add; backdate the batch in one UPDATE
+                Order.objects.filter(pk__in=[o.pk for o in orders]).update(
+                    created_at=now - timedelta(seconds=rng.uniform(0, days * 86400))
+                )
+
+        # The job worker adds the paid orders to the sales rollups
+        rollups.schedule()
+        self.step("Orders", started, count)
@@ -0,0 +1,25 @@
+from .cart import COOKIE_MAX_AGE, COOKIE_NAME
+
+
+class CartCookieMiddleware:
+    """Set or clear the visitor cart cookie after the cart changed owner."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        token = getattr(request, "_cart_token", None)
+
+        if token:
+            response.set_cookie(
+                COOKIE_NAME,
+                token,
+                max_age=COOKIE_MAX_AGE,
+                httponly=True,
+                samesite="Lax",
+            )
+        elif token == "" and COOKIE_NAME in request.COOKIES:
+            response.delete_cookie(COOKIE_NAME, samesite="Lax")
+
+        return response
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:03
+
+from django.db import migrations
+
+# The DDL is frozen here rather than imported from products.search, so
+# later changes to the backends cannot rewrite migration history.
+
+SQLITE_TABLE = "products_product_fts"
+
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+
+
+def sqlite_has_fts5(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    return bool(cursor.fetchone()[0])
+
+
+def install_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS product_search_document_idx "
+                f"ON products_product USING GIN (({POSTGRES_DOCUMENT}))"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS product_name_trgm_idx "
+                "ON products_product USING GIN (name gin_trgm_ops)"
+            )
+        elif vendor == "sqlite" and sqlite_has_fts5(cursor):
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+                "name, description, category, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, name, description, category) "
+                "SELECT id, name, description, category FROM products_product"
+            )
+
+
+def uninstall_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS product_search_document_idx")
+            cursor.execute("DROP INDEX IF EXISTS product_name_trgm_idx")
+        elif vendor == "sqlite":
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_product_category_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+PRICE_BANDS = [
+    ("0-500", 0, 500),
+    ("500-1000", 500, 1000),
+    ("1000-2500", 1000, 2500),
+    ("2500+", 2500, None),
+]
+
+
+def populate_facets(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    FacetCount = apps.get_model("products", "FacetCount")
+
+    rows = [
+        FacetCount(facet="category", value=row["category"], count=row["n"])
+        for row in Product.objects.values("category").annotate(n=Count("id"))
+    ]
+    for label, low, high in PRICE_BANDS:
+        products = Product.objects.filter(price__gte=low)
+        if high is not None:
+            products = products.filter(price__lt=high)
+        rows.append(FacetCount(facet="price", value=label, count=products.count()))
+
+    FacetCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_product_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FacetCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "facet",
+                    models.CharField(
+                        choices=[("category", "Category"), ("price", "Price band")],
+                        max_length=20,
+                    ),
+                ),
+                ("value", models.CharField(max_length=100)),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("facet", "value"), name="unique_facet_value"
+                    )
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["price", "id"], name="product_price_id_idx"),
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.urls import reverse
 
 
 class Product(models.Model):
@@ -8,6 +10,57 @@ class Product(models.Model):
     stock = models.IntegerField()
     image = models.ImageField(upload_to="products/static/images", null=True, blank=True)
     category = models.CharField(max_length=100)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "id"], name="product_category_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+    def get_absolute_url(self):
+        return reverse("product_detail", args=[self.pk])
+
+
+class FacetCount(models.Model):
+    """Precomputed number of products per category and per price band."""
+
+    CATEGORY = "category"
+    PRICE = "price"
+    FACET_CHOICES = [(CATEGORY, "Category"), (PRICE, "Price band")]
+
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["facet", "value"], name="unique_facet_value"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value} ({self.count})"
+
+
+class SavedCart(models.Model):
+    """Cart contents as ``{product_id: qty}``, one row per user or visitor."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="saved_cart",
+    )
+    token = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    items = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        owner = self.user or f"visitor {self.token[:8]}"
+        return f"Cart: {owner} | {sum(self.items.values())} items"
@@ -0,0 +1,150 @@
+import base64
+import datetime
+import decimal
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, page_size, total_count=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+        self.total_count = total_count
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def _cursor_value(value):
+    # Full precision: a truncated timestamp would skip rows on the boundary
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot use {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":"), default=_cursor_value)
+    raw = raw.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the list of key values stored in ``token`` or None if invalid."""
+    if not token:
+        return None
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+
+    return values if isinstance(values, list) else None
+
+
+def clean_cursor(model, keys, values):
+    """
+    Convert decoded cursor ``values`` to the types of the ``keys`` fields.
+
+    Returns None when the cursor does not fit the ordering (wrong length,
+    nulls, nested values or values the field rejects), so a tampered
+    cursor falls back to the first page instead of a failing query.
+    """
+    if values is None or len(values) != len(keys):
+        return None
+
+    cleaned = []
+    for key, value in zip(keys, values):
+        if value is None or isinstance(value, (bool, dict, list)):
+            return None
+        name = _field(key)
+        field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        try:
+            cleaned.append(field.clean(value, None))
+        except (ValidationError, TypeError, ValueError, OverflowError):
+            return None
+    return cleaned
+
+
+def get_page_size(value=None):
+    default = getattr(settings, "CATALOG_PAGE_SIZE", 24)
+
+    try:
+        size = int(value) if value else default
+    except (TypeError, ValueError):
+        size = default
+
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _field(key):
+    return key.lstrip("-")
+
+
+def keyset_after(keys, values):
+    # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y); "-a" flips to <
+    condition = Q()
+    for i, key in enumerate(keys):
+        lookup = "lt" if key.startswith("-") else "gt"
+        term = Q(**{f"{_field(key)}__{lookup}": values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            term &= Q(**{_field(prev_key): prev_value})
+        condition |= term
+    return condition
+
+
+def paginate(queryset, cursor=None, page_size=None, keys=("id",), with_count=False):
+    """
+    Keyset-paginate ``queryset`` ordered by ``keys`` ("-key" for descending).
+
+    The last key must be unique (normally ``id``) so pages never overlap.
+    Every page is a single indexed range scan of ``page_size + 1`` rows,
+    so deep pages cost the same as the first one. The total count is only
+    computed when ``with_count`` is set.
+    """
+    page_size = get_page_size(page_size)
+    total_count = queryset.count() if with_count else None
+
+    qs = queryset.order_by(*keys)
+    values = clean_cursor(queryset.model, keys, decode_cursor(cursor))
+    if values is not None:
+        qs = qs.filter(keyset_after(keys, values))
+
+    rows = list(qs[: page_size + 1])
+    next_cursor = None
+
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, _field(key)) for key in keys)
+
+    return KeysetPage(rows, next_cursor, page_size, total_count)
+
+
+def next_page_url(request, page):
+    if not page.has_next:
+        return None
+
+    params = request.GET.copy()
+    params.pop("fragment", None)
+    params["cursor"] = page.next_cursor
+    return f"{request.path}?{params.urlencode()}"
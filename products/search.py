@@ -0,0 +1,202 @@
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+from .pagination import KeysetPage, decode_cursor, encode_cursor, get_page_size
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Deepest offset a search cursor may ask for
+MAX_OFFSET = 10_000
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    """
+    Search backends return product ids ranked by relevance.
+
+    ``index``/``remove`` are called from the Product save/delete signals so
+    backends with their own index table can keep it in sync. The built-in
+    index tables are created by migration 0003; ``rebuild`` is run by the
+    ``rebuild_search_index`` command.
+
+    ``bulk_create``, ``update()`` and raw SQL skip the signals, so run
+    ``rebuild_search_index`` after bulk loads.
+    """
+
+    def search_ids(self, query, limit, offset=0):
+        raise NotImplementedError
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, limit, offset=0):
+        ids = self.search_ids(query, limit, offset)
+        found = Product.objects.in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """Unindexed fallback for databases without a full-text engine."""
+
+    def search_ids(self, query, limit, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        condition = Q()
+        for token in tokens:
+            condition &= (
+                Q(name__icontains=token)
+                | Q(description__icontains=token)
+                | Q(category__icontains=token)
+            )
+
+        ids = (
+            Product.objects.filter(condition)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        return list(ids[offset:][:limit])
+
+
+class SqliteSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 index over name, description and category, ranked by bm25."""
+
+    table = "products_product_fts"
+
+    def match_expression(self, query):
+        return " ".join(f'"{token}"*' for token in tokenize(query))
+
+    def search_ids(self, query, limit, offset=0):
+        match = self.match_expression(query)
+        if not match:
+            return []
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, 10.0, 1.0, 4.0), rowid "
+                "LIMIT %s OFFSET %s",
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description, category) "
+                "VALUES (%s, %s, %s, %s)",
+                [product.pk, product.name, product.description, product.category],
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description, category) "
+                "SELECT id, name, description, category FROM products_product"
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Weighted tsvector expression index plus a trigram index on the name.
+
+    Both indexes live on products_product itself, so PostgreSQL keeps them
+    current and the save/delete hooks have nothing to do.
+    """
+
+    document = (
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+    )
+
+    def tsquery(self, query):
+        return " & ".join(f"{token}:*" for token in tokenize(query))
+
+    def search_ids(self, query, limit, offset=0):
+        tsquery = self.tsquery(query)
+        if not tsquery:
+            return []
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id FROM products_product, to_tsquery('english', %s) q "
+                f"WHERE ({self.document}) @@ q OR name %% %s "
+                f"ORDER BY ts_rank({self.document}, q) + similarity(name, %s) DESC, id "
+                "LIMIT %s OFFSET %s",
+                [tsquery, query, query, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def backend_for(db_connection):
+    path = getattr(settings, "PRODUCT_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+
+    if db_connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+
+    if db_connection.vendor == "sqlite":
+        with db_connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if cursor.fetchone()[0]:
+                return SqliteSearchBackend()
+
+    return BasicSearchBackend()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = backend_for(connection)
+    return _backend
+
+
+def search_page(query, cursor=None, page_size=None):
+    """
+    Return a relevance-ranked KeysetPage of products matching ``query``.
+
+    Rank order is not a stable key, so the cursor stores the offset of the
+    next page; one extra row is fetched instead of counting the matches.
+    """
+    page_size = get_page_size(page_size)
+    values = decode_cursor(cursor)
+    offset = values[0] if values and type(values[0]) is int else 0
+    if not 0 <= offset <= MAX_OFFSET:
+        offset = 0
+
+    results = get_backend().search(query, page_size + 1, offset)
+    next_cursor = None
+    if len(results) > page_size:
+        results = results[:page_size]
+        next_cursor = encode_cursor([offset + page_size])
+
+    return KeysetPage(results, next_cursor, page_size)
@@ -0,0 +1,68 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache as catalog_cache
+from . import facets
+from . import images
+from . import suggest
+from .cart import COOKIE_NAME, Cart
+from .models import Product
+from .search import get_backend
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_values(sender, instance, using, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        # Read from the database being written, never a lagging replica
+        instance._previous = (
+            Product.objects.using(using)
+            .filter(pk=instance.pk)
+            .only("name", "category", "price", "image")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None)
+
+    if images.needs_variants(instance, previous, "image", "image_variants"):
+        images.schedule_variants(instance, "image", "image_variants")
+
+    get_backend().index(instance)
+    if previous is None or previous.name != instance.name:
+        # After commit, so other workers re-read the saved name
+        transaction.on_commit(lambda: suggest.record_change(instance.pk))
+    facets.update_counts(
+        removed=facets.facet_values(previous) if previous else (),
+        added=facets.facet_values(instance),
+    )
+    catalog_cache.bump_product(instance, previous.category if previous else None)
+
+
+@receiver(images.variants_built, sender=Product)
+def refresh_product_pages(sender, instance, **kwargs):
+    # Cached cards and detail pages still show the original image
+    catalog_cache.bump_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+    product_id = instance.pk
+    transaction.on_commit(lambda: suggest.record_change(product_id))
+    facets.update_counts(removed=facets.facet_values(instance))
+    catalog_cache.bump_product(instance)
+
+
+@receiver(user_logged_in)
+def merge_visitor_cart(sender, request, user, **kwargs):
+    token = request.COOKIES.get(COOKIE_NAME) if request else None
+    if not token:
+        return
+
+    Cart(request).merge_visitor_cart(token)
+    request._cart_token = ""
@@ -0,0 +1,191 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from . import cache as catalog_cache
+from .models import Product
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def index_entries(pk, name):
+    words = normalize(name).split(" ")
+    return [(" ".join(words[i:]), i, pk) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """
+    Sorted array of normalized name keys for typeahead lookups.
+
+    Every word start of a product name is a key, so "chain" finds
+    "Steel Chain" and "key" finds "3D Keychain". A lookup is one bisect
+    plus a scan over the matching run, which is bounded by ``limit``.
+    """
+
+    def __init__(self, rows=()):
+        self.names = {}
+        self.entries = []
+
+        for pk, name in rows:
+            self.names[pk] = name
+            self.entries.extend(index_entries(pk, name))
+
+        self.entries.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def updated(self, changed, rows):
+        """
+        Copy of the index with the ``changed`` ids re-read from ``rows``.
+
+        Ids missing from ``rows`` were deleted. Readers keep using the old
+        index until the copy replaces it, so no lock is needed for lookups.
+        """
+        index = PrefixIndex()
+        index.names = dict(self.names)
+        index.entries = list(self.entries)
+
+        for pk in changed:
+            name = index.names.pop(pk, None)
+            if name is not None:
+                for entry in index_entries(pk, name):
+                    del index.entries[bisect.bisect_left(index.entries, entry)]
+
+        for pk, name in rows:
+            index.names[pk] = name
+            for entry in index_entries(pk, name):
+                bisect.insort(index.entries, entry)
+
+        return index
+
+    def lookup(self, prefix, limit=5):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        i = bisect.bisect_left(self.entries, (prefix,))
+
+        while i < len(self.entries) and len(results) < limit:
+            key, _, pk = self.entries[i]
+            if not key.startswith(prefix):
+                break
+
+            if pk not in seen:
+                seen.add(pk)
+                results.append((pk, self.names[pk]))
+            i += 1
+
+        return results
+
+
+# ---------------------------------------------------------
+# PER-WORKER INDEX
+# ---------------------------------------------------------
+
+# Bumped after bulk loads, which skip the signals: every worker rebuilds
+SUGGEST = "suggest"
+
+# Saves and deletes are logged as numbered entries in the shared cache;
+# a worker that is behind re-reads just those products.
+CHANGE_SEQ_KEY = "suggest:seq"
+CHANGE_LOG_TIMEOUT = 24 * 60 * 60
+# A longer backlog is cheaper to rebuild than to patch
+MAX_CHANGES = 1000
+
+_index = None
+_version = None
+_seq = 0
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _change_key(seq):
+    return f"suggest:change:{seq}"
+
+
+def record_change(product_id):
+    """Log a saved or deleted product for every worker's index."""
+    cache.add(CHANGE_SEQ_KEY, 0, timeout=None)
+    try:
+        seq = cache.incr(CHANGE_SEQ_KEY)
+    except ValueError:
+        # Evicted in between; the log is gone, so rebuild everywhere
+        invalidate()
+        return
+    cache.set(_change_key(seq), product_id, CHANGE_LOG_TIMEOUT)
+
+
+def invalidate():
+    """Make every worker rebuild its index (after bulk loads)."""
+    catalog_cache.bump(SUGGEST)
+
+
+def _read_changes(since, until):
+    """Ids changed in log entries ``since < n <= until``, None if incomplete."""
+    keys = [_change_key(seq) for seq in range(since + 1, until + 1)]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        return None
+    return set(found.values())
+
+
+def get_index():
+    """
+    Return this worker's index, checked at most every SUGGEST_CHECK_INTERVAL.
+
+    The check is two cache reads. New log entries are applied with one
+    primary-key query; a bumped SUGGEST version, a gap in the log or a
+    long backlog rebuild the index from the products table.
+    """
+    global _index, _version, _seq, _checked_at
+
+    if (
+        _index is not None
+        and time.monotonic() - _checked_at < settings.SUGGEST_CHECK_INTERVAL
+    ):
+        return _index
+
+    with _lock:
+        if (
+            _index is not None
+            and time.monotonic() - _checked_at < settings.SUGGEST_CHECK_INTERVAL
+        ):
+            return _index
+
+        version = catalog_cache.get_version(SUGGEST)
+        seq = cache.get(CHANGE_SEQ_KEY, 0)
+
+        changed = None
+        if _index is not None and version == _version and 0 <= seq - _seq:
+            if seq - _seq <= MAX_CHANGES:
+                changed = _read_changes(_seq, seq)
+
+        if changed is None:
+            rows = Product.objects.values_list("id", "name").iterator(chunk_size=5000)
+            _index = PrefixIndex(rows)
+        elif changed:
+            rows = Product.objects.filter(pk__in=changed).values_list("id", "name")
+            _index = _index.updated(changed, rows)
+
+        _version, _seq, _checked_at = version, seq, time.monotonic()
+
+    return _index
+
+
+def suggest(query, limit=5):
+    return [
+        {"name": name, "url": reverse("product_detail", args=[pk])}
+        for pk, name in get_index().lookup(query, limit)
+    ]
@@ -0,0 +1,44 @@
+from django import template
+from django.utils.html import format_html
+
+from products.images import built, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(field_file, variants, sizes="100vw", alt="", css_class="", variant="card"):
+    """
+    Render ``field_file`` as a ``<picture>`` with WebP and JPEG srcsets.
+
+    Falls back to a plain ``<img>`` of the original upload when no
+    usable variants were generated for it.
+    """
+    if not field_file:
+        return ""
+
+    variants = built(variants)
+    if not variants:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" />',
+            field_file.url,
+            alt,
+            css_class,
+        )
+
+    fallback = variants.get(variant) or next(iter(variants.values()))
+
+    return format_html(
+        '<picture class="contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" '
+        'loading="lazy" decoding="async" />'
+        "</picture>",
+        srcset(field_file, variants, "webp"),
+        sizes,
+        field_file.storage.url(fallback["jpg"]),
+        srcset(field_file, variants, "jpg"),
+        sizes,
+        alt,
+        css_class,
+    )
@@ -0,0 +1,1357 @@
+import base64
+import gc
+import json
+import pstats
+import re
+import socket
+import subprocess
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections
+from django.db.models import QuerySet
+from django.test import (
+    Client,
+    LiveServerTestCase,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from ecom_project import checks
+from ecom_project.routers import PrimaryReplicaRouter, primary, request_scope
+from jobs import queue
+from jobs.models import Job
+from orders.management.commands.razorpay_stub import make_server
+from orders.models import Order
+from orders.payments import PaymentGateway
+from . import cache as catalog_cache
+from . import api, cart, facets, images, suggest, views
+from .cart import COOKIE_NAME, Cart
+from .models import FacetCount, Product, SavedCart
+from .pagination import paginate
+from .search import (
+    BasicSearchBackend,
+    PostgresSearchBackend,
+    SqliteSearchBackend,
+    backend_for,
+    get_backend,
+)
+from .templatetags.product_images import picture
+
+CATEGORIES = ["Lighting", "Kitchen", "Garden"]
+
+# Pages render without collectstatic having built the manifest
+PLAIN_STATIC = {
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def seed_catalog(count=60):
+    """
+    Bulk-create a synthetic catalog spread over every category and price
+    band, then rebuild what the Product signals would have maintained.
+    """
+    Product.objects.bulk_create(
+        Product(
+            name=f"Product {i}",
+            description=f"Synthetic lamp number {i}",
+            price=99 + (i * 97) % 3000,
+            stock=50,
+            category=CATEGORIES[i % len(CATEGORIES)],
+        )
+        for i in range(count)
+    )
+    facets.rebuild()
+    get_backend().rebuild()
+    suggest.invalidate()
+    return list(Product.objects.order_by("id"))
+
+
+class QueryBudgetMixin:
+    """Query-count budgets and EXPLAIN checks for TestCase classes."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+
+        executed = [q["sql"] for q in ctx.captured_queries]
+        self.assertLessEqual(
+            len(executed),
+            budget,
+            f"{len(executed)} queries, budget {budget}:\n" + "\n".join(executed),
+        )
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # On tiny test tables a sequential scan is always cheapest;
+                # with it disabled one only shows up when no index applies.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+            else:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertIndexedPlans(self, table, run):
+        """Run ``run()`` and fail if any SELECT on ``table`` scans the whole table."""
+        with CaptureQueriesContext(connection) as ctx:
+            run()
+
+        selects = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and f'"{table}"' in q["sql"]
+        ]
+        self.assertTrue(selects, f"No query on {table}")
+
+        # PostgreSQL "Seq Scan on t"; SQLite "SCAN t" without "USING ... INDEX"
+        full_scan = re.compile(rf"Seq Scan on {table}\b|\bSCAN {table}\b(?! USING)")
+        for sql in selects:
+            plan = self.explain(sql)
+            self.assertIsNone(
+                full_scan.search(plan), f"Full scan of {table}:\n{sql}\n{plan}"
+            )
+
+
+# ---------------------------------------------------------
+# KEYSET PAGINATION
+# ---------------------------------------------------------
+
+
+def b64_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(25)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, keys, page_size=4):
+        seen = []
+        page = paginate(Product.objects.all(), page_size=page_size, keys=keys)
+        seen += page.items
+        while page.has_next:
+            page = paginate(
+                Product.objects.all(),
+                cursor=page.next_cursor,
+                page_size=page_size,
+                keys=keys,
+            )
+            seen += page.items
+        return [p.pk for p in seen]
+
+    def test_pages_cover_ordering_once(self):
+        # category has ~8 ties per value, broken by id
+        for keys in [("id",), ("category", "id"), ("-category", "-id")]:
+            with self.subTest(keys=keys):
+                expected = list(
+                    Product.objects.order_by(*keys).values_list("pk", flat=True)
+                )
+                self.assertEqual(self.walk(keys), expected)
+
+    def test_price_ties(self):
+        Product.objects.update(price=10)
+        expected = list(
+            Product.objects.order_by("-price", "id").values_list("pk", flat=True)
+        )
+        self.assertEqual(self.walk(("-price", "id"), page_size=3), expected)
+
+    def test_bad_cursor_is_first_page(self):
+        first = list(Product.objects.order_by("id")[:5])
+        cursors = [
+            b64_cursor(["abc"]),
+            b64_cursor([{"a": 1}]),
+            b64_cursor([1, 2]),
+            b64_cursor([True]),
+            b64_cursor([10**30]),
+            "not base64!",
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                page = paginate(Product.objects.all(), cursor=cursor, page_size=5)
+                self.assertEqual(page.items, first)
+
+    def test_bad_cursor_views(self):
+        urls = [
+            reverse("products") + f"?cursor={b64_cursor(['abc'])}",
+            reverse("products") + f"?cursor={b64_cursor([{'a': 1}])}",
+            reverse("products") + f"?sort=category&cursor={b64_cursor([None, 3])}",
+            reverse("api_products") + f"?cursor={b64_cursor(['abc'])}",
+            reverse("search") + f"?q=lamp&cursor={b64_cursor([10**30])}",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+# ---------------------------------------------------------
+# JSON CATALOG API
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(10)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("api_products")
+
+    def get_json(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_sparse_fields(self):
+        data = self.get_json(self.url + "?fields=price, name,name&page_size=2")
+        self.assertEqual(list(data["results"][0]), ["price", "name"])
+        self.assertEqual(data["results"][0]["name"], self.products[0].name)
+
+        product = self.products[1]
+        response = self.client.get(
+            reverse("api_product", args=[product.pk]) + "?fields=id,url"
+        )
+        self.assertEqual(
+            response.json(), {"id": product.pk, "url": product.get_absolute_url()}
+        )
+
+    def test_all_fields_by_default(self):
+        data = self.get_json(self.url + "?page_size=1")
+        self.assertEqual(tuple(data["results"][0]), api.API_FIELDS)
+
+    def test_unknown_fields_are_rejected(self):
+        for url in [
+            self.url + "?fields=name,stock",
+            reverse("api_product", args=[self.products[0].pk]) + "?fields=secret",
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("Unknown fields", response.json()["error"])
+
+    def test_pages_follow_next_url(self):
+        url = self.url + "?fields=id&page_size=4&count=1"
+        seen = []
+        while url:
+            data = self.get_json(url)
+            self.assertEqual(data["count"], 10)
+            seen += [row["id"] for row in data["results"]]
+            url = data["next_url"]
+            self.assertEqual(data["next_cursor"] is None, url is None)
+        self.assertEqual(seen, [p.pk for p in self.products])
+
+    def test_etag_not_modified(self):
+        response = self.client.get(self.url + "?fields=id")
+        etag = response["ETag"]
+
+        response = self.client.get(self.url + "?fields=id", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        # Another selection is another representation
+        response = self.client.get(self.url + "?fields=name", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_the_catalog(self):
+        product = self.products[0]
+        url = reverse("api_product", args=[product.pk])
+        etag = self.client.get(url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = 12345
+            product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["price"], 12345)
+
+
+# ---------------------------------------------------------
+# IMAGE VARIANTS
+# ---------------------------------------------------------
+
+
+def png_upload(name, size=(900, 600), color="teal"):
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def run_jobs():
+    for job in queue.claim("test", limit=100):
+        queue.run(job)
+
+
+@override_settings(
+    STORAGES={
+        **PLAIN_STATIC,
+        "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    }
+)
+class ImageVariantTests(TestCase):
+    def create_product(self):
+        return Product.objects.create(
+            name="Lamp",
+            description="Desk lamp",
+            price=10,
+            stock=5,
+            category="home",
+            image=png_upload("lamp.png"),
+        )
+
+    def variant_files(self, variants):
+        return [entry[ext] for entry in variants.values() for ext in ("webp", "jpg")]
+
+    def test_variants_are_built_by_the_worker(self):
+        product = self.create_product()
+        # The save only queues the work
+        self.assertEqual(product.image_variants, {})
+        self.assertTrue(Job.objects.filter(task="products.images.build_variants"))
+
+        run_jobs()
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants), set(images.VARIANTS))
+
+        storage = product.image.storage
+        for variant, width in images.VARIANTS.items():
+            entry = product.image_variants[variant]
+            self.assertEqual(entry["width"], min(width, 900))
+            for ext, fmt in [("webp", "WEBP"), ("jpg", "JPEG")]:
+                with storage.open(entry[ext]) as fh:
+                    self.assertEqual(Image.open(fh).format, fmt)
+
+    def test_replacing_the_image_deletes_old_variants(self):
+        product = self.create_product()
+        run_jobs()
+        product.refresh_from_db()
+        old_files = self.variant_files(product.image_variants)
+
+        product.image = png_upload("shade.png", color="navy")
+        product.save()
+        self.assertEqual(product.image_variants, {})
+
+        run_jobs()
+        product.refresh_from_db()
+        storage = product.image.storage
+        self.assertFalse(any(storage.exists(name) for name in old_files))
+        self.assertTrue(
+            all(storage.exists(n) for n in self.variant_files(product.image_variants))
+        )
+
+    def test_unreadable_images_are_not_retried(self):
+        product = Product.objects.create(
+            name="Lamp",
+            price=10,
+            stock=5,
+            category="home",
+            image=SimpleUploadedFile("broken.png", b"not an image"),
+        )
+        with self.assertLogs("products.images", "ERROR"):
+            run_jobs()
+        product.refresh_from_db()
+        self.assertIn("error", product.image_variants)
+
+        # Later saves of the same file queue nothing
+        product.name = "Renamed lamp"
+        product.save()
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+
+        html = picture(product.image, product.image_variants)
+        self.assertIn(f'src="{product.image.url}"', html)
+        self.assertNotIn("<picture", html)
+        response = self.client.get(reverse("api_product", args=[product.pk]))
+        self.assertEqual(response.json()["image_variants"], {})
+
+        # A new upload is built again
+        product.image = png_upload("fixed.png")
+        product.save()
+        run_jobs()
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants), set(images.VARIANTS))
+
+
+# ---------------------------------------------------------
+# PRIMARY / REPLICA ROUTING
+# ---------------------------------------------------------
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def test_catalog_reads_use_a_replica(self):
+        self.assertEqual(self.router.db_for_read(Product), "replica")
+
+    def test_other_reads_and_all_writes_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Order), "default")
+        self.assertEqual(self.router.db_for_write(Product), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica", "replica2"])
+    def test_a_request_sticks_to_one_replica(self):
+        with request_scope() as state:
+            used = {self.router.db_for_read(Product) for _ in range(20)}
+        self.assertEqual(used, {state["replica"]})
+
+    def test_reads_after_a_write_use_the_primary(self):
+        with request_scope() as state:
+            self.router.db_for_write(Order)
+            self.assertTrue(state["wrote"])
+            self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_primary_block(self):
+        with request_scope():
+            with primary():
+                self.assertEqual(self.router.db_for_read(Product), "default")
+            self.assertEqual(self.router.db_for_read(Product), "replica")
+
+    def test_database_cache_does_not_pin(self):
+        entry = DatabaseCache("django_cache", {}).cache_model_class
+        with request_scope() as state:
+            self.assertEqual(self.router.db_for_read(entry), "default")
+            self.assertEqual(self.router.db_for_write(entry), "default")
+            self.assertFalse(state["wrote"])
+
+    def test_production_requires_a_shared_memory_cache(self):
+        for backend, errors in [
+            ("django.core.cache.backends.locmem.LocMemCache", 1),
+            ("django.core.cache.backends.db.DatabaseCache", 1),
+            ("django.core.cache.backends.filebased.FileBasedCache", 1),
+            ("django.core.cache.backends.redis.RedisCache", 0),
+            ("django.core.cache.backends.memcached.PyMemcacheCache", 0),
+        ]:
+            caches = {"default": {"BACKEND": backend}}
+            with self.subTest(backend=backend), override_settings(
+                ENVIRONMENT="production", CACHES=caches
+            ):
+                found = checks.check_shared_cache(None)
+                self.assertEqual([e.id for e in found], ["ecom_project.E001"] * errors)
+
+        self.assertEqual(checks.check_shared_cache(None), [])
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_sqlite_pragmas_are_applied(self):
+        with TemporaryDirectory() as tmp:
+            # A file database: the in-memory test database cannot use WAL
+            wrapper = type(connections["default"])(
+                {**connection.settings_dict, "NAME": str(Path(tmp) / "db.sqlite3")},
+                alias="pragmas",
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    applied = {}
+                    for pragma in ("journal_mode", "busy_timeout", "synchronous"):
+                        cursor.execute(f"PRAGMA {pragma}")
+                        applied[pragma] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+
+        self.assertEqual(
+            applied,
+            {
+                "journal_mode": "wal",
+                "busy_timeout": settings.SQLITE_PRAGMAS["busy_timeout"],
+                # NORMAL
+                "synchronous": 1,
+            },
+        )
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_only_the_primary_takes_the_write_lock_at_begin(self):
+        options = {
+            alias: db.get("OPTIONS", {}).get("transaction_mode")
+            for alias, db in settings.DATABASES.items()
+        }
+        self.assertEqual(options, {"default": "IMMEDIATE", "replica": None})
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate("replica", "products"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "products"))
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReadYourWritesTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name="Lamp", description="Desk lamp", price=10, stock=5, category="home"
+        )
+        self.url = reverse("api_product", args=[self.product.pk])
+
+    def get_product(self):
+        # The product was just saved: skip the "changed lately" primary read
+        with self.settings(DATABASE_PIN_SECONDS=0):
+            with CaptureQueriesContext(connections["default"]) as on_primary:
+                with CaptureQueriesContext(connections["replica"]) as on_replica:
+                    response = self.client.get(self.url)
+        self.assertEqual(response.json()["name"], "Lamp")
+        return response, len(on_primary), len(on_replica)
+
+    def test_catalog_page_reads_from_the_replica(self):
+        response, on_primary, on_replica = self.get_product()
+
+        self.assertEqual((on_primary, on_replica), (0, 1))
+        self.assertNotIn(settings.DATABASE_PIN_COOKIE, response.cookies)
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        response = self.client.post(reverse("add_to_cart", args=[self.product.pk]))
+
+        pin = response.cookies[settings.DATABASE_PIN_COOKIE]
+        self.assertEqual(pin["max-age"], settings.DATABASE_PIN_SECONDS)
+
+        response, on_primary, on_replica = self.get_product()
+        self.assertEqual((on_primary, on_replica), (1, 0))
+
+
+# ---------------------------------------------------------
+# CART
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class CartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [p.pk for p in seed_catalog(6)]
+        cls.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+
+    def batch(self, client, ops):
+        return client.post(
+            reverse("cart_batch"),
+            json.dumps({"ops": ops}),
+            content_type="application/json",
+        )
+
+    def saved(self, **lookup):
+        return SavedCart.objects.get(**lookup).items
+
+    def test_batch_is_all_or_nothing(self):
+        a, b, c = self.products[:3]
+        response = self.batch(
+            self.client,
+            [
+                {"op": "add", "product_id": a, "qty": 2},
+                {"op": "set", "product_id": b, "qty": 3},
+                {"op": "remove", "product_id": a},
+            ],
+        )
+        self.assertEqual(response.status_code, 200)
+        token = response.cookies[COOKIE_NAME].value
+        self.assertEqual(self.saved(token=token), {str(b): 3})
+
+        # One bad operation and none of the batch is written
+        response = self.batch(
+            self.client,
+            [{"op": "add", "product_id": c}, {"op": "add", "product_id": c, "qty": 0}],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.saved(token=token), {str(b): 3})
+
+    def test_quantities_are_capped(self):
+        a, b = self.products[:2]
+        self.batch(
+            self.client,
+            [
+                {"op": "set", "product_id": a, "qty": 10**9},
+                {"op": "add", "product_id": b, "qty": cart.MAX_QTY},
+                {"op": "add", "product_id": b, "qty": 10**9},
+            ],
+        )
+        token = self.client.cookies[COOKIE_NAME].value
+        self.assertEqual(
+            self.saved(token=token), {str(a): cart.MAX_QTY, str(b): cart.MAX_QTY}
+        )
+
+    def test_session_carts_are_merged_once(self):
+        a, b = self.products[:2]
+        SavedCart.objects.create(user=self.user, items={str(a): 1})
+        self.client.force_login(self.user)
+        session = self.client.session
+        session[cart.LEGACY_SESSION_KEY] = {str(a): 2, str(b): 1}
+        session.save()
+
+        for _ in range(2):
+            self.client.get(reverse("cart"))
+            self.assertEqual(self.saved(user=self.user), {str(a): 3, str(b): 1})
+        self.assertNotIn(cart.LEGACY_SESSION_KEY, self.client.session)
+
+    def test_visitor_session_carts_move_to_a_visitor_cart(self):
+        a = self.products[0]
+        session = self.client.session
+        session[cart.LEGACY_SESSION_KEY] = {str(a): 2}
+        session.save()
+
+        response = self.client.get(reverse("cart"))
+        token = response.cookies[COOKIE_NAME].value
+        self.assertEqual(self.saved(token=token), {str(a): 2})
+
+    def test_unreadable_session_carts_are_dropped(self):
+        session = self.client.session
+        session[cart.LEGACY_SESSION_KEY] = {"x": "y"}
+        session.save()
+
+        with self.assertLogs("products.cart", "WARNING"):
+            response = self.client.get(reverse("cart"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(SavedCart.objects.exists())
+
+    def test_login_merges_the_visitor_cart(self):
+        a, b = self.products[:2]
+        SavedCart.objects.create(user=self.user, items={str(a): 1})
+        self.batch(
+            self.client,
+            [{"op": "add", "product_id": a}, {"op": "add", "product_id": b, "qty": 2}],
+        )
+        token = self.client.cookies[COOKIE_NAME].value
+
+        response = self.client.post(
+            reverse("login"), {"username": "shopper", "password": "pw"}
+        )
+        self.assertEqual(self.saved(user=self.user), {str(a): 2, str(b): 2})
+        self.assertFalse(SavedCart.objects.filter(token=token).exists())
+        self.assertEqual(response.cookies[COOKIE_NAME].value, "")
+
+    def test_reads_see_writes_of_other_requests(self):
+        def member_cart():
+            request = RequestFactory().get("/")
+            request.user = self.user
+            return Cart(request)
+
+        self.assertEqual(member_cart().data, {})
+        member_cart().add(self.products[0], 2)
+        self.assertEqual(member_cart().quantity(self.products[0]), 2)
+
+    def test_concurrent_first_writes(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        first, other = self.products[0], self.products[-1]
+        get_or_create = QuerySet.get_or_create
+        calls = []
+
+        def lose_the_race(queryset, **kwargs):
+            # Another request inserts the row first; it is visible on retry
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise IntegrityError("UNIQUE constraint failed")
+            SavedCart.objects.create(user=self.user, items={str(other): 1})
+            return get_or_create(queryset, **kwargs)
+
+        with patch.object(QuerySet, "get_or_create", lose_the_race):
+            Cart(request).add(first)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.saved(user=self.user), {str(other): 1, str(first): 1})
+
+    def test_expired_visitor_carts_are_swept(self):
+        self.batch(self.client, [{"op": "add", "product_id": self.products[0]}])
+        self.assertTrue(Job.objects.filter(task=cart.SWEEP_TASK).exists())
+
+        old = SavedCart.objects.create(token="old", items={"1": 1})
+        SavedCart.objects.filter(pk=old.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=cart.COOKIE_MAX_AGE + 60)
+        )
+        member = SavedCart.objects.create(user=self.user, items={"1": 1})
+        SavedCart.objects.filter(pk=member.pk).update(updated_at=old.updated_at)
+
+        self.assertEqual(cart.delete_expired_visitor_carts(batch_size=1), 1)
+        self.assertFalse(SavedCart.objects.filter(pk=old.pk).exists())
+        self.assertEqual(SavedCart.objects.count(), 2)
+
+
+# ---------------------------------------------------------
+# ANONYMOUS PAGE CACHE
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class AnonymousCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(6)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("products") + "?category=Lighting"
+
+    def revalidate(self, response):
+        return self.client.get(self.url, headers={"If-None-Match": response["ETag"]})
+
+    def test_etag_revalidates_changes_within_the_same_second(self):
+        response = self.client.get(self.url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertEqual(self.revalidate(response).status_code, 304)
+
+        lamp = Product.objects.filter(category="Lighting").first()
+        lamp.name = "Renamed lamp"
+        lamp.save()
+
+        response = self.revalidate(response)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Renamed lamp")
+
+    def test_last_modified_waits_for_its_second_to_pass(self):
+        scopes = views.page_scopes(RequestFactory().get(self.url))
+        stamp = max(catalog_cache.get_versions(scopes))
+        now = stamp * 1000
+
+        with patch("products.decorators.time.time_ns", return_value=now):
+            self.assertFalse(self.client.get(self.url).has_header("Last-Modified"))
+
+        with patch(
+            "products.decorators.time.time_ns", return_value=now + 1_000_000_000
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response["Last-Modified"],
+            http_date(stamp // 1_000_000),
+        )
+
+    def test_public_pages_do_not_vary_on_visitor_cookies(self):
+        self.client.cookies["csrftoken"] = "a" * 32
+        self.client.cookies[COOKIE_NAME] = "visitor-token"
+
+        response = self.client.get(self.url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+
+        self.client.force_login(User.objects.create_user("shopper"))
+        response = self.client.get(self.url)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+
+    def test_stale_session_cookies_get_the_anonymous_page(self):
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "expired"
+
+        response = self.client.get(self.url)
+        self.assertTrue(response.wsgi_request.anonymous_page)
+        self.assertEqual(response.cookies[settings.SESSION_COOKIE_NAME].value, "")
+
+        # The cleared cookie is gone, so the next page is shared again
+        response = self.client.get(self.url)
+        self.assertIn("public", response["Cache-Control"])
+
+    def test_facet_changes_in_other_categories_refresh_the_page(self):
+        response = self.client.get(self.url)
+
+        # A Garden product moving price band changes the shared sidebar
+        garden = Product.objects.filter(category="Garden").first()
+        garden.price = 5000 if garden.price < 2500 else 10
+        garden.save()
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+        # An edit that leaves every bucket alone does not
+        response = self.client.get(self.url)
+        garden.name = "Renamed"
+        garden.save()
+        self.assertEqual(self.revalidate(response).status_code, 304)
+
+
+# ---------------------------------------------------------
+# FACETS
+# ---------------------------------------------------------
+
+
+class FacetCountTests(TestCase):
+    def counts(self):
+        return {
+            (row.facet, row.value): row.count
+            for row in FacetCount.objects.filter(count__gt=0)
+        }
+
+    def assertCountsMatchRebuild(self):
+        maintained = self.counts()
+        facets.rebuild()
+        self.assertEqual(maintained, self.counts())
+
+    def test_counts_follow_creates_changes_and_deletes(self):
+        lamp = Product.objects.create(
+            name="Lamp", price="10", stock=1, category="Lighting"
+        )
+        Product.objects.create(name="Mug", price=600, stock=1, category="Kitchen")
+        self.assertEqual(
+            self.counts(),
+            {
+                ("category", "Lighting"): 1,
+                ("category", "Kitchen"): 1,
+                ("price", "0-500"): 1,
+                ("price", "500-1000"): 1,
+            },
+        )
+
+        lamp.category = "Kitchen"
+        lamp.price = 2500
+        lamp.save()
+        self.assertEqual(
+            self.counts(),
+            {
+                ("category", "Kitchen"): 2,
+                ("price", "500-1000"): 1,
+                ("price", "2500+"): 1,
+            },
+        )
+        self.assertCountsMatchRebuild()
+
+        lamp.delete()
+        self.assertEqual(
+            self.counts(), {("category", "Kitchen"): 1, ("price", "500-1000"): 1}
+        )
+        self.assertCountsMatchRebuild()
+
+    def test_price_bands(self):
+        for price, band in [
+            (0, "0-500"),
+            ("499.99", "0-500"),
+            (Decimal("500"), "500-1000"),
+            (999.5, "500-1000"),
+            (1000, "1000-2500"),
+            ("2500", "2500+"),
+        ]:
+            with self.subTest(price=price):
+                self.assertEqual(facets.price_band(price), band)
+
+    def test_listing_filters_match_the_counts(self):
+        products = seed_catalog(12)
+        counts = self.counts()
+
+        for label, _, _ in facets.PRICE_BANDS:
+            with self.subTest(band=label):
+                lookup = facets.price_filter(label)
+                self.assertEqual(
+                    Product.objects.filter(**lookup).count(),
+                    counts.get(("price", label), 0),
+                )
+        self.assertEqual(
+            sum(n for (facet, _), n in counts.items() if facet == "category"),
+            len(products),
+        )
+
+
+# ---------------------------------------------------------
+# SEARCH
+# ---------------------------------------------------------
+
+
+def has_fts5():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+class SearchBackendSelectionTests(SimpleTestCase):
+    def test_vendor_defaults(self):
+        postgres = SimpleNamespace(vendor="postgresql")
+        self.assertIsInstance(backend_for(postgres), PostgresSearchBackend)
+
+        other = SimpleNamespace(vendor="mysql")
+        self.assertIsInstance(backend_for(other), BasicSearchBackend)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND="products.search.BasicSearchBackend")
+    def test_setting_overrides_the_vendor(self):
+        postgres = SimpleNamespace(vendor="postgresql")
+        self.assertIsInstance(backend_for(postgres), BasicSearchBackend)
+
+
+@skipUnless(connection.vendor == "sqlite" and has_fts5(), "needs SQLite FTS5")
+class SqliteSearchTests(TestCase):
+    backend = SqliteSearchBackend()
+
+    @classmethod
+    def setUpTestData(cls):
+        def create(name, description="", category="Decor"):
+            return Product.objects.create(
+                name=name,
+                description=description,
+                price=100,
+                stock=1,
+                category=category,
+            )
+
+        # Signals keep the FTS table in sync with these
+        cls.desk_lamp = create("Desk Lamp", "Brass arm")
+        cls.lampshade = create("Lampshade", "Linen")
+        cls.vase = create("Glass Vase", "Pairs well with a lamp")
+        cls.lighting = create("Bulb Set", "Warm white", category="Lamp Parts")
+
+    def ids(self, query):
+        return self.backend.search_ids(query, limit=10)
+
+    def test_selected_for_sqlite(self):
+        self.assertIsInstance(backend_for(connection), SqliteSearchBackend)
+
+    def test_name_matches_rank_above_category_and_description(self):
+        ids = self.ids("lamp")
+        self.assertEqual(set(ids[:2]), {self.desk_lamp.pk, self.lampshade.pk})
+        self.assertEqual(ids[2:], [self.lighting.pk, self.vase.pk])
+
+    def test_tokens_match_word_prefixes_and_all_must_match(self):
+        self.assertEqual(self.ids("lam"), self.ids("lamp"))
+        self.assertEqual(self.ids("desk la"), [self.desk_lamp.pk])
+        self.assertEqual(self.ids("amp"), [])
+        self.assertEqual(self.ids("desk vase"), [])
+
+    def test_fts_operators_are_searched_as_text(self):
+        for query in ['"', "*", 'lamp"', "lamp*", "NEAR(desk lamp)", "desk AND"]:
+            with self.subTest(query=query):
+                ids = self.ids(query)
+                self.assertIsInstance(ids, list)
+
+        self.assertEqual(self.ids('"desk" * lamp'), [self.desk_lamp.pk])
+        self.assertEqual(self.ids("NEAR(desk lamp)"), [])
+        self.assertEqual(self.ids("-"), [])
+
+    def test_saves_and_deletes_update_the_index(self):
+        self.vase.name = "Glass Lantern"
+        self.vase.description = "Candle holder"
+        self.vase.save()
+        self.assertNotIn(self.vase.pk, self.ids("lamp"))
+        self.assertEqual(self.ids("lantern"), [self.vase.pk])
+
+        self.lampshade.delete()
+        self.assertEqual(self.ids("lampshade"), [])
+
+    def test_pages_by_offset(self):
+        everything = self.ids("lamp")
+        self.assertEqual(self.backend.search_ids("lamp", 2, offset=2), everything[2:])
+
+
+# ---------------------------------------------------------
+# SEARCH SUGGESTIONS
+# ---------------------------------------------------------
+
+
+@override_settings(SUGGEST_CHECK_INTERVAL=0)
+class SuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(4)
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, query):
+        return [row["name"] for row in suggest.suggest(query)]
+
+    def save(self, product):
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+    def test_word_starts_match(self):
+        self.save(Product(name="Brass Café Lamp", price=10, stock=1, category="x"))
+
+        for query in ["bra", "cafe", "LAMP", "  cafe  la"]:
+            with self.subTest(query=query):
+                self.assertEqual(self.names(query), ["Brass Café Lamp"])
+        self.assertEqual(self.names("amp"), [])
+
+    def test_changes_patch_the_index_without_a_rebuild(self):
+        suggest.get_index()
+        owl = Product(name="Brass Owl", price=10, stock=1, category="x")
+        self.save(owl)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.names("owl"), ["Brass Owl"])
+        (query,) = ctx.captured_queries
+        self.assertIn("IN", query["sql"])
+
+        owl.name = "Copper Owl"
+        self.save(owl)
+        self.assertEqual(self.names("owl"), ["Copper Owl"])
+        self.assertEqual(self.names("brass"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            owl.delete()
+        self.assertEqual(self.names("owl"), [])
+
+    def test_versions_are_checked_once_per_interval(self):
+        suggest.get_index()
+
+        with override_settings(SUGGEST_CHECK_INTERVAL=60):
+            self.save(Product(name="Brass Owl", price=10, stock=1, category="x"))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.names("owl"), [])
+
+        self.assertEqual(self.names("owl"), ["Brass Owl"])
+
+    def test_bulk_loads_rebuild_after_invalidate(self):
+        suggest.get_index()
+        Product.objects.bulk_create(
+            [Product(name="Brass Owl", price=10, stock=1, category="x")]
+        )
+        self.assertEqual(self.names("owl"), [])
+
+        suggest.invalidate()
+        self.assertEqual(self.names("owl"), ["Brass Owl"])
+
+
+# ---------------------------------------------------------
+# QUERY BUDGETS
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class CatalogQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Budgets are for a cold cache and a full page of products, so a query
+    per product or per cart line blows them straight away.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog()
+        cls.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+
+    def setUp(self):
+        cache.clear()
+
+        self.member = Client()
+        self.member.force_login(self.user)
+        self.visitor = Client()
+        for product in self.products[:8]:
+            self.member.post(reverse("add_to_cart", args=[product.pk]))
+            self.visitor.post(reverse("add_to_cart", args=[product.pk]))
+
+        cache.clear()
+
+    def get(self, client, url, budget):
+        cache.clear()
+        with self.assertMaxQueries(budget):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_products(self):
+        first = self.get(self.client, reverse("products"), 2)
+        cursor = first.context["page"].next_cursor
+
+        for query in [
+            f"?cursor={cursor}",
+            "?category=Kitchen",
+            "?price=500-1000",
+            "?sort=category",
+        ]:
+            with self.subTest(query=query):
+                # Listing and facets
+                self.get(self.client, reverse("products") + query, 2)
+                # Plus session, user with profile and cart
+                self.get(self.member, reverse("products") + query, 5)
+
+        # Asking for the total adds the COUNT
+        self.get(self.client, reverse("products") + "?count=1", 3)
+
+    def test_home(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.COOKIES.update({k: v.value for k, v in self.visitor.cookies.items()})
+
+        with self.assertMaxQueries(2):
+            response = views.home(request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_view(self):
+        response = self.get(self.member, reverse("cart"), 4)
+        self.assertEqual(len(response.context["products"]), 8)
+
+        self.get(self.visitor, reverse("cart"), 2)
+
+    def test_checkout(self):
+        response = self.get(self.member, reverse("checkout"), 4)
+        self.assertEqual(len(response.context["products"]), 8)
+
+    def test_search_products(self):
+        response = self.get(self.client, reverse("search") + "?q=lamp", 2)
+        self.assertTrue(response.context["results"])
+
+        # A bigger page costs the same
+        self.get(self.member, reverse("search") + "?q=lamp&page_size=50", 5)
+
+    def test_search_suggestions(self):
+        response = self.get(self.client, reverse("search_suggestions") + "?q=prod", 1)
+        self.assertTrue(response.json()["results"])
+
+        # Plus session; the page has no template, so no user
+        self.get(self.member, reverse("search_suggestions") + "?q=prod", 2)
+
+
+# ---------------------------------------------------------
+# QUERY PLANS
+# ---------------------------------------------------------
+
+
+class CatalogPlanTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog()
+        cls.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+
+    def listing(self, query):
+        request = RequestFactory().get("/" + query)
+        return views.catalog_page(request, views.filtered_products(request))
+
+    def test_listing_pages(self):
+        for query in ["?category=Kitchen", "?price=500-1000", "?sort=category"]:
+            with self.subTest(query=query):
+                cursor = self.listing(query).next_cursor
+                self.assertIndexedPlans("products_product", lambda: self.listing(query))
+                self.assertIndexedPlans(
+                    "products_product",
+                    lambda: self.listing(f"{query}&cursor={cursor}"),
+                )
+
+    def test_next_page(self):
+        cursor = self.listing("").next_cursor
+        self.assertIndexedPlans(
+            "products_product", lambda: self.listing(f"?cursor={cursor}")
+        )
+
+    def test_product_lookup(self):
+        self.assertIndexedPlans(
+            "products_product",
+            lambda: catalog_cache.get_product(self.products[5].pk),
+        )
+
+    def test_cart(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        Cart(request).add(self.products[0].pk)
+
+        def load_and_hydrate():
+            request = RequestFactory().get("/")
+            request.user = self.user
+            Cart(request).hydrate()
+
+        self.assertIndexedPlans("products_savedcart", load_and_hydrate)
+        self.assertIndexedPlans("products_product", load_and_hydrate)
+
+        visitor = RequestFactory().get("/")
+        visitor.user = AnonymousUser()
+        visitor.COOKIES[COOKIE_NAME] = "a" * 32
+        self.assertIndexedPlans("products_savedcart", lambda: Cart(visitor).data)
+
+
+# ---------------------------------------------------------
+# PROFILING
+# ---------------------------------------------------------
+
+
+@override_settings(
+    STORAGES=PLAIN_STATIC, PROFILING_ENABLED=True, PROFILING_TOKEN="secret"
+)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(12)
+
+    def setUp(self):
+        cache.clear()
+
+    def server_timing(self, response):
+        return dict(
+            re.match(r"(\w+);dur=([\d.]+)", part).groups()
+            for part in response["Server-Timing"].split(", ")
+        )
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("products"))
+
+        self.assertIn(f'desc="{len(queries)} SQL queries"', response["Server-Timing"])
+        self.assertIn('desc="1 template renders"', response["Server-Timing"])
+        timings = self.server_timing(response)
+        self.assertEqual(set(timings), {"db", "tpl", "http", "total"})
+        self.assertLessEqual(float(timings["tpl"]), float(timings["total"]))
+
+    def test_profile_on_request(self):
+        with TemporaryDirectory() as directory:
+            with self.settings(PROFILING_DIR=Path(directory)):
+                self.client.get(reverse("products"), headers={"X-Profile": "wrong"})
+                self.assertEqual(list(Path(directory).iterdir()), [])
+
+                self.client.get(reverse("products"), headers={"X-Profile": "secret"})
+                (profile,) = Path(directory).iterdir()
+
+            self.assertIn("-GET-products-", profile.name)
+            self.assertTrue(pstats.Stats(str(profile)).total_calls)
+
+
+# ---------------------------------------------------------
+# ASSETS
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class BuildAssetsTests(TestCase):
+    CDN = "cdn.jsdelivr.net/npm/@tailwindcss/browser"
+
+    def setUp(self):
+        cache.clear()
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.source = self.root / "static_src" / "app.css"
+        self.source.parent.mkdir()
+        self.source.write_text('@import "tailwindcss";')
+        self.output = self.root / "static" / "css" / "app.css"
+
+        paths = override_settings(
+            BASE_DIR=self.root, TAILWIND_INPUT=self.source, TAILWIND_OUTPUT=self.output
+        )
+        paths.enable()
+        self.addCleanup(paths.disable)
+
+    def fake_tailwind(self, args, cwd, auto_install, version):
+        # The pinned CLI, run next to the input so @source paths resolve
+        self.assertEqual(cwd, self.source.parent)
+        self.assertEqual(version, settings.TAILWINDCSS_VERSION)
+        self.assertIn("--minify", args)
+        Path(args[args.index("-o") + 1]).write_text("/* purged */")
+
+    def build(self):
+        stdout = StringIO()
+        with patch("pytailwindcss.run", self.fake_tailwind), patch(
+            "urllib.request.urlopen",
+            side_effect=lambda url, timeout: BytesIO(b"export default {}"),
+        ) as urlopen:
+            call_command("build_assets", stdout=stdout)
+        return stdout.getvalue(), urlopen.call_count
+
+    def test_build_switches_running_pages_to_the_stylesheet(self):
+        self.assertContains(self.client.get(reverse("products")), self.CDN)
+
+        output, downloads = self.build()
+        self.assertIn("Built static/css/app.css", output)
+        self.assertEqual(downloads, 2)
+        vendor = self.source.parent / "vendor"
+        self.assertEqual(
+            sorted(p.name for p in vendor.iterdir()),
+            ["VERSION", "daisyui-theme.mjs", "daisyui.mjs"],
+        )
+
+        # No restart: the next render sees the new file
+        cache.clear()
+        response = self.client.get(reverse("products"))
+        self.assertContains(response, "products/css/app.css")
+        self.assertNotContains(response, self.CDN)
+
+        # daisyUI is only fetched again when its version changes
+        self.assertEqual(self.build()[1], 0)
+
+    def test_tailwind_errors_fail_the_command(self):
+        error = subprocess.CalledProcessError(1, "tailwindcss", stderr=b"bad @plugin")
+        (self.source.parent / "vendor").mkdir()
+        (self.source.parent / "vendor" / "VERSION").write_text(settings.DAISYUI_VERSION)
+
+        with patch("pytailwindcss.run", side_effect=error):
+            with self.assertRaisesMessage(CommandError, "bad @plugin"):
+                call_command("build_assets", stdout=StringIO())
+        self.assertFalse(self.output.exists())
+
+
+# ---------------------------------------------------------
+# LOAD TESTS
+# ---------------------------------------------------------
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class LoadTestSmokeTests(LiveServerTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        call_command(
+            "seed_perf_data",
+            products=30,
+            users=2,
+            sessions=1,
+            orders=5,
+            seed=1,
+            stdout=StringIO(),
+        )
+        self.stub = make_server(port=0, key_secret="stub_secret")
+        threading.Thread(
+            target=self.stub.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        self.stub_url = f"http://127.0.0.1:{self.stub.server_address[1]}"
+
+    def loadtest(self, stub_url=None):
+        gateway = PaymentGateway("rzp_test", "stub_secret", base_url=self.stub_url)
+        self.addCleanup(gateway.session.close)
+        stdout, stderr = StringIO(), StringIO()
+        with patch("products.views.get_gateway", return_value=gateway):
+            call_command(
+                "loadtest",
+                base_url=self.live_server_url,
+                stub_url=stub_url or self.stub_url,
+                users=1,
+                duration=1,
+                member_rate=1,
+                checkout_rate=1,
+                seed=1,
+                stdout=stdout,
+                stderr=stderr,
+            )
+        # Response/connection reference cycles in requests can keep a
+        # keep-alive socket to the live server open until collected
+        gc.collect()
+        total = re.search(r"^TOTAL\s+(\d+).*?(\d+)$", stdout.getvalue(), re.M)
+        return int(total[1]), int(total[2]), stderr.getvalue()
+
+    def test_one_user_completes_paid_journeys(self):
+        sent, errors, failures = self.loadtest()
+
+        self.assertGreater(sent, 0)
+        self.assertEqual((errors, failures), (0, ""))
+        self.assertTrue(
+            Order.objects.filter(
+                razorpay_order_id__in=list(self.stub.orders), payment_status="Success"
+            ).exists()
+        )
+
+    def test_stub_failures_are_reported_and_the_user_keeps_going(self):
+        # The app still reaches the gateway; the shopper's payment call fails
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        sent, errors, failures = self.loadtest(stub_url=closed)
+
+        self.assertIn("Razorpay stub payment:", failures)
+        # Several journeys ran, not just the first checkout
+        self.assertGreater(sent, 12)
@@ -4,6 +4,7 @@ from .views import (
     add_to_cart,
     remove_from_cart,
     cart_view,
+    cart_batch,
     product_detail,
     search_products,
     search_suggestions,
@@ -20,6 +21,8 @@ urlpatterns = [
     path("add/<int:product_id>/", add_to_cart, name="add_to_cart"),
     path("remove/<int:product_id>/", remove_from_cart, name="remove_from_cart"),
     path("cart/", cart_view, name="cart"),
+    path("cart/batch/", cart_batch, name="cart_batch"),
+    path("cart/summary/", views.cart_summary, name="cart_summary"),
     path(
         "update-cart-quantity/<int:product_id>/<int:quantity>/",
         update_cart_quantity,
@@ -27,6 +30,8 @@ urlpatterns = [
     ),
     path("search/", search_products, name="search"),
     path("search-suggestions/", search_suggestions, name="search_suggestions"),
+    path("api/products/", views.api_products, name="api_products"),
+    path("api/products/<int:product_id>/", views.api_product, name="api_product"),
     path("checkout/", checkout, name="checkout"),
     path("success/", views.success, name="success"),
     path("test-email/", test_email, name="test_email"),
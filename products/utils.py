@@ -1,21 +1,25 @@
-# from django.core.mail import send_mail
-# from django.conf import settings
+import logging
 
+from django.core.mail import send_mail
+from django.conf import settings
 
-# def send_order_email(to_email, subject, message):
-#     try:
-#         send_mail(
-#             subject=subject,
-#             message=message,
-#             from_email=settings.EMAIL_HOST_USER,
-#             recipient_list=[to_email],
-#             fail_silently=False,
-#         )
-#         return True
-#     except Exception as error:
-#         print(f"Email sending failed: {error}")
-#         return False
+logger = logging.getLogger(__name__)
 
 
-def send_order_email(subject, message, to_email):
-    return True  # disable email completely
+# SMTP can take seconds; checkout only queues this through
+# orders.tasks.send_order_confirmation and a runworker process sends it.
+def send_order_email(subject, message, to_email, fail_silently=True):
+    try:
+        send_mail(
+            subject=subject,
+            message=message,
+            from_email=settings.EMAIL_HOST_USER,
+            recipient_list=[to_email],
+            fail_silently=False,
+        )
+        return True
+    except Exception as error:
+        if not fail_silently:
+            raise
+        logger.error(f"Email sending failed: {error}")
+        return False
@@ -1,19 +1,40 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.management import call_command
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition, require_GET
+import json
 import logging
+from uuid import uuid4
 
-import razorpay
-
-from accounts.models import Profile
+from accounts.utils import get_profile
+from ecom_project import routers
+from jobs.queue import enqueue
+from orders import rollups, stock
 from orders.models import Order
+from orders.payments import get_gateway
+from orders.services import create_order, order_totals, record_payment
+from . import api
+from . import cache as catalog_cache
+from . import facets
+from .cart import Cart, CartError
+from .decorators import anonymous_cache
 from .models import Product
+from .pagination import next_page_url, paginate
+from .search import search_page
+from .suggest import suggest
 from .utils import send_order_email
 
 logger = logging.getLogger(__name__)
 
+CATALOG_ORDERINGS = {
+    "id": ("id",),
+    "category": ("category", "id"),
+}
+
 
 def run_migrations(request):
     secret = request.GET.get("secret")
@@ -46,58 +67,188 @@ def search_suggestions(request):
     if not query:
         return JsonResponse({"results": []})
 
-    products = Product.objects.filter(name__icontains=query)[:5]
+    return JsonResponse({"results": suggest(query, limit=5)})
+
+
+# ---------------------------------------------------------
+# JSON CATALOG API
+# ---------------------------------------------------------
+
+
+def api_products_etag(request):
+    return api.make_etag(request, listing_scopes(request))
 
-    data = [{"name": p.name, "url": p.get_absolute_url()} for p in products]
 
-    return JsonResponse({"results": data})
+def api_product_etag(request, product_id):
+    return api.make_etag(request, [catalog_cache.product_scope(product_id)])
+
+
+@require_GET
+@condition(etag_func=api_products_etag)
+def api_products(request):
+    try:
+        fields = api.parse_fields(request.GET.get("fields"))
+    except api.FieldError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    page = catalog_listing(request)
+
+    return StreamingHttpResponse(
+        api.stream_page(page, fields, next_page_url(request, page)),
+        content_type="application/json",
+    )
+
 
+@require_GET
+@condition(etag_func=api_product_etag)
+def api_product(request, product_id):
+    try:
+        fields = api.parse_fields(request.GET.get("fields"))
+    except api.FieldError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
+    product = catalog_cache.get_product(product_id)
+    if product is None:
+        return JsonResponse({"error": "Product not found"}, status=404)
+
+    return JsonResponse(api.serialize_product(product, fields))
+
+
+@anonymous_cache(lambda request: [catalog_cache.CATALOG])
 def search_products(request):
     query = request.GET.get("q", "").strip()
 
     if not query:
         return redirect("products")
 
-    results = Product.objects.filter(name__icontains=query)
+    cursor = request.GET.get("cursor")
+    page_size = request.GET.get("page_size")
+    results = catalog_cache.cached(
+        "search",
+        [query.lower(), cursor, page_size],
+        lambda: search_page(query, cursor=cursor, page_size=page_size),
+    )
 
     return render(
         request,
         "products/search_results.html",
-        {"query": query, "results": results},
+        {
+            "query": query,
+            "results": results,
+            "next_url": next_page_url(request, results),
+        },
+    )
+
+
+def catalog_page(request, queryset):
+    keys = CATALOG_ORDERINGS.get(request.GET.get("sort"), CATALOG_ORDERINGS["id"])
+
+    return paginate(
+        queryset,
+        cursor=request.GET.get("cursor"),
+        page_size=request.GET.get("page_size"),
+        keys=keys,
+        with_count=request.GET.get("count") == "1",
+    )
+
+
+def filtered_products(request):
+    queryset = Product.objects.all()
+
+    category = request.GET.get("category")
+    if category:
+        queryset = queryset.filter(category=category)
+
+    price = facets.price_filter(request.GET.get("price"))
+    if price:
+        queryset = queryset.filter(**price)
+
+    return queryset
+
+
+def listing_scopes(request):
+    category = request.GET.get("category")
+    if category:
+        return [catalog_cache.category_scope(category)]
+    return [catalog_cache.CATALOG]
+
+
+def page_scopes(request):
+    # The facet sidebar counts every category, not just the listed one
+    return listing_scopes(request) + [catalog_cache.FACETS]
+
+
+def catalog_listing(request):
+    params = [
+        request.GET.get(k)
+        for k in ("sort", "cursor", "page_size", "count", "category", "price")
+    ]
+
+    return catalog_cache.cached(
+        "listing",
+        params,
+        lambda: catalog_page(request, filtered_products(request)),
+        scopes=listing_scopes(request),
     )
 
 
+def cached_catalog_page(request):
+    page = catalog_listing(request)
+    page.items = catalog_cache.attach_versions(page.items)
+    return page
+
+
+@anonymous_cache(page_scopes)
 def products(request):
-    product_list = Product.objects.all()
+    page = cached_catalog_page(request)
+    next_url = next_page_url(request, page)
+
+    # Infinite scroll asks for the bare product cards only
+    if request.GET.get("fragment") == "1":
+        response = render(
+            request,
+            "products/_product_cards.html",
+            {"products": page},
+        )
+        if next_url:
+            response["X-Next-Url"] = next_url
+        return response
 
     return render(
         request,
         "products/index.html",
-        {"products": product_list},
+        {
+            "products": page,
+            "page": page,
+            "next_url": next_url,
+            "facets": facets.get_facets(),
+            "selected_category": request.GET.get("category", ""),
+            "selected_price": request.GET.get("price", ""),
+        },
     )
 
 
 def home(request):
-    product_list = Product.objects.all()
-    profile_list = Profile.objects.all()
-    cart = request.session.get("cart", {})
-    cart_items = sum(cart.values())
+    product_list = cached_catalog_page(request)
 
     return render(
         request,
         "base.html",
         {
-            "cart_items": cart_items,
+            "cart_items": len(Cart(request)),
             "products": product_list,
-            "profile": profile_list,
         },
     )
 
 
-@login_required(login_url="login")
+@anonymous_cache(lambda request, product_id: [catalog_cache.product_scope(product_id)])
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, pk=product_id)
+    product = catalog_cache.get_product(product_id)
+
+    if product is None:
+        raise Http404("No Product matches the given query.")
+
+    catalog_cache.attach_versions([product])
 
     return render(
         request,
@@ -107,9 +258,8 @@ def product_detail(request, product_id):
 
 
 def add_to_cart(request, product_id):
-    cart = request.session.get("cart", {})
-    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
-    request.session["cart"] = cart
+    cart = Cart(request)
+    qty = cart.add(product_id)
 
     is_ajax = request.headers.get("X-Requested-With") == "XMLHttpRequest"
 
@@ -117,7 +267,7 @@ def add_to_cart(request, product_id):
         return JsonResponse(
             {
                 "success": True,
-                "qty": cart[str(product_id)],
+                "qty": qty,
                 "message": "Product added to cart",
             }
         )
@@ -126,35 +276,31 @@ def add_to_cart(request, product_id):
 
 
 def remove_from_cart(request, product_id):
-    cart = request.session.get("cart", {})
-    cart.pop(str(product_id), None)
-    request.session["cart"] = cart
+    Cart(request).remove(product_id)
 
     return redirect("cart")
 
 
-def cart_view(request):
-    cart = request.session.get("cart", {})
-    items = []
-    total = 0
+@never_cache
+def cart_summary(request):
+    """Cart badge count for cached pages; also hands out the CSRF cookie."""
+    get_token(request)
+    return JsonResponse({"count": len(Cart(request))})
 
-    for product_id, qty in cart.items():
-        product = Product.objects.get(id=product_id)
-        product.qty = qty
-        product.total = product.price * qty
-        items.append(product)
-        total += product.total
+
+def cart_view(request):
+    cart = Cart(request).hydrate()
 
     return render(
         request,
         "products/cart.html",
-        {"products": items, "total": total},
+        {"products": cart.products, "total": cart.subtotal},
     )
 
 
 def update_cart_quantity(request, product_id, quantity):
     if request.method == "POST":
-        cart = request.session.get("cart", {})
+        cart = Cart(request)
 
         try:
             qty_int = int(quantity)
@@ -166,17 +312,21 @@ def update_cart_quantity(request, product_id, quantity):
 
         qty_int = max(1, qty_int)
 
-        if str(product_id) not in cart:
+        if product_id not in cart:
             return JsonResponse(
                 {"success": False, "error": "Product not in cart"},
                 status=400,
             )
 
-        cart[str(product_id)] = qty_int
-        request.session["cart"] = cart
+        cart.set(product_id, qty_int)
+        new_total = cart.line_total(product_id)
 
-        product = Product.objects.get(id=product_id)
-        new_total = product.price * qty_int
+        if new_total is None:
+            cart.remove(product_id)
+            return JsonResponse(
+                {"success": False, "error": "Product no longer available"},
+                status=400,
+            )
 
         return JsonResponse({"qty": qty_int, "total": new_total, "success": True})
 
@@ -186,36 +336,72 @@ def update_cart_quantity(request, product_id, quantity):
     )
 
 
+MAX_BATCH_OPERATIONS = 100
+
+
+def cart_batch(request):
+    if request.method != "POST":
+        return JsonResponse(
+            {"success": False, "error": "Invalid method"},
+            status=405,
+        )
+
+    try:
+        operations = json.loads(request.body or b"{}").get("ops", [])
+    except (ValueError, AttributeError):
+        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+
+    if (
+        not isinstance(operations, list)
+        or len(operations) > MAX_BATCH_OPERATIONS
+        or not all(isinstance(op, dict) for op in operations)
+    ):
+        return JsonResponse(
+            {"success": False, "error": "Invalid operations"},
+            status=400,
+        )
+
+    try:
+        product_ids = {
+            int(op["product_id"]) for op in operations if op.get("op") in ("add", "set")
+        }
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({"success": False, "error": "Invalid product"}, status=400)
+
+    if product_ids:
+        known = Product.objects.filter(pk__in=product_ids).values_list("id", flat=True)
+        if product_ids - set(known):
+            return JsonResponse(
+                {"success": False, "error": "Product not found"},
+                status=400,
+            )
+
+    try:
+        items = Cart(request).apply(operations)
+    except CartError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+
+    return JsonResponse({"success": True, "items": items, "count": sum(items.values())})
+
+
+# Razorpay order whose stock hold belongs to this session's checkout
+PAYMENT_HOLD_SESSION_KEY = "payment_hold"
+
+
 @login_required(login_url="login")
+@routers.primary()
 def checkout(request):
-    profile = Profile.objects.get(user=request.user)
-    cart = request.session.get("cart", {})
+    cart = Cart(request).hydrate()
+    items = cart.products
+    subtotal = cart.subtotal
 
-    # Rebuild items from cart
-    items = []
-    subtotal = 0
+    tax, total = order_totals(subtotal)
 
-    for product_id, qty in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            product.qty = qty
-            product.item_total = product.price * qty
-            items.append(product)
-            subtotal += product.item_total
-        except Product.DoesNotExist:
-            logger.warning(f"Product {product_id} not found in cart")
-            continue
-
-    tax = int(subtotal * 0.10)
-    total = subtotal + tax
-
-    client = razorpay.Client(
-        auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-    )
     razorpay_data = None
+    stock_error = None
 
     user = request.user
-    profile = user.profile
+    profile = get_profile(user)
 
     name = user.username
     email = user.email
@@ -229,15 +415,43 @@ def checkout(request):
         address = request.POST.get("address", address)
 
     if request.method == "POST" and "create_payment" in request.POST:
+        # A repeated click replaces the earlier hold instead of stacking them
+        previous = request.session.pop(PAYMENT_HOLD_SESSION_KEY, None)
+        if (
+            previous
+            and Order.objects.filter(
+                user=user, razorpay_order_id=previous, payment_status="Pending"
+            ).exists()
+        ):
+            stock.release(previous)
+
+        hold = f"hold_{uuid4().hex}"
         try:
             amount = int(total * 100)
 
-            order = client.order.create(
-                {
-                    "amount": amount,
-                    "currency": "INR",
-                    "payment_capture": 1,
-                }
+            # Hold stock while the customer pays; expired holds are swept.
+            # Reserved first, so a sold-out cart never reaches the gateway
+            stock.reserve({p.id: p.qty for p in items}, hold)
+            try:
+                order = get_gateway().create_order(amount, currency="INR")
+            except Exception:
+                stock.release(hold)
+                raise
+            stock.relabel(hold, order["id"])
+            request.session[PAYMENT_HOLD_SESSION_KEY] = order["id"]
+
+            # Recorded as Pending now, so a payment whose browser never
+            # comes back (tab closed) is still settled by the webhook
+            create_order(
+                items,
+                user=user,
+                name=name,
+                phone=phone,
+                email=email,
+                address=address,
+                total_price=total,
+                razorpay_order_id=order["id"],
+                payment_status="Pending",
             )
 
             razorpay_data = {
@@ -247,6 +461,10 @@ def checkout(request):
                 "currency": "INR",
             }
             logger.info(f"Razorpay order created: {order['id']}")
+        except stock.OutOfStockError as e:
+            logger.info(f"Checkout blocked: {str(e)}")
+            sold_out = next(p for p in items if p.id == e.product_id)
+            stock_error = f"Sorry, {sold_out.name} does not have enough stock left."
         except Exception as e:
             logger.error(f"Error creating Razorpay order: {str(e)}")
             razorpay_data = None
@@ -265,72 +483,70 @@ def checkout(request):
         pay_status = "Failed"
 
         try:
-            client.utility.verify_payment_signature(params)
+            get_gateway().verify_payment_signature(params)
             pay_status = "Success"
             logger.info(f"Payment verified successfully: {rp_id}")
         except Exception as e:
             logger.error(f"Payment verification failed: {str(e)}")
             pay_status = "Failed"
 
-        try:
-            # Rebuild items in case session was lost
-            cart = request.session.get("cart", {})
-            items = []
-            subtotal = 0
-
-            for product_id, qty in cart.items():
-                try:
-                    product = Product.objects.get(id=product_id)
-                    product.qty = qty
-                    product.item_total = product.price * qty
-                    items.append(product)
-                    subtotal += product.item_total
-                except Product.DoesNotExist:
-                    logger.warning(
-                        f"Product {product_id} not found during order creation"
-                    )
-                    continue
-
-            tax = int(subtotal * 0.10)
-            total = subtotal + tax
-
-            order = Order.objects.create(
-                name=name,
-                phone=phone,
-                email=email,
-                address=address,
-                total_price=total,
-                razorpay_payment_id=rp_id,
-                razorpay_order_id=rp_order,
-                razorpay_signature=rp_sig,
-                payment_status=pay_status,
-            )
+        # The order id comes from the form: only this customer's own
+        # pending order may touch the hold behind it
+        pending = (
+            Order.objects.filter(user=user, razorpay_order_id=rp_order)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if request.session.get(PAYMENT_HOLD_SESSION_KEY) == rp_order:
+            del request.session[PAYMENT_HOLD_SESSION_KEY]
 
-            order.products.set([p.id for p in items])
+        if pay_status == "Success":
+            quantities = {p.id: p.qty for p in items}
+            if pending:
+                quantities = stock.order_quantities([pending]).get(rp_order, quantities)
+            stock.commit(rp_order, quantities)
+        elif pending:
+            stock.release(rp_order)
+
+        try:
+            if pending:
+                # The webhook may have settled it already; never go back
+                order, changed = record_payment(
+                    pending,
+                    pay_status,
+                    razorpay_payment_id=rp_id,
+                    razorpay_signature=rp_sig,
+                )
+            else:
+                order = create_order(
+                    items,
+                    user=user,
+                    name=name,
+                    phone=phone,
+                    email=email,
+                    address=address,
+                    total_price=total,
+                    razorpay_payment_id=rp_id,
+                    razorpay_order_id=rp_order,
+                    razorpay_signature=rp_sig,
+                    payment_status=pay_status,
+                )
+                changed = True
 
             # Store total + order id for success page
-            request.session["last_order_total"] = float(total)
+            request.session["last_order_total"] = float(order.total_price)
             request.session["last_order_id"] = order.id
 
-            logger.info(f"Order created: {order.id} with status: {pay_status}")
+            logger.info(f"Order {order.id} status: {order.payment_status}")
 
-            # Send email
-            try:
-                send_order_email(
-                    to_email=email,
-                    subject="Order Confirmation",
-                    message=(
-                        f"Thank you {name}! Your order ID is {order.id}\n"
-                        f"Payment Amount: {order.total_price}\n"
-                        f"Payment Status: {order.payment_status}"
-                    ),
-                )
-            except Exception as e:
-                logger.error(f"Failed to send order email: {str(e)}")
+            # Confirmation email is sent by the job worker, once per change
+            if changed:
+                enqueue("orders.tasks.send_order_confirmation", order.id)
+                if order.payment_status == "Success":
+                    rollups.schedule()
 
             # Clear cart
-            request.session["cart"] = {}
-            request.session.modified = True
+            cart.clear()
 
             return redirect("success")
 
@@ -355,6 +571,7 @@ def checkout(request):
             "tax": tax,
             "total": total,
             "payment": razorpay_data,
+            "stock_error": stock_error,
             "name": name,
             "phone": phone,
             "email": email,